@@ -7,17 +7,19 @@ from typing import Union
 
 
 def create_separation(args):
-    files = {
-        'audiofile': open(args.input, 'rb'),
-        'api_token': (None, args.token),
-        'sep_type': (None, args.sep_type),
-        'add_opt1': (None, args.add_opt1),
-        'add_opt2': (None, args.add_opt2),
-        'output_format': (None, '1'),
-        'is_demo': (None, '0'),
-    }
-
-    response = requests.post('https://mvsep.com/api/separation/create', files=files)
+    # The file is closed as soon as the upload is finished
+    with open(args.input, 'rb') as audio_file:
+        files = {
+            'audiofile': audio_file,
+            'api_token': (None, args.token),
+            'sep_type': (None, args.sep_type),
+            'add_opt1': (None, args.add_opt1),
+            'add_opt2': (None, args.add_opt2),
+            'output_format': (None, '1'),
+            'is_demo': (None, '0'),
+        }
+
+        response = requests.post('https://mvsep.com/api/separation/create', files=files)
     string_response = response.content.decode('utf-8')
     parsed_json = json.loads(string_response)
     hash = parsed_json["data"]["hash"]
@@ -28,17 +30,36 @@ def create_separation(args):
 def download_file(url, filename, save_path):
     """
     Download the file from the specified URL and save it in the specified path.
+    The data is written to a .part file first. If the script is interrupted, running it again
+    continues the download from the end of the .part file.
     """
-    response = requests.get(url)
-
-    if response.status_code == 200:
-        output_path = os.path.join(save_path, filename)
-        with open(output_path, 'wb') as f:
-            f.write(response.content)
-        file_size = os.path.getsize(output_path)
-        print(f"File '{filename}' have been downloaded successfully! Size: {file_size/ (1024*1024):.2f} MB")
-    else:
-        print(f"There was an error loading the file '{filename}'. Status code: {response.status_code}.")
+    output_path = os.path.join(save_path, filename)
+    part_path = output_path + '.part'
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    headers = {'Range': f'bytes={offset}-'} if offset else {}
+    try:
+        response = requests.get(url, headers=headers, stream=True)
+
+        if response.status_code == 416:
+            if response.headers.get('Content-Range', '') == f'bytes */{offset}':
+                # The .part file is already complete, it was not renamed before the script stopped
+                os.replace(part_path, output_path)
+                print(f"File '{filename}' have been downloaded successfully! Size: {offset / (1024*1024):.2f} MB")
+            else:
+                # The .part file does not match the file on the server, it is downloaded again next time
+                os.remove(part_path)
+                print(f"There was an error loading the file '{filename}'. The partial file was removed, please run again.")
+        elif response.status_code in (200, 206):
+            with open(part_path, 'ab' if response.status_code == 206 else 'wb') as f:
+                for chunk in response.iter_content(chunk_size=65536):
+                    f.write(chunk)
+            os.replace(part_path, output_path)
+            file_size = os.path.getsize(output_path)
+            print(f"File '{filename}' have been downloaded successfully! Size: {file_size/ (1024*1024):.2f} MB")
+        else:
+            print(f"There was an error loading the file '{filename}'. Status code: {response.status_code}.")
+    except requests.exceptions.RequestException as e:
+        print(f"Download of '{filename}' was interrupted: {e}. Run get_result again to continue it.")
 
 
 def get_result(args):
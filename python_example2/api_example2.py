@@ -5,21 +5,29 @@ import requests
 import argparse
 import time
 import glob
+import heapq
 from typing import Union
 
+# Tasks are saved in this file in the output folder, so a restarted run does not upload the files again
+TASKS_FILENAME = 'mvsep_tasks.json'
+# Results are kept on the server for a limited time, older tasks are created again
+TASK_TTL = 3 * 24 * 3600
+
 
 def create_separation(file, args):
-    files = {
-        'audiofile': open(file, 'rb'),
-        'api_token': (None, args.token),
-        'sep_type': (None, args.sep_type),
-        'add_opt1': (None, args.add_opt1),
-        'add_opt2': (None, args.add_opt2),
-        'output_format': (None, '1'),
-        'is_demo': (None, '0'),
-    }
-
-    response = requests.post('https://mvsep.com/api/separation/create', files=files)
+    # The file is closed as soon as the upload is finished
+    with open(file, 'rb') as audio_file:
+        files = {
+            'audiofile': audio_file,
+            'api_token': (None, args.token),
+            'sep_type': (None, args.sep_type),
+            'add_opt1': (None, args.add_opt1),
+            'add_opt2': (None, args.add_opt2),
+            'output_format': (None, '1'),
+            'is_demo': (None, '0'),
+        }
+
+        response = requests.post('https://mvsep.com/api/separation/create', files=files)
     string_response = response.content.decode('utf-8')
     parsed_json = json.loads(string_response)
     hash = parsed_json["data"]["hash"]
@@ -27,49 +35,154 @@ def create_separation(file, args):
     return hash, response.status_code
 
 
-def download_file(url, filename, save_path):
+def download_file(url, filename, save_path, timeout=(60, 300)):
     """
     Download the file from the specified URL and save it in the specified path.
+    The data is written to a .part file first. If the script is interrupted, running it again
+    continues the download from the end of the .part file.
+    Returns True when the file is complete, False when the server refused it and None when the
+    download was interrupted (the next check of the task continues it).
     """
-    response = requests.get(url)
-
-    if response.status_code == 200:
-        output_path = os.path.join(save_path, filename)
-        with open(output_path, 'wb') as f:
-            f.write(response.content)
-        file_size = os.path.getsize(output_path)
-        print(f"File '{filename}' have been downloaded successfully! Size: {file_size/ (1024*1024):.2f} MB")
+    output_path = os.path.join(save_path, filename)
+    if os.path.exists(output_path):
+        # Files are renamed from .part only when complete, so this one was downloaded by an earlier run
+        print(f"File '{filename}' was already downloaded")
         return True
-    else:
-        print(f"There was an error loading the file '{filename}'. Status code: {response.status_code}.")
-        return False
+    part_path = output_path + '.part'
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    headers = {'Range': f'bytes={offset}-'} if offset else {}
+    try:
+        response = requests.get(url, headers=headers, stream=True, timeout=timeout)
+
+        if response.status_code == 416:
+            if response.headers.get('Content-Range', '') == f'bytes */{offset}':
+                # The .part file is already complete, it was not renamed before the script stopped
+                os.replace(part_path, output_path)
+                print(f"File '{filename}' have been downloaded successfully! Size: {offset / (1024*1024):.2f} MB")
+                return True
+            # The .part file does not match the file on the server, it is downloaded again from the start
+            os.remove(part_path)
+            return download_file(url, filename, save_path, timeout)
+        if response.status_code in (200, 206):
+            with open(part_path, 'ab' if response.status_code == 206 else 'wb') as f:
+                for chunk in response.iter_content(chunk_size=65536):
+                    f.write(chunk)
+            os.replace(part_path, output_path)
+            file_size = os.path.getsize(output_path)
+            print(f"File '{filename}' have been downloaded successfully! Size: {file_size/ (1024*1024):.2f} MB")
+            return True
+        else:
+            print(f"There was an error loading the file '{filename}'. Status code: {response.status_code}.")
+            return False
+    except requests.exceptions.RequestException as e:
+        print(f"Download of '{filename}' was interrupted: {e}. It is continued at the next check.")
+        return None
+
+
+def get_status(hash):
+    """
+    Status of the task on the server: 'waiting', 'processing', 'done', 'failed', 'not_found' and so on.
+    """
+    response = requests.get('https://mvsep.com/api/separation/get', params={'hash': hash})
+    data = json.loads(response.content.decode('utf-8'))
+    return data.get('status')
 
 
 def get_result(hash, args):
+    """
+    Check the task and download its files when it is done. Returns (result, data): result is True when
+    all files were downloaded, False when the task failed and None while it is not ready; data is the
+    response of the server, with the status and the queue position of the task.
+    """
     params = {'hash': hash}
     save_path = args.output_path
     response = requests.get('https://mvsep.com/api/separation/get', params=params)
     data = json.loads(response.content.decode('utf-8'))
 
+    if data.get('status') in ('failed', 'not_found'):
+        print("\nThe separation {} is {} on the server".format(hash, data['status']))
+        return False, data
     if data['success']:
         try:
             files = data['data']['files']
         except:
             # print("The separation is not ready yet")
-            return None
+            return None, data
         os.makedirs(save_path, exist_ok=True)
         print("\nFiles to download: {}".format(len(files)))
+        results = []
         for file_info in files:
             url = file_info['url'].replace('\\/', '/')
             filename = file_info['download']
-            status = download_file(url, filename, save_path)
-        if status:
-            return True
-        else:
-            return False
+            results.append(download_file(url, filename, save_path))
+        if False in results:
+            return False, data
+        # An interrupted download is continued at the next check of the task
+        return (None if None in results else True), data
     else:
         print("An error occurred while retrieving file data.")
-        return False
+        return False, data
+
+
+class AdaptivePolling:
+    """
+    Chooses when a task is checked next from its status, its place in the queue and how long the tasks
+    of this run took before, like AdaptivePolling of example 3:
+    - waiting: the expected wait is queue position * average wait per position, check when about half of it is left;
+    - processing: check when about half of the average processing time is left;
+    - distributing, merging: the result is almost ready, check after min_interval.
+    The averages start at wait_per_position and processing_estimate and follow the durations seen.
+    """
+
+    def __init__(self, min_interval=3, max_interval=120, processing_estimate=60, wait_per_position=30,
+                 smoothing=0.2):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.processing_estimate = processing_estimate
+        self.wait_per_position = wait_per_position
+        self.smoothing = smoothing
+        # hash -> [status, time of the status change, queue position when it started waiting]
+        self.tasks = {}
+
+    @staticmethod
+    def position(data):
+        try:
+            return int(data['data']['current_order'])
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    def observe(self, hash, data):
+        """
+        Record the status of a check; the time spent in the previous status updates the averages.
+        """
+        now = time.time()
+        status = data.get('status')
+        task = self.tasks.setdefault(hash, [None, now, None])
+        if status != task[0]:
+            spent = now - task[1]
+            if task[0] == 'waiting' and task[2]:
+                self.wait_per_position += self.smoothing * (spent / task[2] - self.wait_per_position)
+            elif task[0] == 'processing':
+                self.processing_estimate += self.smoothing * (spent - self.processing_estimate)
+            task[:] = [status, now, self.position(data) if status == 'waiting' else None]
+
+    def next_interval(self, hash, data):
+        status = data.get('status')
+        task = self.tasks.get(hash)
+        elapsed = time.time() - task[1] if task else 0
+        if status == 'waiting':
+            remaining = max(self.position(data) or 1, 1) * self.wait_per_position
+        elif status == 'processing':
+            remaining = self.processing_estimate - elapsed
+            if remaining <= 0:
+                # Slower than usual: back off slowly instead of checking at the minimum interval
+                remaining = 2 * max(self.min_interval, 0.1 * elapsed)
+        else:
+            remaining = 0
+        return min(max(remaining / 2, self.min_interval), self.max_interval)
+
+    def forget(self, hash):
+        self.tasks.pop(hash, None)
 
 
 def get_separation_types():
@@ -137,17 +250,65 @@ def parse_args(dict_args: Union[dict, None]) -> argparse.Namespace:
     return args
 
 
-def wait_to_response(hash, args):
-    print("Wait while file will be processed on server", end='')
-    counter = 0
-    while counter < 360:
-        response = get_result(hash, args)
+def load_tasks(args):
+    """
+    Read the tasks of earlier runs from mvsep_tasks.json in the output folder:
+    input file and parameters -> hash of the task and whether its files were downloaded.
+    """
+    try:
+        with open(os.path.join(args.output_path, TASKS_FILENAME), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_tasks(tasks, args):
+    # Written to a temporary file first, so a crash never leaves a broken file
+    os.makedirs(args.output_path, exist_ok=True)
+    path = os.path.join(args.output_path, TASKS_FILENAME)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(tasks, f, indent=1)
+    os.replace(path + '.tmp', path)
+
+
+def wait_to_response(hashes, args, max_wait=3600, on_done=None, on_failed=None, polling=None):
+    """
+    Wait for all separation tasks with one polling loop. Hashes are kept in a heap ordered by
+    the time of their next check, so the loop only wakes up when a check is due. The time of the next
+    check of a task is chosen by polling (AdaptivePolling) from its status and queue position, so a task
+    deep in the queue is checked rarely and one that is almost done is checked soon. A task without a result
+    after max_wait seconds is given up. on_done(hash) is called when all files of a task are downloaded,
+    on_failed(hash) when the task failed or its files could not be downloaded.
+    """
+    polling = polling or AdaptivePolling()
+    print("Wait while {} file(s) will be processed on server".format(len(hashes)), end='')
+    queue = [(time.time(), hash, time.time() + max_wait) for hash in hashes]
+    heapq.heapify(queue)
+    while queue:
+        due_time, hash, deadline = heapq.heappop(queue)
+        delay = due_time - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        response, data = get_result(hash, args)
+        polling.observe(hash, data)
+        if response is not None:
+            polling.forget(hash)
         if response:
-            break
-        else:
-            counter += 1
-            print('...', end='')
-            time.sleep(10)
+            if on_done:
+                on_done(hash)
+            continue
+        if response is False:
+            print('\nProblem with separation {}'.format(hash))
+            if on_failed:
+                on_failed(hash)
+            continue
+        if time.time() >= deadline:
+            print('\nNo result for {} after {} seconds'.format(hash, max_wait))
+            polling.forget(hash)
+            continue
+        print('...', end='')
+        next_check = min(time.time() + polling.next_interval(hash, data), deadline)
+        heapq.heappush(queue, (next_check, hash, deadline))
 
 
 def main():
@@ -161,16 +322,49 @@ def main():
             for extension in ['wav', 'flac', 'mp3']:
                 files += glob.glob(os.path.join(args.input) + '/*.{}'.format(extension))
             print('Found files to process: {}'.format(len(files)))
+            tasks = load_tasks(args)
+            hashes = []
             for file in files:
+                key = '{}|{}|{}|{}'.format(os.path.abspath(file), args.sep_type, args.add_opt1, args.add_opt2)
+                task = tasks.get(key)
+                if task and task['done']:
+                    print('Skip file, it was already processed: {}'.format(file))
+                    continue
+                if task and time.time() - task['created'] < TASK_TTL:
+                    status = get_status(task['hash'])
+                    if status not in ('failed', 'not_found'):
+                        print('Continue task {} for file: {}'.format(task['hash'], file))
+                        hashes.append(task['hash'])
+                        continue
+                    # The server has no result for this task, so the file is uploaded again
+                    print('Task {} is {} on the server'.format(task['hash'], status))
+                    del tasks[key]
+                    save_tasks(tasks, args)
                 print('Create separation task for file: {}'.format(file))
                 res = create_separation(file, args)
                 if len(res) == 2:
                     hash, return_code = res
                     print('Hash: {} Return code: {}'.format(hash, return_code))
+                    hashes.append(hash)
+                    tasks[key] = {'hash': hash, 'created': time.time(), 'done': False}
+                    save_tasks(tasks, args)
                 else:
                     print('Problem with separation', res)
                     continue
-                wait_to_response(hash, args)
+
+            def on_done(hash):
+                for task in tasks.values():
+                    if task['hash'] == hash:
+                        task['done'] = True
+                save_tasks(tasks, args)
+
+            def on_failed(hash):
+                # Forgotten, so the next run uploads the file again instead of waiting for this task
+                for task_key in [task_key for task_key, task in tasks.items() if task['hash'] == hash]:
+                    del tasks[task_key]
+                save_tasks(tasks, args)
+
+            wait_to_response(hashes, args, on_done=on_done, on_failed=on_failed)
 
         if args.command == 'get_types':
             get_separation_types()
@@ -0,0 +1,531 @@
+import os
+import time
+import hashlib
+import asyncio
+import threading
+import aiohttp
+from typing import Dict, List, Optional, Tuple, Union
+import argparse
+
+from mvsep_client import (format_algorithms, parse_retry_after, file_sha256, DownloadManifest, RetryPolicy,
+                          ExponentialBackoff, RetryBudget, RetryStats, RateLimiter, default_rate_limiter,
+                          CatalogCache, AlgorithmCatalog)
+
+
+def _file_size(path: str) -> int:
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+def _truncate(path: str) -> None:
+    open(path, "wb").close()
+
+
+def _write_block(f, block: bytearray, digest) -> None:
+    f.write(block)
+    digest.update(block)
+
+
+class AsyncMVSEPClient:
+    """asyncio version of MVSEPClient with the same methods, arguments and retry behaviour.
+    One event loop can run many uploads, status polls and downloads at once without a thread per job."""
+
+    # Downloaded data is written to disk in blocks of this size
+    WRITE_SIZE = 1024 * 1024
+
+    def __init__(self, api_key: str, retries: int = 30, retry_interval: int = 20, debug: bool = True,
+                 pool_maxsize: int = 100, pool_maxsize_per_host: int = 10,
+                 retry_policy: Optional[RetryPolicy] = None, retry_budget: Optional[RetryBudget] = None,
+                 rate_limiter: Optional[RateLimiter] = None, skip_existing: bool = True,
+                 catalog_cache: Optional[CatalogCache] = None, validate_params: bool = True):
+        self.api_key = api_key
+        self.retries = retries
+        self.retry_interval = retry_interval
+        self.retry_policy = retry_policy or ExponentialBackoff(retries=retries, cap=retry_interval)
+        self.retry_budget = retry_budget or RetryBudget()
+        self.retry_stats = RetryStats()
+        self.rate_limiter = rate_limiter or default_rate_limiter
+        self.base_url = "https://mvsep.com/api"
+        self.headers = {"User-Agent": "MVSEP Python Client/0.1"}
+        self.debug = debug
+        self.pool_maxsize = pool_maxsize
+        self.pool_maxsize_per_host = pool_maxsize_per_host
+        self.timeout = aiohttp.ClientTimeout(sock_connect=600, sock_read=1200)
+        self._session = None
+        # Result files that are already in the output folder and match the download manifest are not fetched again
+        self.skip_existing = skip_existing
+        self._manifests = {}
+        # get_manifest runs in worker threads (asyncio.to_thread)
+        self._manifests_lock = threading.Lock()
+        # The algorithm list is fetched from the API at most once per catalog_cache.ttl
+        self.catalog_cache = catalog_cache or CatalogCache()
+        self._catalog = None
+        # Separation parameters are checked against the algorithm list before a file is uploaded
+        self.validate_params = validate_params
+
+    def _log_debug(self, message: str) -> None:
+        """Helper method for debug logging"""
+        if self.debug:
+            print(f"[DEBUG] {message}")
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # The session must be created inside the running event loop
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_maxsize, limit_per_host=self.pool_maxsize_per_host)
+            self._session = aiohttp.ClientSession(connector=connector, headers=self.headers, timeout=self.timeout)
+        return self._session
+
+    def _can_retry(self) -> bool:
+        if self.retry_budget.withdraw():
+            return True
+        self._log_debug("Retry budget exhausted, giving up")
+        self.retry_stats.record_budget_exhausted()
+        return False
+
+    def get_retry_stats(self) -> Dict:
+        """Number of retries, seconds spent sleeping between them and requests that failed without retry"""
+        return self.retry_stats.snapshot()
+
+    async def close(self) -> None:
+        """Close all keep-alive connections"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def _make_request(self, method: str, endpoint: str,
+                            params: Optional[Dict] = None, data: Optional[Dict] = None,
+                            files: Optional[Dict] = None, with_headers: bool = False) -> Union[Dict, List, Tuple]:
+        """Send a request with the same retry rules as MVSEPClient._make_request and return the decoded JSON
+        (with the response headers as a second value if with_headers is set).
+        Values of files are paths; they are reopened on every attempt so a retry re-sends the whole file."""
+        url = f"{self.base_url}/{endpoint.lstrip('/')}"
+
+        self._log_debug(f"Making {method} request to {url}")
+        self._log_debug(f"Params: {params}")
+        self._log_debug(f"Data: {data}")
+        if files:
+            self._log_debug(f"Files: {list(files.keys())} (content not logged)")
+
+        policy = self.retry_policy
+        self.retry_budget.deposit()
+        for attempt in range(policy.retries + 1):
+            wait = self.rate_limiter.reserve(endpoint.lstrip('/'), self.api_key)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            handles = []
+            try:
+                body = None
+                if files:
+                    body = aiohttp.FormData()
+                    for key, value in (data or {}).items():
+                        body.add_field(key, value)
+                    for key, path in files.items():
+                        handle = open(path, "rb")
+                        handles.append(handle)
+                        body.add_field(key, handle, filename=os.path.basename(path))
+                elif data is not None:
+                    body = data
+
+                async with self._get_session().request(method, url, params=params, data=body) as response:
+                    self._log_debug(f"Response status: {response.status}")
+                    self._log_debug(f"Response headers: {dict(response.headers)}")
+
+                    if response.status == 429:
+                        delay = parse_retry_after(response.headers.get("Retry-After"), policy.get_delay(attempt))
+                        self._log_debug(f"Rate limited, retrying after {delay:.1f}s")
+                        self.rate_limiter.pause(self.api_key, delay)
+                    elif policy.is_retryable(response.status):
+                        delay = policy.get_delay(attempt)
+                        self._log_debug(f"Server error {response.status}, retrying after {delay:.1f}s")
+                    else:
+                        if response.status >= 400:
+                            self.retry_stats.record_fatal()
+                        response.raise_for_status()
+                        result = await response.json(content_type=None)
+                        return (result, response.headers) if with_headers else result
+
+                    if attempt == policy.retries or not self._can_retry():
+                        response.raise_for_status()
+
+            except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError) as e:
+                self._log_debug(f"Request exception: {str(e)}")
+                if attempt == policy.retries or not self._can_retry():
+                    raise Exception(f"Request failed after {attempt} retries: {str(e)}")
+                delay = policy.get_delay(attempt)
+            finally:
+                for handle in handles:
+                    handle.close()
+
+            self.retry_stats.record_retry(delay)
+            await asyncio.sleep(delay)
+        raise Exception("Unexpected error in request handling")
+
+    # Core Separation Functions
+    async def create_separation(self, file_path: Optional[str] = None, url: Optional[str] = None,
+                                sep_type: int = 11, add_opt1: Optional[Union[str, int]] = None,
+                                add_opt2: Optional[Union[str, int]] = None, add_opt3: Optional[Union[str, int]] = None,
+                                output_format: int = 0, is_demo: bool = False,
+                                remote_type: Optional[str] = None) -> Dict:
+        self._log_debug(f"Creating separation with params: sep_type={sep_type}, output_format={output_format}")
+
+        data = {
+            "api_token": self.api_key,
+            "sep_type": str(sep_type),
+            "output_format": str(output_format),
+            "is_demo": "1" if is_demo else "0"
+        }
+        files = {}
+
+        if file_path and url:
+            raise ValueError("Cannot specify both file_path and url")
+        if file_path:
+            self._log_debug(f"Uploading local file: {file_path}")
+            files["audiofile"] = file_path
+        elif url:
+            self._log_debug(f"Processing remote URL: {url}")
+            data["url"] = url
+            if remote_type:
+                data["remote_type"] = remote_type
+        else:
+            raise ValueError("Either file_path or url must be provided")
+
+        for opt, val in [("add_opt1", add_opt1), ("add_opt2", add_opt2), ("add_opt3", add_opt3)]:
+            if val is not None:
+                data[opt] = str(val)
+
+        await self.check_separation_params(sep_type, add_opt1, add_opt2, add_opt3)
+        json_response = await self._make_request("POST", "separation/create", data=data, files=files)
+        self._log_debug(f"Create separation response: {json_response}")
+        return json_response
+
+    async def check_separation_params(self, sep_type: int = 11, add_opt1: Optional[Union[str, int]] = None,
+                                      add_opt2: Optional[Union[str, int]] = None,
+                                      add_opt3: Optional[Union[str, int]] = None, **kwargs) -> None:
+        """Same as MVSEPClient.check_separation_params: raise ValueError before the upload if the algorithm list
+        shows that the parameters are invalid"""
+        if not self.validate_params:
+            return
+        try:
+            errors = (await self.get_catalog()).validate(sep_type, add_opt1, add_opt2, add_opt3)
+            if errors:
+                errors = (await self.get_catalog(refresh=True)).validate(sep_type, add_opt1, add_opt2, add_opt3)
+        except Exception as e:
+            self._log_debug(f"Separation parameters not checked, the algorithm list is not available: {e}")
+            return
+        if errors:
+            raise ValueError("Invalid separation parameters: " + "; ".join(errors))
+
+    async def get_separation_status(self, task_hash: str, mirror: int = 0) -> Dict:
+        self._log_debug(f"Getting status for hash: {task_hash}, mirror={mirror}")
+        params = {"hash": task_hash, "mirror": str(mirror)}
+        if mirror == 1:
+            params["api_token"] = self.api_key
+        json_response = await self._make_request("GET", "separation/get", params=params)
+        self._log_debug(f"Status response: {json_response}")
+        return json_response
+
+    async def download_track(self, url: str, output_path: str) -> None:
+        """Stream a track to output_path + ".part" and rename it when complete.
+        An existing .part file is resumed with a Range request, and files that match the download manifest
+        are skipped, as in MVSEPClient.download_track. Hashing and disk writes run in worker threads,
+        so a large file never blocks the event loop."""
+        directory = os.path.dirname(output_path) or "."
+        await asyncio.to_thread(os.makedirs, directory, exist_ok=True)
+        manifest = await asyncio.to_thread(self.get_manifest, directory)
+        if self.skip_existing and await self._is_downloaded(url, output_path, manifest):
+            self._log_debug(f"{output_path} is already downloaded, skipping")
+            return
+        self._log_debug(f"Downloading track directly from {url}")
+        part_path = output_path + ".part"
+        policy = self.retry_policy
+        self.retry_budget.deposit()
+
+        offset = await asyncio.to_thread(_file_size, part_path)
+        hashing = {"digest": await asyncio.to_thread(file_sha256, part_path, offset) if offset else hashlib.sha256()}
+        for attempt in range(policy.retries + 1):
+            offset = await asyncio.to_thread(_file_size, part_path)
+            try:
+                if await self._download_part(url, part_path, offset, hashing):
+                    break
+                error = "connection closed before the end of the file"
+            except aiohttp.ClientResponseError as e:
+                if not policy.is_retryable(e.status):
+                    self.retry_stats.record_fatal()
+                    raise
+                error = str(e)
+            except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError) as e:
+                error = str(e) or type(e).__name__
+            self._log_debug(f"Download of {url} interrupted at {await asyncio.to_thread(_file_size, part_path)} "
+                            f"bytes: {error}")
+            if attempt == policy.retries or not self._can_retry():
+                raise Exception(f"Download failed after {attempt} retries: {error}")
+            delay = policy.get_delay(attempt)
+            self.retry_stats.record_retry(delay)
+            await asyncio.sleep(delay)
+
+        await asyncio.to_thread(os.replace, part_path, output_path)
+        await asyncio.to_thread(manifest.add, output_path, hashing["digest"].hexdigest(), url)
+        self._log_debug(f"Finished downloading to {output_path}")
+
+    def get_manifest(self, directory: str) -> DownloadManifest:
+        """Download manifest of a directory, shared by all downloads of this client"""
+        directory = os.path.abspath(directory)
+        with self._manifests_lock:
+            manifest = self._manifests.get(directory)
+            if manifest is None:
+                manifest = self._manifests[directory] = DownloadManifest(directory)
+        return manifest
+
+    async def _is_downloaded(self, url: str, output_path: str, manifest: DownloadManifest) -> bool:
+        if not os.path.exists(output_path):
+            return False
+        entry = manifest.get(os.path.basename(output_path))
+        if entry is not None and entry.get("url") is not None:
+            return await asyncio.to_thread(manifest.verify, output_path, url)
+        # A file from before the manifest (or its urls) existed: compare its size with the server's
+        try:
+            async with self._get_session().head(url, allow_redirects=True) as response:
+                if response.status != 200 or response.content_length != os.path.getsize(output_path):
+                    return False
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            return False
+        sha256 = await asyncio.to_thread(file_sha256, output_path)
+        await asyncio.to_thread(manifest.add, output_path, sha256, url)
+        return True
+
+    async def _download_part(self, url: str, part_path: str, offset: int, hashing: Dict) -> bool:
+        """Append the rest of url to part_path starting at offset. Returns True when the file is complete.
+        hashing["digest"] holds the SHA-256 of the first offset bytes and is updated with everything written.
+        Chunks are collected into blocks of WRITE_SIZE bytes, each written and hashed in a worker thread."""
+        headers = {"Range": f"bytes={offset}-"} if offset else None
+        async with self._get_session().get(url, headers=headers) as response:
+            if response.status == 416:
+                # Range starts at the end of the file: the .part file is already complete
+                total = response.headers.get("Content-Range", "").rpartition("/")[2]
+                if total.isdigit() and int(total) == offset:
+                    return True
+                await asyncio.to_thread(_truncate, part_path)
+                hashing["digest"] = hashlib.sha256()
+                return False
+            response.raise_for_status()
+            if response.status != 206:
+                # The server ignored the Range header and sends the whole file
+                offset = 0
+                hashing["digest"] = hashlib.sha256()
+            expected = offset + response.content_length if response.content_length is not None else None
+
+            written = offset
+            f = await asyncio.to_thread(open, part_path, "ab" if offset else "wb")
+            block = bytearray()
+            try:
+                async for chunk in response.content.iter_chunked(65536):
+                    block += chunk
+                    written += len(chunk)
+                    if len(block) >= self.WRITE_SIZE:
+                        await asyncio.to_thread(_write_block, f, block, hashing["digest"])
+                        block = bytearray()
+            finally:
+                # Bytes received before a dropped connection are kept, the next attempt resumes after them
+                if block:
+                    await asyncio.to_thread(_write_block, f, block, hashing["digest"])
+                await asyncio.to_thread(f.close)
+        return expected is None or written >= expected
+
+    async def process_file(self, file_path: str, output_dir: str, **kwargs) -> None:
+        """Upload one file, wait until it is separated and download all result files"""
+        filename = os.path.basename(file_path)
+        self._log_debug(f"Processing {filename}")
+        try:
+            create_resp = await self.create_separation(file_path=file_path, **kwargs)
+            if not create_resp.get("success"):
+                self._log_debug(f"Creation failed response: {create_resp}")
+                return
+
+            task_hash = create_resp["data"]["hash"]
+            self._log_debug(f"Created separation task: {task_hash}")
+
+            while True:
+                status_resp = await self.get_separation_status(task_hash)
+                status = status_resp.get("status")
+                if status == "done":
+                    self._log_debug("Processing completed successfully")
+                    break
+                if status in ["failed", "error"]:
+                    self._log_debug("Processing failed")
+                    return
+                if status in ["waiting", "processing", "distributing", "merging"]:
+                    self._log_debug(f"Current status: {status}, waiting {self.retry_interval}s")
+                    await asyncio.sleep(self.retry_interval)
+                else:
+                    self._log_debug(f"Unknown status: {status}")
+                    return
+
+            downloads = []
+            for file_info in status_resp["data"]["files"]:
+                output_filename = file_info.get("download", f"unknown_{time.time()}.mp3")
+                output_path = os.path.join(output_dir, output_filename)
+                self._log_debug(f"Downloading {output_filename}")
+                downloads.append(self.download_track(file_info["url"], output_path))
+            await asyncio.gather(*downloads)
+
+        except Exception as e:
+            self._log_debug(f"Exception during processing: {str(e)}")
+            print(f"Error processing {filename}: {str(e)}")
+
+    async def process_directory(self, input_dir: str, output_dir: str, concurrency: int = 16, **kwargs) -> None:
+        """Same as MVSEPClient.process_directory, but up to `concurrency` files are handled at once"""
+        self._log_debug(f"Processing directory: {input_dir} -> {output_dir}")
+        # Checked once for the whole folder instead of failing every file
+        await self.check_separation_params(**kwargs)
+        supported_ext = [".mp3", ".wav", ".flac"]
+        os.makedirs(output_dir, exist_ok=True)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def worker(path):
+            async with semaphore:
+                await self.process_file(path, output_dir, **kwargs)
+
+        jobs = []
+        for filename in os.listdir(input_dir):
+            if os.path.splitext(filename)[1].lower() not in supported_ext:
+                self._log_debug(f"Skipping unsupported file: {filename}")
+                continue
+            jobs.append(worker(os.path.join(input_dir, filename)))
+        await asyncio.gather(*jobs)
+
+    async def get_algorithms(self) -> Dict:
+        return format_algorithms(await self.get_catalog())
+
+    async def get_catalog(self, refresh: bool = False) -> AlgorithmCatalog:
+        """AlgorithmCatalog of get_algorithm_list(), parsed again only when the list changed"""
+        algorithms = await self.get_algorithm_list(refresh)
+        if self._catalog is None or self._catalog[0] is not algorithms:
+            self._catalog = (algorithms, AlgorithmCatalog(algorithms))
+        return self._catalog[1]
+
+    async def get_algorithm_list(self, refresh: bool = False) -> List[Dict]:
+        """Same as MVSEPClient.get_algorithm_list: the cached list while it is fresh, revalidated after that"""
+        cache = self.catalog_cache
+        entry = await asyncio.to_thread(cache.load)
+        if entry is not None and not refresh and cache.is_fresh(entry):
+            return entry["algorithms"]
+        if entry is None:
+            self._log_debug("Fetching algorithm list")
+            # The ETag and Last-Modified of the response are saved for the revalidation below
+            algorithms, headers = await self._make_request("GET", "app/algorithms", with_headers=True)
+            return (await asyncio.to_thread(cache.store, algorithms, headers))["algorithms"]
+
+        self._log_debug("Revalidating cached algorithm list")
+        headers = dict(self.headers, **cache.validators(entry))
+        try:
+            async with self._get_session().get(f"{self.base_url}/app/algorithms", headers=headers,
+                                               timeout=aiohttp.ClientTimeout(total=cache.timeout)) as response:
+                if response.status == 304:
+                    return (await asyncio.to_thread(cache.touch, response.headers))["algorithms"]
+                response.raise_for_status()
+                algorithms = await response.json(content_type=None)
+                return (await asyncio.to_thread(cache.store, algorithms, response.headers))["algorithms"]
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            self._log_debug(f"Using cached algorithm list, the API request failed: {e}")
+            return entry["algorithms"]
+
+    # Premium Management
+    async def enable_premium(self) -> Dict:
+        data = {"api_token": self.api_key}
+        return await self._make_request("POST", "app/enable_premium", data=data)
+
+    async def disable_premium(self) -> Dict:
+        data = {"api_token": self.api_key}
+        return await self._make_request("POST", "app/disable_premium", data=data)
+
+    # Quality Checker
+    async def create_quality_entry(self, zip_path: str, algo_name: str, main_text: str,
+                                   dataset_type: int = 0, ensemble: int = 0, password: str = "") -> Dict:
+        data = {
+            "api_token": self.api_key,
+            "algo_name": algo_name,
+            "main_text": main_text,
+            "dataset_type": str(dataset_type),
+            "ensemble": str(ensemble),
+            "password": password
+        }
+        files = {"zipfile": zip_path}
+        return await self._make_request("POST", "quality_checker/add", data=data, files=files)
+
+    # Additional API Endpoints
+    async def get_queue_info(self) -> Dict:
+        return await self._make_request("GET", "app/queue")
+
+    async def get_news(self, lang: str = "en", start: int = 0, limit: int = 10) -> Dict:
+        params = {"lang": lang, "start": str(start), "limit": str(limit)}
+        return await self._make_request("GET", "app/news", params=params)
+
+    async def get_separation_history(self, start: int = 0, limit: int = 10) -> Dict:
+        params = {"api_token": self.api_key, "start": str(start), "limit": str(limit)}
+        return await self._make_request("GET", "app/separation_history", params=params)
+
+    # File Name Preferences
+    async def enable_long_filenames(self) -> Dict:
+        data = {"api_token": self.api_key}
+        return await self._make_request("POST", "app/enable_long_filenames", data=data)
+
+    async def disable_long_filenames(self) -> Dict:
+        data = {"api_token": self.api_key}
+        return await self._make_request("POST", "app/disable_long_filenames", data=data)
+
+
+def parse_args(dict_args: Union[dict, None]) -> argparse.Namespace:
+    """
+    Parse command-line arguments for the asyncio client.
+
+    Args:
+        dict_args: Dict of command-line arguments. If None, arguments will be parsed from sys.argv.
+
+    Returns:
+        Namespace object containing parsed arguments and their values.
+    """
+    parser = argparse.ArgumentParser(description="Console application for managing MVSEP separations (asyncio).")
+    parser.add_argument('--input', type=str, help="Path to the folder where to search files to be separated.")
+    parser.add_argument('--output_folder', type=str, default="./", help="Path to store the result files.")
+    parser.add_argument('--token', type=str, help="API token for authentication.")
+    parser.add_argument('--output_format', type=int, default=1, help="Output format: MP3=0, WAV=1, FLAC=2")
+    parser.add_argument('--sep_type', type=int, default=20, help="Separation type.")
+    parser.add_argument('--add_opt1', type=str, default="", help="Additional option 1.")
+    parser.add_argument('--add_opt2', type=str, default="", help="Additional option 2.")
+    parser.add_argument('--add_opt3', type=str, default="", help="Additional option 3.")
+    parser.add_argument('--concurrency', type=int, default=16, help="Number of files processed at once.")
+
+    if dict_args is not None:
+        args = parser.parse_args([])
+        args_dict = vars(args)
+        args_dict.update(dict_args)
+        args = argparse.Namespace(**args_dict)
+    else:
+        args = parser.parse_args()
+    return args
+
+
+async def main(args: argparse.Namespace) -> None:
+    async with AsyncMVSEPClient(api_key=args.token, debug=True) as client:
+        try:
+            await client.process_directory(
+                input_dir=args.input,
+                output_dir=args.output_folder,
+                concurrency=args.concurrency,
+                output_format=args.output_format,
+                sep_type=args.sep_type,
+                add_opt1=args.add_opt1,
+                add_opt2=args.add_opt2,
+                add_opt3=args.add_opt3,
+            )
+        except ValueError as e:
+            print(f"Error: {e}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args(None)))
@@ -1,29 +1,1361 @@
 import os
 import time
+import heapq
+import queue
+import random
+import threading
+import uuid
+import sys
+import shutil
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
 import requests
+from requests.adapters import HTTPAdapter
 from requests.exceptions import RequestException
-from typing import Dict, List, Optional, Union
+from types import MappingProxyType
+from typing import Dict, Iterator, List, Mapping, NamedTuple, Optional, Tuple, Union
 import json
 import argparse
 
 
+class TransferProgress:
+    """Counts the bytes of one upload or download and reports them to a callback.
+    The callback gets a dict with name, direction ("upload" or "download"), bytes_done, total (None if unknown),
+    rate (bytes/s since the previous report), average_rate, elapsed and finished.
+    Reports are sent at most every `interval` seconds, plus a final one when the transfer is finished."""
+
+    def __init__(self, name: str, direction: str, callback, total: Optional[int] = None, interval: float = 0.5):
+        self.name = name
+        self.direction = direction
+        self.callback = callback
+        self.total = total
+        self.interval = interval
+        self.reset()
+
+    def reset(self, bytes_done: int = 0) -> None:
+        """Start counting again; bytes_done is the part that is already there (e.g. a resumed download)"""
+        self.bytes_done = bytes_done
+        self.start_time = time.monotonic()
+        self._last_time = self.start_time
+        self._last_bytes = bytes_done
+        self._start_bytes = bytes_done
+
+    def _report(self, now: float, finished: bool) -> None:
+        elapsed = now - self.start_time
+        since_last = now - self._last_time
+        rate = (self.bytes_done - self._last_bytes) / since_last if since_last > 0 else 0.0
+        self._last_time = now
+        self._last_bytes = self.bytes_done
+        self.callback({
+            "name": self.name,
+            "direction": self.direction,
+            "bytes_done": self.bytes_done,
+            "total": self.total,
+            "rate": rate,
+            "average_rate": (self.bytes_done - self._start_bytes) / elapsed if elapsed > 0 else 0.0,
+            "elapsed": elapsed,
+            "finished": finished,
+        })
+
+    def update(self, nbytes: int) -> None:
+        self.bytes_done += nbytes
+        now = time.monotonic()
+        if now - self._last_time >= self.interval:
+            self._report(now, False)
+
+    def finish(self) -> None:
+        self._report(time.monotonic(), True)
+
+
+class ConsoleProgress:
+    """Progress callback that draws one status line per transfer in the terminal"""
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stderr
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def format(progress: Dict) -> str:
+        mb = 1024 * 1024
+        done = progress["bytes_done"] / mb
+        if progress["total"]:
+            percent = 100 * progress["bytes_done"] / progress["total"]
+            size = f"{percent:5.1f}% {done:.1f}/{progress['total'] / mb:.1f} MB"
+        else:
+            size = f"{done:.1f} MB"
+        return (f"[{progress['direction']}] {progress['name']}: {size} "
+                f"{progress['rate'] / mb:.2f} MB/s (avg {progress['average_rate'] / mb:.2f} MB/s)")
+
+    def __call__(self, progress: Dict) -> None:
+        with self._lock:
+            end = "\n" if progress["finished"] else ""
+            self.stream.write("\r" + self.format(progress).ljust(100) + end)
+            self.stream.flush()
+
+
+class MultipartStream:
+    """multipart/form-data request body that reads files in chunks while it's being sent.
+    Only one chunk is in memory at a time, so memory use doesn't depend on the file size.
+    The length is known in advance, so the request is sent with Content-Length, not chunked.
+    Files are opened lazily and closed by close() or at the end of a `with` block."""
+
+    def __init__(self, fields: Optional[Dict] = None, files: Optional[Dict] = None, chunk_size: int = 64 * 1024,
+                 progress: Optional[TransferProgress] = None):
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self.boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={self.boundary}"
+        self.fields = dict(fields or {})
+        # Each part is either bytes or a path to a file that is streamed from disk
+        self._parts = []
+        for name, value in (fields or {}).items():
+            self._parts.append(f'--{self.boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n'
+                               f'{value}\r\n'.encode("utf-8"))
+        for name, path in (files or {}).items():
+            filename = os.path.basename(path).replace('"', "%22")
+            self._parts.append(f'--{self.boundary}\r\nContent-Disposition: form-data; name="{name}"; '
+                               f'filename="{filename}"\r\nContent-Type: application/octet-stream\r\n\r\n'.encode("utf-8"))
+            self._parts.append(path)
+            self._parts.append(b"\r\n")
+        self._parts.append(f"--{self.boundary}--\r\n".encode("utf-8"))
+        self._length = sum(len(part) if isinstance(part, bytes) else os.path.getsize(part) for part in self._parts)
+        if progress is not None:
+            progress.total = self._length
+        self._index = 0
+        self._offset = 0
+        self._handle = None
+
+    def __len__(self) -> int:
+        return self._length
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = self._length
+        out = bytearray()
+        while len(out) < size and self._index < len(self._parts):
+            part = self._parts[self._index]
+            if isinstance(part, bytes):
+                chunk = part[self._offset:self._offset + size - len(out)]
+                self._offset += len(chunk)
+                finished = self._offset >= len(part)
+            else:
+                if self._handle is None:
+                    self._handle = open(part, "rb")
+                chunk = self._handle.read(size - len(out))
+                finished = not chunk
+                if finished:
+                    self._handle.close()
+                    self._handle = None
+            out += chunk
+            if finished:
+                self._index += 1
+                self._offset = 0
+        if self.progress is not None and out:
+            self.progress.update(len(out))
+            if self._index == len(self._parts):
+                self.progress.finish()
+        return bytes(out)
+
+    def __iter__(self):
+        while True:
+            chunk = self.read(self.chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    def seek(self, offset: int, whence: int = 0) -> None:
+        """Only rewinding to the start is supported; it's used to send the body again on retry"""
+        if offset != 0 or whence != 0:
+            raise ValueError("MultipartStream can only be rewound to the start")
+        self.close()
+        self._index = 0
+        self._offset = 0
+        if self.progress is not None:
+            self.progress.reset()
+
+    def close(self) -> None:
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class RetryPolicy:
+    """Fixed delay between attempts. Decides which responses are worth retrying and how long to wait."""
+    # Client errors that can succeed on a second attempt; any other 4xx (e.g. 400) fails at once
+    RETRYABLE_CLIENT_ERRORS = (408, 425, 429)
+
+    def __init__(self, retries: int = 30, interval: float = 20):
+        self.retries = retries
+        self.interval = interval
+
+    def is_retryable(self, status_code: int) -> bool:
+        return status_code in self.RETRYABLE_CLIENT_ERRORS or 500 <= status_code < 600
+
+    def get_delay(self, attempt: int) -> float:
+        return self.interval
+
+
+class ExponentialBackoff(RetryPolicy):
+    """Exponential backoff with full jitter: the delay is uniform in [0, min(cap, base * 2 ** attempt)]"""
+
+    def __init__(self, retries: int = 10, base: float = 1.0, cap: float = 60.0):
+        super().__init__(retries=retries, interval=cap)
+        self.base = base
+        self.cap = cap
+
+    def get_delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self.cap, self.base * 2 ** attempt))
+
+
+class RetryBudget:
+    """Limits retries per client so that an outage doesn't multiply the load on the API.
+    Every request adds `ratio` tokens, every retry costs one token. The balance also refills
+    at `min_per_second` tokens per second and never exceeds `max_balance`."""
+
+    def __init__(self, ratio: float = 0.2, min_per_second: float = 0.5, max_balance: float = 20):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_balance = max_balance
+        self._balance = max_balance
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, amount: float) -> None:
+        now = time.monotonic()
+        amount += (now - self._last_refill) * self.min_per_second
+        self._last_refill = now
+        self._balance = min(self.max_balance, self._balance + amount)
+
+    def deposit(self) -> None:
+        with self._lock:
+            self._refill(self.ratio)
+
+    def withdraw(self) -> bool:
+        """Take one retry from the budget. Returns False if the budget is exhausted."""
+        with self._lock:
+            self._refill(0)
+            if self._balance < 1:
+                return False
+            self._balance -= 1
+            return True
+
+
+class RetryStats:
+    """Thread-safe counters of retries and time spent sleeping between them"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.retries = 0
+        self.sleep_seconds = 0.0
+        self.budget_exhausted = 0
+        self.fatal_responses = 0
+
+    def record_retry(self, delay: float) -> None:
+        with self._lock:
+            self.retries += 1
+            self.sleep_seconds += delay
+
+    def record_budget_exhausted(self) -> None:
+        with self._lock:
+            self.budget_exhausted += 1
+
+    def record_fatal(self) -> None:
+        with self._lock:
+            self.fatal_responses += 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "retries": self.retries,
+                "sleep_seconds": round(self.sleep_seconds, 3),
+                "budget_exhausted": self.budget_exhausted,
+                "fatal_responses": self.fatal_responses,
+            }
+
+
+class RateLimiter:
+    """Token bucket per (endpoint, API token), shared by all clients and threads of the process.
+    Requests are paced to `rate` per second with bursts of up to `burst` requests. When the API answers
+    429, pause() stops every request with the same API token until the Retry-After window has passed."""
+
+    def __init__(self, rate: float = 5.0, burst: int = 10, endpoint_rates: Optional[Dict] = None):
+        self.rate = rate
+        self.burst = burst
+        # {"separation/create": (rate, burst), ...} overrides the default for single endpoints
+        self.endpoint_rates = endpoint_rates or {}
+        self._lock = threading.Lock()
+        self._arrival = {}
+        self._paused_until = {}
+        self.throttled = 0
+        self.wait_seconds = 0.0
+        self.pauses = 0
+
+    def reserve(self, endpoint: str, api_token: str) -> float:
+        """Reserve a slot for one request and return how many seconds the caller must wait before sending it"""
+        rate, burst = self.endpoint_rates.get(endpoint, (self.rate, self.burst))
+        interval = 1.0 / rate
+        key = (endpoint, api_token)
+        with self._lock:
+            now = time.monotonic()
+            arrival = self._arrival.get(key, now)
+            allowed_at = max(now, arrival - (burst - 1) * interval, self._paused_until.get(api_token, 0))
+            self._arrival[key] = max(arrival, allowed_at) + interval
+            wait = allowed_at - now
+            if wait > 0:
+                self.throttled += 1
+                self.wait_seconds += wait
+            return wait
+
+    def pause(self, api_token: str, seconds: float) -> None:
+        """Stop all requests made with api_token for the given number of seconds"""
+        with self._lock:
+            until = time.monotonic() + seconds
+            if until > self._paused_until.get(api_token, 0):
+                self._paused_until[api_token] = until
+                self.pauses += 1
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {"throttled": self.throttled, "wait_seconds": round(self.wait_seconds, 3), "pauses": self.pauses}
+
+
+# Every client uses this limiter unless it is given its own one
+default_rate_limiter = RateLimiter()
+
+
+class TokenPool:
+    """Several API tokens (accounts) used by one client. New separations go to the healthy token with the
+    lowest load; each token runs at most `max_concurrent` tasks at once (from upload until the task is
+    finished), so acquire() blocks while every token is busy. A token that got 429 is not used until its
+    Retry-After window has passed, and a token with repeated errors is rested for an increasing time.
+    Premium tokens are preferred when the load is equal."""
+
+    def __init__(self, tokens: List[str], max_concurrent: Union[int, Dict[str, int]] = 4,
+                 error_cooldown: float = 30, max_cooldown: float = 600):
+        if not tokens:
+            raise ValueError("TokenPool needs at least one token")
+        self.error_cooldown = error_cooldown
+        self.max_cooldown = max_cooldown
+        self._cond = threading.Condition()
+        self._tokens = {}
+        for token in tokens:
+            limit = max_concurrent.get(token, 4) if isinstance(max_concurrent, dict) else max_concurrent
+            self._tokens[token] = {"limit": limit, "active": 0, "assigned": 0, "errors": 0,
+                                   "consecutive_errors": 0, "rate_limited": 0, "unavailable_until": 0.0,
+                                   "premium": None}
+
+    @property
+    def tokens(self) -> List[str]:
+        return list(self._tokens)
+
+    def _available(self, now: float) -> List[str]:
+        return [token for token, state in self._tokens.items()
+                if state["active"] < state["limit"] and state["unavailable_until"] <= now]
+
+    def acquire(self, timeout: Optional[float] = None) -> str:
+        """Take a task slot on the least loaded healthy token and return the token"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                available = self._available(now)
+                if available:
+                    token = min(available, key=lambda t: (self._tokens[t]["active"] / self._tokens[t]["limit"],
+                                                          self._tokens[t]["premium"] is not True,
+                                                          self._tokens[t]["consecutive_errors"],
+                                                          self._tokens[t]["assigned"]))
+                    self._tokens[token]["active"] += 1
+                    self._tokens[token]["assigned"] += 1
+                    return token
+                # Wake up when a token comes back from its cooldown, or earlier on release()
+                resting = [state["unavailable_until"] for state in self._tokens.values()
+                           if state["unavailable_until"] > now and state["active"] < state["limit"]]
+                wait = min(resting) - now if resting else None
+                if deadline is not None:
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        raise TimeoutError("No API token available")
+                    wait = remaining if wait is None else min(wait, remaining)
+                self._cond.wait(wait)
+
+    def release(self, token: str) -> None:
+        """Give back the task slot taken by acquire()"""
+        with self._cond:
+            state = self._tokens.get(token)
+            if state is not None and state["active"] > 0:
+                state["active"] -= 1
+                self._cond.notify()
+
+    def record_success(self, token: str) -> None:
+        with self._cond:
+            if token in self._tokens:
+                self._tokens[token]["consecutive_errors"] = 0
+
+    def record_error(self, token: str) -> None:
+        """A failed request: after the second error in a row the token rests, twice as long every time"""
+        with self._cond:
+            state = self._tokens.get(token)
+            if state is None:
+                return
+            state["errors"] += 1
+            state["consecutive_errors"] += 1
+            if state["consecutive_errors"] >= 2:
+                cooldown = min(self.error_cooldown * 2 ** (state["consecutive_errors"] - 2), self.max_cooldown)
+                state["unavailable_until"] = max(state["unavailable_until"], time.monotonic() + cooldown)
+
+    def record_rate_limited(self, token: str, seconds: float) -> None:
+        with self._cond:
+            state = self._tokens.get(token)
+            if state is not None:
+                state["rate_limited"] += 1
+                state["unavailable_until"] = max(state["unavailable_until"], time.monotonic() + seconds)
+
+    def set_premium(self, token: str, enabled: bool) -> None:
+        with self._cond:
+            if token in self._tokens:
+                self._tokens[token]["premium"] = enabled
+
+    def get_stats(self) -> Dict:
+        """Load and health of every token, keyed by the last 4 characters of the token"""
+        now = time.monotonic()
+        with self._cond:
+            return {f"...{token[-4:]}": {"active": state["active"], "limit": state["limit"],
+                                         "assigned": state["assigned"], "errors": state["errors"],
+                                         "rate_limited": state["rate_limited"], "premium": state["premium"],
+                                         "resting": round(max(state["unavailable_until"] - now, 0), 1)}
+                    for token, state in self._tokens.items()}
+
+
+def parse_retry_after(value: Optional[str], default: float) -> float:
+    """Retry-After is either a number of seconds or an HTTP date"""
+    if not value:
+        return default
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    try:
+        from email.utils import parsedate_to_datetime
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0)
+    except (TypeError, ValueError):
+        return default
+
+
+def format_algorithms(algorithms: Union[List[Dict], "AlgorithmCatalog"]) -> Dict:
+    """Format the app/algorithms payload (or a catalog made of it) as {render_id: printable description}"""
+    catalog = algorithms if isinstance(algorithms, AlgorithmCatalog) else AlgorithmCatalog(algorithms)
+    return {algorithm.render_id: catalog.describe(algorithm.render_id) for algorithm in catalog}
+
+
+class AlgorithmField(NamedTuple):
+    """One additional option of an algorithm, e.g. add_opt1 with its options {key: text}"""
+    name: str
+    text: str
+    options: Mapping[str, str]
+    # text -> key, to map the text selected in a combo box back to the value sent to the API
+    keys: Mapping[str, str]
+
+
+class Algorithm(NamedTuple):
+    render_id: int
+    name: str
+    group_id: Optional[int]
+    fields: Tuple[AlgorithmField, ...]
+
+    def field(self, name: str) -> Optional[AlgorithmField]:
+        """The field sent as option name (add_opt1, add_opt2 or add_opt3), None if the algorithm doesn't have it.
+        Fields are matched by name; a field with a name of its own stands for the option at its position."""
+        for field in self.fields:
+            if field.name == name:
+                return field
+        index = AlgorithmCatalog.OPTION_NAMES.index(name) if name in AlgorithmCatalog.OPTION_NAMES else len(self.fields)
+        if index < len(self.fields) and self.fields[index].name not in AlgorithmCatalog.OPTION_NAMES:
+            return self.fields[index]
+        return None
+
+
+class AlgorithmCatalog:
+    """The app/algorithms payload parsed once: the options of every field are decoded and sorted, and
+    algorithms can be looked up by render_id, by name and by group without walking the list.
+    The catalog can't be changed after it was built, so one instance can be shared by all threads."""
+
+    OPTION_NAMES = ("add_opt1", "add_opt2", "add_opt3")
+
+    def __init__(self, algorithms: List[Dict]):
+        by_id = {}
+        by_name = {}
+        by_group = {}
+        for item in sorted(algorithms, key=lambda algo: algo['render_id']):
+            fields = []
+            for index, field in enumerate(item.get('algorithm_fields') or []):
+                options = field.get('options') or {}
+                if isinstance(options, str):
+                    options = json.loads(options) if options.strip() else {}
+                options = {str(key): str(value) for key, value in options.items()}
+                keys = sorted(options, key=lambda key: (not key.lstrip("-").isdigit(),
+                                                        int(key) if key.lstrip("-").isdigit() else 0, key))
+                name = field.get('name') or (self.OPTION_NAMES[index] if index < 3 else f"field{index}")
+                fields.append(AlgorithmField(name, field.get('text', name),
+                                             MappingProxyType({key: options[key] for key in keys}),
+                                             MappingProxyType({options[key]: key for key in reversed(keys)})))
+            algorithm = Algorithm(item['render_id'], item.get('name', str(item['render_id'])),
+                                  item.get('algorithm_group_id'), tuple(fields))
+            by_id[algorithm.render_id] = algorithm
+            by_name.setdefault(algorithm.name, algorithm)
+            by_group.setdefault(algorithm.group_id, []).append(algorithm)
+        object.__setattr__(self, "_by_id", MappingProxyType(by_id))
+        object.__setattr__(self, "_by_name", MappingProxyType(by_name))
+        object.__setattr__(self, "_by_group", MappingProxyType({group: tuple(items) for group, items in by_group.items()}))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("AlgorithmCatalog can't be changed")
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def __iter__(self) -> Iterator[Algorithm]:
+        return iter(self._by_id.values())
+
+    def __contains__(self, render_id) -> bool:
+        return self.get(render_id) is not None
+
+    def __getitem__(self, render_id) -> Algorithm:
+        algorithm = self.get(render_id)
+        if algorithm is None:
+            raise KeyError(render_id)
+        return algorithm
+
+    def get(self, render_id) -> Optional[Algorithm]:
+        try:
+            return self._by_id.get(int(render_id))
+        except (TypeError, ValueError):
+            return None
+
+    def by_name(self, name: str) -> Optional[Algorithm]:
+        return self._by_name.get(name)
+
+    def by_group(self, group_id: int) -> Tuple[Algorithm, ...]:
+        return self._by_group.get(group_id, ())
+
+    @property
+    def groups(self) -> Tuple:
+        return tuple(self._by_group)
+
+    def describe(self, render_id) -> str:
+        algorithm = self[render_id]
+        lines = [f"\nID:{algorithm.render_id} - {algorithm.name}"]
+        for field in algorithm.fields:
+            lines.append(f"\t{field.name}")
+            lines.extend(f"\t\t{key}: {value}" for key, value in field.options.items())
+        return "\n".join(lines) + "\n"
+
+    def validate(self, sep_type, add_opt1=None, add_opt2=None, add_opt3=None) -> List[str]:
+        """Problems of these separation parameters, an empty list if the API should accept them.
+        An option that is not given (None or "") is left to the server default."""
+        algorithm = self.get(sep_type)
+        if algorithm is None:
+            return [f"Unknown sep_type {sep_type}"]
+        errors = []
+        for name, value in zip(self.OPTION_NAMES, (add_opt1, add_opt2, add_opt3)):
+            if value is None or str(value) == "":
+                continue
+            field = algorithm.field(name)
+            if field is None:
+                # The GUIs send "0" for options the algorithm doesn't have
+                if str(value) != "0":
+                    errors.append(f"{algorithm.name} (sep_type {algorithm.render_id}) has no {name}")
+            elif field.options and str(value) not in field.options:
+                errors.append(f"{name}={value} is not valid for {algorithm.name} (sep_type {algorithm.render_id}), "
+                              f"use one of: " + ", ".join(f"{key} ({text})" for key, text in field.options.items()))
+        return errors
+
+    def check(self, sep_type, add_opt1=None, add_opt2=None, add_opt3=None) -> None:
+        """Raise ValueError if validate() finds a problem"""
+        errors = self.validate(sep_type, add_opt1, add_opt2, add_opt3)
+        if errors:
+            raise ValueError("; ".join(errors))
+
+
+class FixedPolling:
+    """Polls every task at the same fixed interval"""
+
+    def __init__(self, interval: float = 20):
+        self.interval = interval
+
+    def observe(self, task_hash: str, status: Optional[str], status_resp: Dict) -> None:
+        pass
+
+    def next_interval(self, task_hash: str, status: Optional[str], status_resp: Dict) -> float:
+        return self.interval
+
+
+class AdaptivePolling(FixedPolling):
+    """Chooses the next poll time from the task status, its place in the queue and how long tasks took before:
+    - waiting: the expected wait is queue position * average wait per position, poll when about half of it is left;
+    - processing: poll when about half of the average processing time is left;
+    - distributing, merging: the result is almost ready, poll at min_interval.
+    Averages are exponential moving averages of durations seen by this strategy. The queue position comes from
+    the status response (current_order) or, if it's missing, from get_queue_info(), cached for queue_ttl seconds."""
+
+    def __init__(self, client: Optional["MVSEPClient"] = None, min_interval: float = 3, max_interval: float = 120,
+                 processing_estimate: float = 60, wait_per_position: float = 30, queue_ttl: float = 60,
+                 smoothing: float = 0.2):
+        super().__init__(interval=min_interval)
+        self.client = client
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.processing_estimate = processing_estimate
+        self.wait_per_position = wait_per_position
+        self.queue_ttl = queue_ttl
+        self.smoothing = smoothing
+        self._lock = threading.Lock()
+        self._tasks = {}
+        self._queue_depth = None
+        self._queue_time = None
+
+    @staticmethod
+    def _position(status_resp: Dict) -> Optional[int]:
+        data = status_resp.get("data")
+        if not isinstance(data, dict):
+            return None
+        try:
+            return int(data.get("current_order"))
+        except (TypeError, ValueError):
+            return None
+
+    def _get_queue_depth(self) -> Optional[int]:
+        """Number of tasks in the server queue, taken from get_queue_info() on a best-effort basis"""
+        if self.client is None:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            if self._queue_time is not None and now - self._queue_time < self.queue_ttl:
+                return self._queue_depth
+            self._queue_time = now
+        try:
+            data = self.client.get_queue_info().get("data")
+        except Exception as e:
+            self.client._log_debug(f"Queue info is not available: {str(e)}")
+            data = None
+        if isinstance(data, list):
+            depth = len(data)
+        elif isinstance(data, dict):
+            depth = sum(value for value in data.values() if isinstance(value, int) and not isinstance(value, bool))
+        elif isinstance(data, int):
+            depth = data
+        else:
+            depth = None
+        with self._lock:
+            self._queue_depth = depth
+        return depth
+
+    def _average(self, old: float, new: float) -> float:
+        return (1 - self.smoothing) * old + self.smoothing * new
+
+    def observe(self, task_hash: str, status: Optional[str], status_resp: Dict) -> None:
+        now = time.monotonic()
+        with self._lock:
+            task = self._tasks.get(task_hash)
+            if task is None:
+                task = {"status": None, "since": now, "position": None}
+                self._tasks[task_hash] = task
+            if status != task["status"]:
+                spent = now - task["since"]
+                if task["status"] == "waiting" and task["position"]:
+                    self.wait_per_position = self._average(self.wait_per_position, spent / task["position"])
+                elif task["status"] == "processing":
+                    self.processing_estimate = self._average(self.processing_estimate, spent)
+                task["status"] = status
+                task["since"] = now
+                task["position"] = self._position(status_resp) if status == "waiting" else None
+            if status not in StatusPoller.ACTIVE_STATUSES:
+                del self._tasks[task_hash]
+
+    def next_interval(self, task_hash: str, status: Optional[str], status_resp: Dict) -> float:
+        with self._lock:
+            task = self._tasks.get(task_hash)
+            elapsed = time.monotonic() - task["since"] if task else 0
+        if status == "waiting":
+            position = self._position(status_resp)
+            if position is None:
+                position = self._get_queue_depth()
+            remaining = max(position or 1, 1) * self.wait_per_position
+        elif status == "processing":
+            remaining = self.processing_estimate - elapsed
+            if remaining <= 0:
+                # Slower than usual: back off slowly instead of polling at the minimum interval
+                remaining = 2 * max(self.min_interval, 0.1 * elapsed)
+        else:
+            remaining = 0
+        return min(max(remaining / 2, self.min_interval), self.max_interval)
+
+
+class StatusPoller:
+    """Tracks the status of many separation tasks with one scheduler thread.
+    Tasks are kept in a heap ordered by the time of their next poll, so the thread only wakes up
+    when a poll is due. Each hash is polled once per interval no matter how many callbacks wait for it.
+    Callbacks get (task_hash, status, status_response) on every status change and are dropped when
+    the task reaches a final status. Whenever a task stops being tracked (final status, failed poll,
+    untrack() or stop()), its token pool slot is released with client.release_task."""
+
+    ACTIVE_STATUSES = ["waiting", "processing", "distributing", "merging"]
+
+    def __init__(self, client: "MVSEPClient", interval: float = 20, workers: int = 4,
+                 strategy: Optional[FixedPolling] = None):
+        self.client = client
+        self.interval = interval
+        self.workers = workers
+        # Decides when each task is polled next, unless track() was given a fixed interval
+        self.strategy = strategy or FixedPolling(interval)
+        self._heap = []
+        self._tasks = {}
+        self._cond = threading.Condition()
+        self._pool = None
+        self._thread = None
+        self._stopped = False
+        self.polls = 0
+
+    def track(self, task_hash: str, callback, interval: Optional[float] = None) -> None:
+        """Start tracking task_hash. The first poll happens immediately. If interval is given,
+        the task is polled at this fixed interval instead of the one chosen by the strategy."""
+        with self._cond:
+            task = self._tasks.get(task_hash)
+            if task is None:
+                task = {"callbacks": [], "status": None, "interval": interval}
+                self._tasks[task_hash] = task
+                heapq.heappush(self._heap, (time.monotonic(), task_hash))
+            task["callbacks"].append(callback)
+            self._start()
+            self._cond.notify()
+
+    def untrack(self, task_hash: str) -> None:
+        with self._cond:
+            task = self._tasks.pop(task_hash, None)
+        if task is not None:
+            self.client.release_task(task_hash)
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._tasks)
+
+    def wait(self, task_hash: str, timeout: Optional[float] = None) -> Optional[Dict]:
+        """Block until task_hash reaches a final status and return the last status response"""
+        finished = threading.Event()
+        last = {}
+
+        def on_change(_, status, status_resp):
+            last["response"] = status_resp
+            if status not in self.ACTIVE_STATUSES:
+                finished.set()
+
+        self.track(task_hash, on_change)
+        finished.wait(timeout)
+        return last.get("response")
+
+    def stop(self) -> None:
+        with self._cond:
+            self._stopped = True
+            task_hashes = list(self._tasks)
+            self._tasks.clear()
+            self._heap.clear()
+            self._cond.notify_all()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+        for task_hash in task_hashes:
+            self.client.release_task(task_hash)
+
+    def _start(self) -> None:
+        if self._thread is None:
+            self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix="mvsep-poll")
+            self._thread = threading.Thread(target=self._run, name="mvsep-poller", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                if self._stopped:
+                    return
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                due_time, task_hash = self._heap[0]
+                delay = due_time - time.monotonic()
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+                heapq.heappop(self._heap)
+                if task_hash not in self._tasks:
+                    continue
+            self._pool.submit(self._poll, task_hash)
+
+    def _poll(self, task_hash: str) -> None:
+        try:
+            status_resp = self.client.get_separation_status(task_hash)
+            status = status_resp.get("status")
+        except Exception as e:
+            status_resp, status = {"success": False, "error": str(e)}, "error"
+        self.strategy.observe(task_hash, status, status_resp)
+        next_interval = self.strategy.next_interval(task_hash, status, status_resp)
+
+        with self._cond:
+            self.polls += 1
+            task = self._tasks.get(task_hash)
+            if task is None:
+                return
+            changed = status != task["status"]
+            task["status"] = status
+            callbacks = list(task["callbacks"])
+            if status in self.ACTIVE_STATUSES:
+                if task["interval"] is not None:
+                    next_interval = task["interval"]
+                self.client._log_debug(f"Status of {task_hash}: {status}, next poll in {next_interval:.1f}s")
+                heapq.heappush(self._heap, (time.monotonic() + next_interval, task_hash))
+                self._cond.notify()
+            else:
+                del self._tasks[task_hash]
+
+        if status not in self.ACTIVE_STATUSES:
+            # A failed poll ends tracking too, so its slot must not wait for a final status that is never fetched
+            self.client.release_task(task_hash)
+        if changed:
+            for callback in callbacks:
+                try:
+                    callback(task_hash, status, status_resp)
+                except Exception as e:
+                    self.client._log_debug(f"Status callback failed for {task_hash}: {str(e)}")
+
+
+def file_sha256(file_path: str, size: Optional[int] = None):
+    """SHA-256 of a file, or a hashlib object of its first `size` bytes if size is given"""
+    digest = hashlib.sha256()
+    remaining = size
+    with open(file_path, "rb") as f:
+        while remaining is None or remaining > 0:
+            chunk = f.read(1024 * 1024 if remaining is None else min(1024 * 1024, remaining))
+            if not chunk:
+                break
+            digest.update(chunk)
+            if remaining is not None:
+                remaining -= len(chunk)
+    return digest.hexdigest() if size is None else digest
+
+
+class ResultCache:
+    """Local cache of separation results keyed by the content of the audio file and the separation parameters.
+    For every key it stores the server task hash and, once downloaded, a copy of the result files.
+    When the total size of stored files exceeds max_bytes, the least recently used entries are removed;
+    entries that only hold a task hash are dropped when the hash expires or when there are more than max_entries.
+    The index is a JSON file in cache_dir; file digests are remembered by path, size and mtime,
+    so an unchanged file is hashed only once (for the max_digests most recently used paths).
+    New hashes and files are written to the index at once; cache hits only update last_used, which is written
+    at most every save_interval seconds and by flush()."""
+
+    def __init__(self, cache_dir: str, max_bytes: int = 10 * 1024 ** 3, hash_ttl: float = 3 * 24 * 3600,
+                 max_entries: int = 10000, max_digests: int = 10000, save_interval: float = 30):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        # Results on the server are removed after some time, so old task hashes are not reused
+        self.hash_ttl = hash_ttl
+        self.max_entries = max_entries
+        self.max_digests = max_digests
+        self.save_interval = save_interval
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._saved_at = time.monotonic()
+        os.makedirs(cache_dir, exist_ok=True)
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                self._index = json.load(f)
+        except (OSError, ValueError):
+            self._index = {}
+        self._index.setdefault("entries", {})
+        self._index.setdefault("digests", {})
+
+    def _save(self) -> None:
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._index, f)
+        os.replace(tmp_path, self.index_path)
+        self._dirty = False
+        self._saved_at = time.monotonic()
+
+    def _touch(self) -> None:
+        """The index changed in a way that can be lost: write it only if the last write is save_interval old"""
+        self._dirty = True
+        if time.monotonic() - self._saved_at >= self.save_interval:
+            self._save()
+
+    def flush(self) -> None:
+        """Write changes that are not in the index file yet"""
+        with self._lock:
+            if self._dirty:
+                self._save()
+
+    def file_digest(self, file_path: str) -> str:
+        stat = os.stat(file_path)
+        stamp = [stat.st_size, stat.st_mtime_ns]
+        path = os.path.abspath(file_path)
+        with self._lock:
+            digests = self._index["digests"]
+            known = digests.get(path)
+            if known and known[0] == stamp:
+                # Moved to the end, digests are evicted in least recently used order
+                digests[path] = digests.pop(path)
+                return known[1]
+        digest = file_sha256(file_path)
+        with self._lock:
+            digests = self._index["digests"]
+            digests.pop(path, None)
+            digests[path] = [stamp, digest]
+            for old_path in list(digests)[:max(len(digests) - self.max_digests, 0)]:
+                del digests[old_path]
+            self._touch()
+        return digest
+
+    def make_key(self, file_path: str, params: Dict) -> str:
+        """Cache key for a file and the separation parameters (without the API token)"""
+        params = {key: value for key, value in params.items() if key != "api_token"}
+        key = hashlib.sha256(self.file_digest(file_path).encode("ascii"))
+        key.update(json.dumps(params, sort_keys=True).encode("utf-8"))
+        return key.hexdigest()
+
+    def get_hash(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._index["entries"].get(key)
+            if entry is None or time.time() - entry["created"] > self.hash_ttl:
+                return None
+            entry["last_used"] = time.time()
+            self._touch()
+            return entry["hash"]
+
+    def put_hash(self, key: str, task_hash: str) -> None:
+        with self._lock:
+            self._index["entries"][key] = {"hash": task_hash, "created": time.time(), "last_used": time.time(),
+                                           "files": [], "size": 0}
+            self._evict()
+            self._save()
+
+    def put_files(self, key: str, paths: List[str]) -> None:
+        """Store a copy of the downloaded result files (hard links if the file system allows it)"""
+        entry_dir = os.path.join(self.cache_dir, key)
+        os.makedirs(entry_dir, exist_ok=True)
+        names, size = [], 0
+        for path in paths:
+            name = os.path.basename(path)
+            target = os.path.join(entry_dir, name)
+            if os.path.exists(target):
+                os.remove(target)
+            try:
+                os.link(path, target)
+            except OSError:
+                shutil.copy2(path, target)
+            names.append(name)
+            size += os.path.getsize(target)
+        with self._lock:
+            entry = self._index["entries"].setdefault(key, {"hash": None, "created": time.time()})
+            entry.update(files=names, size=size, last_used=time.time())
+            self._evict()
+            self._save()
+
+    def restore(self, key: str, output_dir: str) -> List[str]:
+        """Copy the cached result files to output_dir. Returns an empty list if nothing is cached."""
+        with self._lock:
+            entry = self._index["entries"].get(key)
+            if not entry or not entry.get("files"):
+                return []
+            entry["last_used"] = time.time()
+            names = list(entry["files"])
+            self._touch()
+        entry_dir = os.path.join(self.cache_dir, key)
+        if not all(os.path.isfile(os.path.join(entry_dir, name)) for name in names):
+            return []
+        os.makedirs(output_dir, exist_ok=True)
+        restored = []
+        for name in names:
+            target = os.path.join(output_dir, name)
+            shutil.copy2(os.path.join(entry_dir, name), target)
+            restored.append(target)
+        return restored
+
+    def _evict(self) -> None:
+        entries = self._index["entries"]
+        now = time.time()
+        # Entries without files are only worth their task hash, which can't be used after hash_ttl
+        hash_only = [key for key, entry in entries.items() if not entry.get("files")]
+        expired = [key for key in hash_only if now - entries[key]["created"] > self.hash_ttl]
+        hash_only = sorted(set(hash_only) - set(expired), key=lambda k: entries[k]["last_used"])
+        for key in expired + hash_only[:max(len(hash_only) - self.max_entries, 0)]:
+            shutil.rmtree(os.path.join(self.cache_dir, key), ignore_errors=True)
+            del entries[key]
+
+        total = sum(entry.get("size", 0) for entry in entries.values())
+        for key in sorted(entries, key=lambda k: entries[k]["last_used"]):
+            if total <= self.max_bytes:
+                break
+            if not entries[key].get("size"):
+                continue
+            total -= entries[key]["size"]
+            shutil.rmtree(os.path.join(self.cache_dir, key), ignore_errors=True)
+            del entries[key]
+
+
+class DownloadManifest:
+    """Size and SHA-256 of every file downloaded into a directory, computed while the file is written.
+    Entries are appended to <directory>/.mvsep_manifest.jsonl as files complete (the last line for a file wins),
+    so a batch of thousands of files never rewrites the whole manifest."""
+
+    FILENAME = ".mvsep_manifest.jsonl"
+
+    def __init__(self, directory: str):
+        self.path = os.path.join(directory, self.FILENAME)
+        self._lock = threading.Lock()
+        self._entries = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A line cut short by a crash
+                        continue
+                    self._entries[entry["name"]] = entry
+        except OSError:
+            pass
+
+    def get(self, filename: str) -> Optional[Dict]:
+        with self._lock:
+            return self._entries.get(filename)
+
+    def add(self, file_path: str, sha256: str, url: Optional[str] = None) -> Dict:
+        stat = os.stat(file_path)
+        entry = {"name": os.path.basename(file_path), "size": stat.st_size, "sha256": sha256,
+                 "mtime_ns": stat.st_mtime_ns, "url": url}
+        with self._lock:
+            self._entries[entry["name"]] = entry
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+        return entry
+
+    def verify(self, file_path: str, url: Optional[str] = None) -> bool:
+        """True if file_path is the complete file recorded in the manifest (and downloaded from url, if given).
+        An unchanged size and mtime is enough; otherwise the file is hashed again."""
+        entry = self.get(os.path.basename(file_path))
+        if entry is None or not os.path.exists(file_path):
+            return False
+        if url is not None and entry.get("url") != url:
+            # A file of the same name from another task
+            return False
+        stat = os.stat(file_path)
+        if stat.st_size != entry["size"]:
+            return False
+        if stat.st_mtime_ns == entry["mtime_ns"]:
+            return True
+        if file_sha256(file_path) != entry["sha256"]:
+            return False
+        self.add(file_path, entry["sha256"], entry.get("url"))
+        return True
+
+
+class JobJournal:
+    """Checkpoints of process_directory and SeparationPipeline, kept in <output_dir>/.mvsep_jobs.jsonl:
+    the task hash of every uploaded file and whether all its result files were downloaded.
+    After a crash or restart, files that were uploaded are not uploaded again and finished files are skipped;
+    stems that were partly downloaded continue from their .part files."""
+
+    FILENAME = ".mvsep_jobs.jsonl"
+
+    def __init__(self, directory: str, hash_ttl: float = 3 * 24 * 3600):
+        self.directory = directory
+        self.path = os.path.join(directory, self.FILENAME)
+        # Results on the server are removed after some time, so old task hashes are not reused
+        self.hash_ttl = hash_ttl
+        self._lock = threading.Lock()
+        self._entries = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A line cut short by a crash
+                        continue
+                    self._entries[entry["key"]] = entry
+        except OSError:
+            pass
+
+    @staticmethod
+    def make_key(file_path: str, params: Dict) -> str:
+        """Key of a file (path, size and mtime) and the separation parameters (without the API token)"""
+        stat = os.stat(file_path)
+        params = {key: str(value) for key, value in params.items() if key != "api_token" and value is not None}
+        key = [os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns, params]
+        return hashlib.sha256(json.dumps(key, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            return self._entries.get(key)
+
+    def get_hash(self, key: str) -> Optional[str]:
+        entry = self.get(key)
+        if entry is None or not entry.get("hash") or time.time() - entry["created"] > self.hash_ttl:
+            return None
+        return entry["hash"]
+
+    def record(self, key: str, **fields) -> None:
+        """Update the entry of key and append it to the journal, so it survives a crash right after"""
+        with self._lock:
+            entry = dict(self._entries.get(key, {"key": key}), **fields)
+            self._entries[key] = entry
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+
+class CatalogCache:
+    """The app/algorithms list saved on disk, by default in ~/.mvsep/algorithms.json, which the GUI examples
+    use too. For `ttl` seconds after it was fetched the list is used without any request; after that it is
+    revalidated with If-None-Match/If-Modified-Since, which costs a 304 response if nothing changed.
+    If the API can't be reached or is slow, the saved list is used even if it is older than ttl."""
+
+    DEFAULT_PATH = os.path.join(os.path.expanduser("~"), ".mvsep", "algorithms.json")
+
+    def __init__(self, path: Optional[str] = None, ttl: float = 3600, timeout: float = 5):
+        self.path = path or self.DEFAULT_PATH
+        self.ttl = ttl
+        # Timeout of the revalidation request, after which the saved list is used
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._entry = None
+        self._mtime = None
+
+    def load(self) -> Optional[Dict]:
+        """The saved entry {"fetched", "etag", "last_modified", "algorithms"}, None if there is none.
+        The file is read again only if another process changed it."""
+        with self._lock:
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except OSError:
+                return None
+            if mtime != self._mtime:
+                try:
+                    with open(self.path, "r", encoding="utf-8") as f:
+                        self._entry = json.load(f)
+                except (OSError, ValueError):
+                    self._entry = None
+                self._mtime = mtime
+            return self._entry
+
+    def is_fresh(self, entry: Dict) -> bool:
+        return time.time() - entry.get("fetched", 0) < self.ttl
+
+    @staticmethod
+    def validators(entry: Optional[Dict]) -> Dict:
+        """Headers of a conditional request for the saved list"""
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def store(self, algorithms: List[Dict], headers=None) -> Dict:
+        """Save a freshly fetched list with the ETag and Last-Modified headers of its response"""
+        headers = headers or {}
+        return self._save({"fetched": time.time(), "etag": headers.get("ETag"),
+                           "last_modified": headers.get("Last-Modified"), "algorithms": algorithms})
+
+    def touch(self, headers=None) -> Dict:
+        """The server answered 304: the saved list is fresh for another ttl"""
+        entry = dict(self.load() or {})
+        entry["fetched"] = time.time()
+        for key, header in (("etag", "ETag"), ("last_modified", "Last-Modified")):
+            if headers and headers.get(header):
+                entry[key] = headers[header]
+        return self._save(entry)
+
+    def _save(self, entry: Dict) -> Dict:
+        with self._lock:
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                # Written to a temporary file first, other processes never read a half written list
+                tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(entry, f)
+                os.replace(tmp_path, self.path)
+                self._mtime = os.stat(self.path).st_mtime_ns
+            except OSError:
+                pass
+            self._entry = entry
+        return entry
+
+
 class MVSEPClient:
-    def __init__(self, api_key: str, retries: int = 30, retry_interval: int = 20, debug: bool = True):
+    def __init__(self, api_key: str, retries: int = 30, retry_interval: int = 20, debug: bool = True,
+                 pool_connections: int = 10, pool_maxsize: int = 10, pool_block: bool = False,
+                 retry_policy: Optional[RetryPolicy] = None, retry_budget: Optional[RetryBudget] = None,
+                 rate_limiter: Optional[RateLimiter] = None, progress_callback=None,
+                 result_cache: Optional[ResultCache] = None, download_workers: int = 8,
+                 max_downloads_per_host: int = 4, download_segments: int = 1,
+                 segment_min_size: int = 64 * 1024 * 1024, skip_existing: bool = True,
+                 token_pool: Optional[TokenPool] = None, catalog_cache: Optional[CatalogCache] = None,
+                 validate_params: bool = True):
         self.api_key = api_key
         self.retries = retries
         self.retry_interval = retry_interval
+        # By default failed requests are retried with exponential backoff capped at retry_interval
+        self.retry_policy = retry_policy or ExponentialBackoff(retries=retries, cap=retry_interval)
+        self.retry_budget = retry_budget or RetryBudget()
+        self.retry_stats = RetryStats()
+        self.rate_limiter = rate_limiter or default_rate_limiter
+        # Called with the progress of every upload and download, see TransferProgress
+        self.progress_callback = progress_callback
+        # Skips uploads of files that were already separated with the same parameters
+        self.result_cache = result_cache
         self.base_url = "https://mvsep.com/api"
         self.headers = {"User-Agent": "MVSEP Python Client/0.1"}
         self.debug = debug
 
+        # One connection pool shared by all threads: pool_connections is the number of hosts
+        # kept alive, pool_maxsize is the number of keep-alive connections per host.
+        # Retries are handled by _make_request, so urllib3 must not retry on its own.
+        self._adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                                    max_retries=0, pool_block=pool_block)
+        self._local = threading.local()
+        self._sessions = []
+        self._stats_lock = threading.Lock()
+        self._request_count = 0
+        self._status_poller = None
+        # Result files are fetched by a shared pool, with a limit of parallel downloads per host
+        self.download_workers = download_workers
+        self.max_downloads_per_host = max_downloads_per_host
+        self._download_pool = None
+        self._host_slots = {}
+        # Files of at least segment_min_size bytes are fetched as download_segments parallel byte ranges
+        self.download_segments = download_segments
+        self.segment_min_size = segment_min_size
+        # Result files that are already in the output folder and match the download manifest are not fetched again
+        self.skip_existing = skip_existing
+        self._manifests = {}
+        # With a token pool, every separation is created with one of its tokens, and status requests
+        # of the task use the same token
+        self.token_pool = token_pool
+        self._task_tokens = {}
+        # The algorithm list is fetched from the API at most once per catalog_cache.ttl
+        self.catalog_cache = catalog_cache or CatalogCache()
+        self._catalog = None
+        # Separation parameters are checked against the algorithm list before a file is uploaded
+        self.validate_params = validate_params
+
     def _log_debug(self, message: str) -> None:
         """Helper method for debug logging"""
         if self.debug:
             print(f"[DEBUG] {message}")
 
+    def _session(self) -> requests.Session:
+        """Return the calling thread's session. All sessions share the same connection pool."""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.headers.update(self.headers)
+            session.mount("https://", self._adapter)
+            session.mount("http://", self._adapter)
+            self._local.session = session
+            with self._stats_lock:
+                self._sessions.append(session)
+        return session
+
+    def _count_request(self) -> None:
+        with self._stats_lock:
+            self._request_count += 1
+
+    def _can_retry(self) -> bool:
+        if self.retry_budget.withdraw():
+            return True
+        self._log_debug("Retry budget exhausted, giving up")
+        self.retry_stats.record_budget_exhausted()
+        return False
+
+    def _retry_sleep(self, delay: float, body=None) -> None:
+        self.retry_stats.record_retry(delay)
+        time.sleep(delay)
+        # Rewind the streamed upload, otherwise the retry sends an empty body
+        if body is not None:
+            body.seek(0)
+
+    def _progress(self, path: str, direction: str, callback=None) -> Optional[TransferProgress]:
+        callback = callback or self.progress_callback
+        if callback is None:
+            return None
+        return TransferProgress(os.path.basename(path), direction, callback)
+
+    def get_status_poller(self) -> StatusPoller:
+        """Shared poller for all status tracking done by this client"""
+        with self._stats_lock:
+            if self._status_poller is None:
+                strategy = AdaptivePolling(self, min_interval=min(3, self.retry_interval),
+                                           max_interval=max(120, self.retry_interval))
+                self._status_poller = StatusPoller(self, interval=self.retry_interval, strategy=strategy)
+            return self._status_poller
+
+    def get_retry_stats(self) -> Dict:
+        """Number of retries, seconds spent sleeping between them and requests that failed without retry"""
+        return self.retry_stats.snapshot()
+
+    def get_connection_stats(self) -> Dict:
+        """Number of HTTP requests sent, TCP/TLS connections opened and handshakes saved by keep-alive"""
+        pools = self._adapter.poolmanager.pools
+        connections = 0
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is not None:
+                connections += pool.num_connections
+        with self._stats_lock:
+            requests_sent = self._request_count
+        return {
+            "requests": requests_sent,
+            "connections_opened": connections,
+            "handshakes_saved": max(requests_sent - connections, 0),
+        }
+
+    def close(self) -> None:
+        """Close all keep-alive connections"""
+        with self._stats_lock:
+            sessions, self._sessions = self._sessions, []
+            poller, self._status_poller = self._status_poller, None
+            download_pool, self._download_pool = self._download_pool, None
+        if poller is not None:
+            poller.stop()
+        if download_pool is not None:
+            download_pool.shutdown(wait=False, cancel_futures=True)
+        if self.result_cache is not None:
+            self.result_cache.flush()
+        for session in sessions:
+            session.close()
+        self._adapter.close()
+        self._local = threading.local()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
     def _make_request(self, method: str, endpoint: str, 
                     params: Optional[Dict] = None, data: Optional[Dict] = None,
-                    files: Optional[Dict] = None, stream: bool = False) -> requests.Response:
+                    files: Optional[Dict] = None, stream: bool = False,
+                    progress: Optional[TransferProgress] = None) -> requests.Response:
+        """Send a request to the API, retrying according to retry_policy.
+        files maps form field names to file paths; they are streamed from disk with MultipartStream
+        and the upload is reported to progress."""
         url = f"{self.base_url}/{endpoint.lstrip('/')}"
         
         self._log_debug(f"Making {method} request to {url}")
@@ -31,51 +1363,62 @@ class MVSEPClient:
         self._log_debug(f"Data: {data}")
         if files:
             self._log_debug(f"Files: {list(files.keys())} (content not logged)")
-        
-        for attempt in range(self.retries + 1):
+            with MultipartStream(data, files, progress=progress) as body:
+                headers = dict(self.headers, **{"Content-Type": body.content_type})
+                return self._send_with_retries(method, endpoint, url, params, body, headers, stream)
+        return self._send_with_retries(method, endpoint, url, params, data, self.headers, stream)
+
+    def _send_with_retries(self, method: str, endpoint: str, url: str, params: Optional[Dict], data,
+                           headers: Dict, stream: bool) -> requests.Response:
+        upload = data if isinstance(data, MultipartStream) else None
+        fields = upload.fields if upload is not None else data if isinstance(data, dict) else {}
+        # Rate limits and token health are tracked per token, which may differ from api_key with a token pool
+        token = (fields or {}).get("api_token") or (params or {}).get("api_token") or self.api_key
+        policy = self.retry_policy
+        self.retry_budget.deposit()
+        for attempt in range(policy.retries + 1):
+            wait = self.rate_limiter.reserve(endpoint.lstrip('/'), token)
+            if wait > 0:
+                time.sleep(wait)
             try:
-                response = requests.request(
+                self._count_request()
+                response = self._session().request(
                     method, url,
                     params=params,
                     data=data,
-                    files=files,
-                    headers=self.headers,
+                    headers=headers,
                     stream=stream,
                     timeout=(600, 1200)
                 )
-                
-                self._log_debug(f"Response status: {response.status_code}")
-                self._log_debug(f"Response headers: {dict(response.headers)}")
-                
-                if response.status_code == 429:
-                    retry_after = int(response.headers.get("Retry-After", self.retry_interval))
-                    self._log_debug(f"Rate limited, retrying after {retry_after}s")
-                    time.sleep(retry_after)
-                    continue
-                if response.status_code == 400:
-                    #print(response)
-                    time.sleep(self.retry_interval)
-                    continue
-                if 500 <= response.status_code < 600 and attempt < self.retries:
-                    self._log_debug(f"Server error {response.status_code}, retrying...")
-                    time.sleep(self.retry_interval)
-                    continue
+            except RequestException as e:
+                self._log_debug(f"Request exception: {str(e)}")
+                if attempt == policy.retries or not self._can_retry():
+                    raise Exception(f"Request failed after {attempt} retries: {str(e)}")
+                self._retry_sleep(policy.get_delay(attempt), upload)
+                continue
 
+            self._log_debug(f"Response status: {response.status_code}")
+            self._log_debug(f"Response headers: {dict(response.headers)}")
+
+            if response.status_code == 429:
+                delay = parse_retry_after(response.headers.get("Retry-After"), policy.get_delay(attempt))
+                self._log_debug(f"Rate limited, retrying after {delay:.1f}s")
+                self.rate_limiter.pause(token, delay)
+                if self.token_pool is not None:
+                    self.token_pool.record_rate_limited(token, delay)
+            elif policy.is_retryable(response.status_code):
+                delay = policy.get_delay(attempt)
+                self._log_debug(f"Server error {response.status_code}, retrying after {delay:.1f}s")
+            else:
+                if response.status_code >= 400:
+                    self.retry_stats.record_fatal()
                 response.raise_for_status()
                 return response
 
-            except requests.exceptions.HTTPError as e:
-                self._log_debug(f"HTTP error: {str(e)}")
-                if e.response.status_code // 100 == 4 and e.response.status_code != 429:
-                    raise
-                if attempt == self.retries:
-                    raise
-                time.sleep(self.retry_interval)
-            except RequestException as e:
-                self._log_debug(f"Request exception: {str(e)}")
-                if attempt == self.retries:
-                    raise Exception(f"Request failed after {self.retries} retries: {str(e)}")
-                time.sleep(self.retry_interval)
+            if attempt == policy.retries or not self._can_retry():
+                response.raise_for_status()
+            response.close()
+            self._retry_sleep(delay, upload)
         raise Exception("Unexpected error in request handling")
 
     # Core Separation Functions (updated with debug logs)
@@ -83,7 +1426,7 @@ class MVSEPClient:
                         sep_type: int = 11, add_opt1: Optional[Union[str, int]] = None,
                         add_opt2: Optional[Union[str, int]] = None, add_opt3: Optional[Union[str, int]] = None,
                         output_format: int = 0, is_demo: bool = False,
-                        remote_type: Optional[str] = None) -> Dict:
+                        remote_type: Optional[str] = None, progress_callback=None) -> Dict:
         self._log_debug(f"Creating separation with params: sep_type={sep_type}, output_format={output_format}")
         
         data = {
@@ -98,7 +1441,7 @@ class MVSEPClient:
             raise ValueError("Cannot specify both file_path and url")
         if file_path:
             self._log_debug(f"Uploading local file: {file_path}")
-            files["audiofile"] = open(file_path, "rb")
+            files["audiofile"] = file_path
         elif url:
             self._log_debug(f"Processing remote URL: {url}")
             data["url"] = url
@@ -111,126 +1454,532 @@ class MVSEPClient:
             if val is not None:
                 data[opt] = str(val)
         
-        response = self._make_request("POST", "separation/create", data=data, files=files)
-        json_response = response.json()
+        cache_key = None
+        if file_path and self.result_cache is not None:
+            cache_key = self.result_cache.make_key(file_path, data)
+            cached_hash = self.result_cache.get_hash(cache_key)
+            if cached_hash:
+                self._log_debug(f"Same file and parameters were already uploaded, reusing task {cached_hash}")
+                return {"success": True, "data": {"hash": cached_hash}, "cached": True, "cache_key": cache_key}
+
+        self.check_separation_params(sep_type, add_opt1, add_opt2, add_opt3)
+        token = None
+        if self.token_pool is not None:
+            token = self.token_pool.acquire()
+            data["api_token"] = token
+        progress = self._progress(file_path, "upload", progress_callback) if file_path else None
+        try:
+            response = self._make_request("POST", "separation/create", data=data, files=files, progress=progress)
+            json_response = response.json()
+        except Exception:
+            if token is not None:
+                self.token_pool.record_error(token)
+                self.token_pool.release(token)
+            raise
         self._log_debug(f"Create separation response: {json_response}")
+        if token is not None:
+            if json_response.get("success"):
+                # The slot of the token stays taken until the task is finished, see get_separation_status
+                self.token_pool.record_success(token)
+                with self._stats_lock:
+                    self._task_tokens[json_response["data"]["hash"]] = token
+            else:
+                self.token_pool.record_error(token)
+                self.token_pool.release(token)
+        if cache_key is not None and json_response.get("success"):
+            self.result_cache.put_hash(cache_key, json_response["data"]["hash"])
+            json_response["cache_key"] = cache_key
         return json_response
 
+    def check_separation_params(self, sep_type: int = 11, add_opt1: Optional[Union[str, int]] = None,
+                                add_opt2: Optional[Union[str, int]] = None, add_opt3: Optional[Union[str, int]] = None,
+                                **kwargs) -> None:
+        """Raise ValueError if the algorithm list shows that separation/create would reject these parameters,
+        so the file isn't uploaded for nothing. Other create_separation arguments in kwargs are ignored.
+        Before refusing, a cached list is revalidated once in case the algorithm was added since.
+        If the list can't be fetched the parameters are left to the server."""
+        if not self.validate_params:
+            return
+        try:
+            errors = self.get_catalog().validate(sep_type, add_opt1, add_opt2, add_opt3)
+            if errors:
+                errors = self.get_catalog(refresh=True).validate(sep_type, add_opt1, add_opt2, add_opt3)
+        except Exception as e:
+            self._log_debug(f"Separation parameters not checked, the algorithm list is not available: {e}")
+            return
+        if errors:
+            raise ValueError("Invalid separation parameters: " + "; ".join(errors))
+
     def get_separation_status(self, task_hash: str, mirror: int = 0) -> Dict:
         self._log_debug(f"Getting status for hash: {task_hash}, mirror={mirror}")
         params = {"hash": task_hash, "mirror": str(mirror)}
+        token = self.get_task_token(task_hash)
         if mirror == 1:
-            params["api_token"] = self.api_key
+            params["api_token"] = token
         response = self._make_request("GET", "separation/get", params=params)
         json_response = response.json()
         self._log_debug(f"Status response: {json_response}")
+        status = json_response.get("status")
+        if self.token_pool is not None and status is not None and status not in StatusPoller.ACTIVE_STATUSES:
+            self.release_task(task_hash)
         return json_response
 
-    def download_track(self, url: str, output_path: str) -> None:
+    def get_task_token(self, task_hash: str) -> str:
+        """Token that created task_hash (api_key for tasks not created through the token pool)"""
+        with self._stats_lock:
+            return self._task_tokens.get(task_hash, self.api_key)
+
+    def release_task(self, task_hash: str) -> None:
+        """Free the token pool slot of a task. Done automatically when its status is final."""
+        with self._stats_lock:
+            token = self._task_tokens.pop(task_hash, None)
+        if token is not None:
+            self.token_pool.release(token)
+
+    def _host_slot(self, url: str) -> threading.BoundedSemaphore:
+        host = urlsplit(url).netloc
+        with self._stats_lock:
+            slot = self._host_slots.get(host)
+            if slot is None:
+                slot = threading.BoundedSemaphore(self.max_downloads_per_host)
+                self._host_slots[host] = slot
+            return slot
+
+    def get_download_pool(self) -> ThreadPoolExecutor:
+        """Thread pool shared by all downloads of this client"""
+        with self._stats_lock:
+            if self._download_pool is None:
+                self._download_pool = ThreadPoolExecutor(self.download_workers, thread_name_prefix="mvsep-download")
+            return self._download_pool
+
+    def download_track(self, url: str, output_path: str, progress_callback=None) -> None:
         """Download a track directly using the full URL from the API response"""
-        self._log_debug(f"Downloading track directly from {url}")
-        
+        with self._host_slot(url):
+            self._download_track(url, output_path, progress_callback)
+
+    def _download_part(self, url: str, part_path: str, offset: int,
+                       progress: Optional[TransferProgress], hashing: Dict) -> bool:
+        """Append the rest of url to part_path starting at offset. Returns True when the file is complete.
+        hashing["digest"] holds the SHA-256 of the first offset bytes and is updated with everything written."""
         # Bypass the base URL since we have full download URLs
-        response = requests.get(url, stream=True, headers=self.headers)
-        response.raise_for_status()
-        
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        with open(output_path, "wb") as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
+        headers = dict(self.headers)
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+            self._log_debug(f"Resuming {part_path} from byte {offset}")
+        self._count_request()
+        with self._session().get(url, stream=True, headers=headers, timeout=(60, 300)) as response:
+            if response.status_code == 416:
+                # Range starts at the end of the file: the .part file is already complete
+                total = response.headers.get("Content-Range", "").rpartition("/")[2]
+                if total.isdigit() and int(total) == offset:
+                    return True
+                open(part_path, "wb").close()
+                hashing["digest"] = hashlib.sha256()
+                return False
+            response.raise_for_status()
+            if response.status_code != 206:
+                # The server ignored the Range header and sends the whole file
+                offset = 0
+                hashing["digest"] = hashlib.sha256()
+            length = response.headers.get("Content-Length", "")
+            expected = offset + int(length) if length.isdigit() else None
+            if progress is not None:
+                progress.total = expected
+                if progress.bytes_done != offset:
+                    progress.reset(offset)
+
+            written = offset
+            with open(part_path, "ab" if offset else "wb") as f:
+                for chunk in response.iter_content(chunk_size=8192):
+                    if chunk:
+                        f.write(chunk)
+                        hashing["digest"].update(chunk)
+                        written += len(chunk)
+                        if progress is not None:
+                            progress.update(len(chunk))
+        return expected is None or written >= expected
+
+    def download_tracks(self, files: List[Dict], output_dir: str, progress_callback=None) -> List[str]:
+        """Download all result files of a task in parallel through the shared download pool.
+        files is the "files" list of a finished task. Returns the paths in the same order."""
+        output_paths = []
+        futures = []
+        for file_info in files:
+            output_filename = file_info.get("download", f"unknown_{time.time()}.mp3")
+            output_path = os.path.join(output_dir, output_filename)
+            self._log_debug(f"Downloading {output_filename}")
+            output_paths.append(output_path)
+            futures.append(self.get_download_pool().submit(self.download_track, file_info["url"], output_path,
+                                                           progress_callback))
+        for future in futures:
+            future.result()
+        return output_paths
+
+    def _download_track(self, url: str, output_path: str, progress_callback=None) -> None:
+        """Download into output_path + ".part" and rename it when complete.
+        A .part file left by an interrupted download (or an earlier run) is resumed with a Range request;
+        a dropped connection resumes from the last written byte."""
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        manifest = self.get_manifest(os.path.dirname(output_path) or ".")
+        if self.skip_existing and self._is_downloaded(url, output_path, manifest):
+            self._log_debug(f"{output_path} is already downloaded, skipping")
+            return
+        self._log_debug(f"Downloading track directly from {url}")
+        part_path = output_path + ".part"
+        progress = self._progress(output_path, "download", progress_callback)
+        self.retry_budget.deposit()
+
+        # A .part file without a .segments file was written by a single stream and is resumed the same way
+        segmented = self.download_segments > 1 and (os.path.exists(part_path + ".segments")
+                                                    or not os.path.exists(part_path))
+        if segmented and self._download_segmented(url, part_path, progress):
+            # Ranges arrive out of order, so the file is hashed once it is complete
+            sha256 = file_sha256(part_path)
+        else:
+            sha256 = self._download_stream(url, part_path, progress)
+
+        os.replace(part_path, output_path)
+        manifest.add(output_path, sha256, url)
+        if progress is not None:
+            progress.finish()
         self._log_debug(f"Finished downloading to {output_path}")
 
+    def get_manifest(self, directory: str) -> DownloadManifest:
+        """Download manifest of a directory, shared by all threads of this client"""
+        directory = os.path.abspath(directory)
+        with self._stats_lock:
+            manifest = self._manifests.get(directory)
+            if manifest is None:
+                manifest = self._manifests[directory] = DownloadManifest(directory)
+            return manifest
+
+    def _is_downloaded(self, url: str, output_path: str, manifest: DownloadManifest) -> bool:
+        if not os.path.exists(output_path):
+            return False
+        entry = manifest.get(os.path.basename(output_path))
+        if entry is not None and entry.get("url") is not None:
+            return manifest.verify(output_path, url)
+        # A file from before the manifest (or its urls) existed: compare its size with the server's
+        self._count_request()
+        try:
+            with self._session().head(url, headers=self.headers, allow_redirects=True, timeout=(60, 300)) as response:
+                length = response.headers.get("Content-Length", "")
+                if response.status_code != 200 or not length.isdigit():
+                    return False
+        except RequestException:
+            return False
+        if int(length) != os.path.getsize(output_path):
+            return False
+        manifest.add(output_path, file_sha256(output_path), url)
+        return True
+
+    def _download_stream(self, url: str, part_path: str, progress: Optional[TransferProgress]) -> str:
+        """Download url into part_path as one stream, resuming after errors. Returns the SHA-256 of the file."""
+        policy = self.retry_policy
+        # Bytes already in a .part file from an earlier run are hashed once; the rest is hashed as it is written
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        hashing = {"digest": file_sha256(part_path, offset) if offset else hashlib.sha256()}
+        for attempt in range(policy.retries + 1):
+            offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+            try:
+                if self._download_part(url, part_path, offset, progress, hashing):
+                    return hashing["digest"].hexdigest()
+                error = "connection closed before the end of the file"
+            except RequestException as e:
+                if e.response is not None and not policy.is_retryable(e.response.status_code):
+                    self.retry_stats.record_fatal()
+                    raise
+                error = str(e)
+            self._log_debug(f"Download of {url} interrupted at {os.path.getsize(part_path)} bytes: {error}")
+            if attempt == policy.retries or not self._can_retry():
+                raise Exception(f"Download failed after {attempt} retries: {error}")
+            self._retry_sleep(policy.get_delay(attempt))
+
+    def _probe_size(self, url: str) -> Optional[int]:
+        """Size of the file at url, or None if the server does not answer Range requests"""
+        self._count_request()
+        headers = dict(self.headers, Range="bytes=0-0")
+        with self._session().get(url, stream=True, headers=headers, timeout=(60, 300)) as response:
+            response.raise_for_status()
+            total = response.headers.get("Content-Range", "").rpartition("/")[2]
+            if response.status_code != 206 or not total.isdigit():
+                return None
+            return int(total)
+
+    @staticmethod
+    def _save_segments(state_path: str, segments: List[Dict]) -> None:
+        tmp_path = state_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump([[seg["start"], seg["end"], seg["saved"]] for seg in segments], f)
+        os.replace(tmp_path, state_path)
+
+    def _download_segmented(self, url: str, part_path: str, progress: Optional[TransferProgress]) -> bool:
+        """Fetch the file as download_segments byte ranges in parallel into a preallocated part_path.
+        The position of every range is kept in part_path + ".segments", so an interrupted download
+        continues where each range stopped. Returns False if the file should be downloaded as one stream.
+        Every parallel connection takes a slot of max_downloads_per_host: the caller's slot is used by the
+        first one, and only as many more connections are opened as there are free slots for the host."""
+        state_path = part_path + ".segments"
+        if os.path.exists(state_path) and os.path.exists(part_path):
+            with open(state_path) as f:
+                segments = [{"start": start, "end": end, "pos": saved, "saved": saved}
+                            for start, end, saved in json.load(f)]
+            total = segments[-1]["end"] + 1
+            self._log_debug(f"Resuming segmented download of {part_path}")
+        else:
+            total = self._probe_size(url)
+            if total is None or total < max(self.segment_min_size, 1):
+                self._log_debug(f"Downloading {url} as a single stream")
+                return False
+            size = -(-total // self.download_segments)
+            segments = [{"start": start, "end": min(start + size, total) - 1, "pos": start, "saved": start}
+                        for start in range(0, total, size)]
+            with open(part_path, "wb") as f:
+                f.truncate(total)
+            self._save_segments(state_path, segments)
+            self._log_debug(f"Downloading {url} ({total} bytes) as {len(segments)} segments")
+
+        if progress is not None:
+            progress.total = total
+            progress.reset(sum(seg["pos"] - seg["start"] for seg in segments))
+        lock = threading.Lock()
+        remaining = [seg for seg in segments if seg["pos"] <= seg["end"]]
+        # Slots are taken without waiting: other downloads may hold the rest and wait for nothing from this one
+        host_slot = self._host_slot(url)
+        extra_slots = 0
+        while extra_slots < len(remaining) - 1 and host_slot.acquire(blocking=False):
+            extra_slots += 1
+        if extra_slots + 1 < len(remaining):
+            self._log_debug(f"{extra_slots + 1} connections for {len(remaining)} segments of {url}, "
+                            f"the other download slots of the host are taken")
+        try:
+            # Segments use their own threads: the calling thread may already be one of the download pool workers
+            with ThreadPoolExecutor(extra_slots + 1, thread_name_prefix="mvsep-segment") as pool:
+                futures = [pool.submit(self._download_segment, url, part_path, state_path, seg, segments, lock,
+                                       progress) for seg in remaining]
+                for future in futures:
+                    future.result()
+        finally:
+            for _ in range(extra_slots):
+                host_slot.release()
+
+        if os.path.getsize(part_path) != total:
+            raise Exception(f"Downloaded file {part_path} has {os.path.getsize(part_path)} bytes, expected {total}")
+        os.remove(state_path)
+        return True
+
+    def _download_segment(self, url: str, part_path: str, state_path: str, seg: Dict, segments: List[Dict],
+                          lock: threading.Lock, progress: Optional[TransferProgress]) -> None:
+        policy = self.retry_policy
+        for attempt in range(policy.retries + 1):
+            try:
+                self._count_request()
+                headers = dict(self.headers, Range=f"bytes={seg['pos']}-{seg['end']}")
+                with self._session().get(url, stream=True, headers=headers, timeout=(60, 300)) as response:
+                    response.raise_for_status()
+                    if response.status_code != 206:
+                        raise Exception(f"Server ignored the Range request for {url}")
+                    with open(part_path, "r+b") as f:
+                        f.seek(seg["pos"])
+                        unsaved = 0
+                        for chunk in response.iter_content(chunk_size=65536):
+                            chunk = chunk[:seg["end"] + 1 - seg["pos"]]
+                            if not chunk:
+                                continue
+                            f.write(chunk)
+                            seg["pos"] += len(chunk)
+                            unsaved += len(chunk)
+                            # Only flushed bytes are recorded, so a restart never skips unwritten data
+                            if unsaved >= 4 * 1024 * 1024:
+                                f.flush()
+                                unsaved = 0
+                                with lock:
+                                    seg["saved"] = seg["pos"]
+                                    self._save_segments(state_path, segments)
+                            if progress is not None:
+                                with lock:
+                                    progress.update(len(chunk))
+                if seg["pos"] > seg["end"]:
+                    return
+                error = "connection closed before the end of the segment"
+            except RequestException as e:
+                if e.response is not None and not policy.is_retryable(e.response.status_code):
+                    self.retry_stats.record_fatal()
+                    raise
+                error = str(e)
+            finally:
+                # The part file is closed here, so everything up to pos is on disk
+                with lock:
+                    seg["saved"] = seg["pos"]
+                    self._save_segments(state_path, segments)
+            self._log_debug(f"Segment {seg['start']}-{seg['end']} of {url} interrupted: {error}")
+            if attempt == policy.retries or not self._can_retry():
+                raise Exception(f"Download failed after {attempt} retries: {error}")
+            self._retry_sleep(policy.get_delay(attempt))
+
+    def start_separation(self, file_path: str, journal: JobJournal, **kwargs) -> Dict:
+        """create_separation for batch processing with a checkpoint in journal.
+        If an earlier run already uploaded the file with the same parameters and the server still has the task,
+        its hash is reused ("resumed" is set). If all result files were downloaded too, "done" is set and
+        "files" lists them. The response always has "journal_key"."""
+        key = journal.make_key(file_path, kwargs)
+        entry = journal.get(key) or {}
+        if entry.get("done"):
+            manifest = self.get_manifest(journal.directory)
+            paths = [os.path.join(journal.directory, name) for name in entry["files"]]
+            if all(manifest.verify(path) for path in paths):
+                return {"success": True, "data": {"hash": entry["hash"]}, "done": True, "files": paths,
+                        "journal_key": key}
+
+        task_hash = journal.get_hash(key)
+        if task_hash:
+            status_resp = self.get_separation_status(task_hash)
+            if status_resp.get("success") and status_resp.get("status") not in ("failed", "not_found"):
+                self._log_debug(f"Resuming task {task_hash} of {file_path}, not uploading it again")
+                return {"success": True, "data": {"hash": task_hash}, "resumed": True, "journal_key": key}
+            self._log_debug(f"Task {task_hash} of {file_path} is gone from the server, uploading again")
+
+        create_resp = self.create_separation(file_path=file_path, **kwargs)
+        if create_resp.get("success"):
+            journal.record(key, file=os.path.abspath(file_path), hash=create_resp["data"]["hash"],
+                           created=time.time(), done=False, files=[])
+        create_resp["journal_key"] = key
+        return create_resp
 
     # Updated process_directory with debug logs
-    def process_directory(self, input_dir: str, output_dir: str, **kwargs) -> None:
+    def process_directory(self, input_dir: str, output_dir: str, concurrent: bool = False,
+                          upload_workers: int = 4, download_workers: int = 4, max_in_flight: int = 32,
+                          ordered: bool = False, **kwargs) -> None:
+        """Separate every audio file of input_dir. With concurrent=True many files are uploaded, processed
+        on the server and downloaded at the same time (see SeparationPipeline), otherwise one by one."""
         self._log_debug(f"Processing directory: {input_dir} -> {output_dir}")
+        # Checked once for the whole folder instead of failing every file
+        self.check_separation_params(**kwargs)
         supported_ext = [".mp3", ".wav", ".flac"]
         os.makedirs(output_dir, exist_ok=True)
-        filtered_files = os.listdir(input_dir)
-
-        for filename in filtered_files:
+        filtered_files = []
+        for filename in os.listdir(input_dir):
             if os.path.splitext(filename)[1].lower() not in supported_ext:
                 self._log_debug(f"Skipping unsupported file: {filename}")
                 continue
-            
+            filtered_files.append(filename)
+
+        if concurrent:
+            pipeline = SeparationPipeline(self, output_dir, upload_workers=upload_workers,
+                                          download_workers=download_workers, max_in_flight=max_in_flight)
+            file_paths = [os.path.join(input_dir, filename) for filename in filtered_files]
+            for result in pipeline.run(file_paths, ordered=ordered, **kwargs):
+                if result["error"]:
+                    print(f"Error processing {os.path.basename(result['file'])}: {result['error']}")
+            print(pipeline.format_summary())
+            return
+
+        journal = JobJournal(output_dir)
+        for filename in filtered_files:
             file_path = os.path.join(input_dir, filename)
             self._log_debug(f"Processing {filename}")
-            
             try:
-                create_resp = self.create_separation(file_path=file_path, **kwargs)
-                if not create_resp.get("success"):
-                    self._log_debug(f"Creation failed response: {create_resp}")
-                    continue
-                
-                task_hash = create_resp["data"]["hash"]
-                self._log_debug(f"Created separation task: {task_hash}")
-                
-                while True:
-                    status_resp = self.get_separation_status(task_hash)
-                    self._log_debug(f"Status poll response: {status_resp}")
-                    
-                    status = status_resp.get("status")
-                    if status == "done":
-                        self._log_debug("Processing completed successfully")
-                        break
-                    if status in ["failed", "error"]:
-                        self._log_debug("Processing failed")
-                        break
-                    if status in ["waiting", "processing", "distributing", "merging"]:
-                        self._log_debug(f"Current status: {status}, waiting {self.retry_interval}s")
-                        time.sleep(self.retry_interval)
-                    else:
-                        self._log_debug(f"Unknown status: {status}")
-                        break
-                
-                if status != "done":
-                    continue
-                
-                # FIXED: Use 'download' key instead of 'name'
-                for file_info in status_resp["data"]["files"]:
-                    output_filename = file_info.get("download", f"unknown_{time.time()}.mp3")
-                    output_path = os.path.join(output_dir, output_filename)
-                    self._log_debug(f"Downloading {output_filename}")
-                    # FIXED: Use 'url' key instead of 'link'
-                    self.download_track(file_info["url"], output_path)
-            
+                self.separate_file(file_path, output_dir, journal, **kwargs)
             except Exception as e:
                 self._log_debug(f"Exception during processing: {str(e)}")
                 print(f"Error processing {filename}: {str(e)}")
 
+    def separate_file(self, file_path: str, output_dir: str, journal: Optional[JobJournal] = None,
+                      **kwargs) -> List[str]:
+        """Separate one file and download its result files into output_dir; returns their paths.
+        Uses the result cache and the journal (JobJournal(output_dir) by default) like process_directory,
+        so files already separated are not uploaded again. Raises an exception if the separation failed."""
+        os.makedirs(output_dir, exist_ok=True)
+        journal = journal or JobJournal(output_dir)
+        filename = os.path.basename(file_path)
+        create_resp = self.start_separation(file_path, journal, **kwargs)
+        if create_resp.get("done"):
+            self._log_debug(f"{filename} was already separated and downloaded, skipping")
+            return create_resp["files"]
+        if not create_resp.get("success"):
+            self._log_debug(f"Creation failed response: {create_resp}")
+            raise Exception(f"Creation failed: {create_resp}")
+
+        cache_key = create_resp.get("cache_key")
+        restored = self.result_cache.restore(cache_key, output_dir) if cache_key else []
+        if restored:
+            self._log_debug(f"Result files of {filename} restored from cache")
+            journal.record(create_resp["journal_key"], done=True,
+                           files=[os.path.basename(path) for path in restored])
+            return restored
+
+        task_hash = create_resp["data"]["hash"]
+        self._log_debug(f"Created separation task: {task_hash}")
+
+        status_resp = self.get_status_poller().wait(task_hash) or {}
+        self._log_debug(f"Status poll response: {status_resp}")
+        status = status_resp.get("status")
+        if status != "done":
+            self._log_debug(f"Processing failed, status: {status}")
+            raise Exception(status_resp.get("error") or f"Separation status: {status}")
+        self._log_debug("Processing completed successfully")
+
+        # All result files are downloaded at the same time
+        output_paths = self.download_tracks(status_resp["data"]["files"], output_dir)
+        journal.record(create_resp["journal_key"], done=True,
+                       files=[os.path.basename(path) for path in output_paths])
+        if cache_key:
+            self.result_cache.put_files(cache_key, output_paths)
+        return output_paths
+
     # Updated get_algorithms with debug logs
     def get_algorithms(self) -> Dict:
-        self._log_debug("Fetching algorithm list")
-        response = self._make_request("GET", "app/algorithms")
-        sorted_algos = sorted(response.json(), key=lambda algo: algo['render_id'])
-        algo_dict = {}
-
-        for algo in sorted_algos:
-            s1 = f"\nID:{algo['render_id']} - {algo['name']}"
-            algo_dict[algo['render_id']] = s1 + '\n'
-            # print(s1)
-            for field in algo['algorithm_fields']:
-                s1 = f"\t{field['name']}"
-                algo_dict[algo['render_id']] += s1 + '\n'
-                # print(s1)
-                options = json.loads(field['options'])
-                for key, value in sorted(options.items()):
-                    s1 = f"\t\t{key}: {value}"
-                    algo_dict[algo['render_id']] += s1 + '\n'
-                    # print(s1)
-        return algo_dict
+        return format_algorithms(self.get_catalog())
+
+    def get_catalog(self, refresh: bool = False) -> AlgorithmCatalog:
+        """AlgorithmCatalog of get_algorithm_list(), parsed again only when the list changed"""
+        algorithms = self.get_algorithm_list(refresh)
+        with self._stats_lock:
+            if self._catalog is None or self._catalog[0] is not algorithms:
+                self._catalog = (algorithms, AlgorithmCatalog(algorithms))
+            return self._catalog[1]
+
+    def get_algorithm_list(self, refresh: bool = False) -> List[Dict]:
+        """The app/algorithms payload, from the catalog cache while it is fresh (or refresh=True to revalidate).
+        A stale list is revalidated with a conditional request; if that fails the stale list is returned."""
+        cache = self.catalog_cache
+        entry = cache.load()
+        if entry is not None and not refresh and cache.is_fresh(entry):
+            return entry["algorithms"]
+        if entry is None:
+            self._log_debug("Fetching algorithm list")
+            response = self._make_request("GET", "app/algorithms")
+            return cache.store(response.json(), response.headers)["algorithms"]
+
+        self._log_debug("Revalidating cached algorithm list")
+        headers = dict(self.headers, **cache.validators(entry))
+        try:
+            self._count_request()
+            response = self._session().get(f"{self.base_url}/app/algorithms", headers=headers, timeout=cache.timeout)
+            if response.status_code == 304:
+                return cache.touch(response.headers)["algorithms"]
+            response.raise_for_status()
+            return cache.store(response.json(), response.headers)["algorithms"]
+        except (RequestException, ValueError) as e:
+            self._log_debug(f"Using cached algorithm list, the API request failed: {e}")
+            return entry["algorithms"]
 
     # Premium Management
-    def enable_premium(self) -> Dict:
-        data = {"api_token": self.api_key}
-        response = self._make_request("POST", "app/enable_premium", data=data)
-        return response.json()
+    def enable_premium(self, token: Optional[str] = None) -> Dict:
+        return self._set_premium(True, token)
 
-    def disable_premium(self) -> Dict:
-        data = {"api_token": self.api_key}
-        response = self._make_request("POST", "app/disable_premium", data=data)
-        return response.json()
+    def disable_premium(self, token: Optional[str] = None) -> Dict:
+        return self._set_premium(False, token)
+
+    def _set_premium(self, enabled: bool, token: Optional[str] = None) -> Dict:
+        token = token or self.api_key
+        data = {"api_token": token}
+        endpoint = "app/enable_premium" if enabled else "app/disable_premium"
+        response = self._make_request("POST", endpoint, data=data)
+        json_response = response.json()
+        if self.token_pool is not None and json_response.get("success"):
+            self.token_pool.set_premium(token, enabled)
+        return json_response
 
     # Quality Checker
     def create_quality_entry(self, zip_path: str, algo_name: str, main_text: str,
@@ -243,8 +1992,9 @@ class MVSEPClient:
             "ensemble": str(ensemble),
             "password": password
         }
-        files = {"zipfile": open(zip_path, "rb")}
-        response = self._make_request("POST", "quality_checker/add", data=data, files=files)
+        files = {"zipfile": zip_path}
+        response = self._make_request("POST", "quality_checker/add", data=data, files=files,
+                                      progress=self._progress(zip_path, "upload"))
         return response.json()
 
     # Additional API Endpoints
@@ -274,6 +2024,295 @@ class MVSEPClient:
         return response.json()
 
 
+class SeparationPipeline:
+    """Processes many files at once with three separate stages:
+    uploads run in a pool of `upload_workers` threads, the client's StatusPoller tracks the status of all
+    uploaded tasks and the result files of finished tasks are downloaded in a pool of `download_workers`
+    threads, one file per job, limited by the client's max_downloads_per_host. At most `max_in_flight` files are between upload and end of download at any time."""
+
+    def __init__(self, client: MVSEPClient, output_dir: str, upload_workers: int = 4,
+                 download_workers: int = 4, max_in_flight: int = 32, poll_interval: Optional[float] = None):
+        self.client = client
+        self.output_dir = output_dir
+        self.upload_workers = upload_workers
+        self.download_workers = download_workers
+        self.max_in_flight = max_in_flight
+        # None lets the client's StatusPoller choose poll times adaptively
+        self.poll_interval = poll_interval
+        self.summary = {}
+        self._summary_lock = threading.Lock()
+        # Task hashes and finished files are checkpointed, so a restarted run continues where this one stopped
+        self.journal = JobJournal(output_dir)
+
+    def _add_to_summary(self, key: str, value: int) -> None:
+        with self._summary_lock:
+            self.summary[key] += value
+
+    def run(self, file_paths: List[str], ordered: bool = False, **kwargs) -> Iterator[Dict]:
+        """Yield one result dict per file: {"file", "hash", "status", "files", "error"}.
+        Results come in input order if ordered=True, otherwise as soon as each file is finished.
+        Raises ValueError before any upload if kwargs are invalid separation parameters."""
+        self.client.check_separation_params(**kwargs)
+        os.makedirs(self.output_dir, exist_ok=True)
+        start_time = time.monotonic()
+        results = queue.Queue()
+        in_flight = threading.BoundedSemaphore(self.max_in_flight)
+        stop = threading.Event()
+        poller = self.client.get_status_poller()
+        # Hashes given to the shared poller by this run, untracked when the run stops before they finish
+        tracked = []
+        upload_pool = ThreadPoolExecutor(self.upload_workers, thread_name_prefix="mvsep-upload")
+        download_pool = ThreadPoolExecutor(self.download_workers, thread_name_prefix="mvsep-download")
+        self.summary = {"files": len(file_paths), "done": 0, "failed": 0,
+                        "bytes_uploaded": 0, "bytes_downloaded": 0, "elapsed": 0.0}
+
+        def finish(result):
+            in_flight.release()
+            results.put(result)
+
+        def upload(index, path):
+            result = {"index": index, "file": path, "hash": None, "status": None, "files": [], "error": None,
+                      "cache_key": None, "journal_key": None}
+            try:
+                create_resp = self.client.start_separation(path, self.journal, **kwargs)
+                if not create_resp.get("success"):
+                    result["error"] = f"Creation failed: {create_resp}"
+                    finish(result)
+                    return
+                result["hash"] = create_resp["data"]["hash"]
+                result["journal_key"] = create_resp["journal_key"]
+                if create_resp.get("done"):
+                    result["status"] = "done"
+                    result["files"] = create_resp["files"]
+                    finish(result)
+                    return
+                result["cache_key"] = create_resp.get("cache_key")
+                if result["cache_key"]:
+                    result["files"] = self.client.result_cache.restore(result["cache_key"], self.output_dir)
+                    if result["files"]:
+                        result["status"] = "cached"
+                        self.journal.record(result["journal_key"], done=True,
+                                            files=[os.path.basename(path) for path in result["files"]])
+                        finish(result)
+                        return
+                if not create_resp.get("cached") and not create_resp.get("resumed"):
+                    self._add_to_summary("bytes_uploaded", os.path.getsize(path))
+                self.client._log_debug(f"Created separation task: {result['hash']}")
+                with self._summary_lock:
+                    tracked.append(result["hash"])
+                poller.track(result["hash"], lambda _, status, status_resp: on_status(result, status, status_resp),
+                             interval=self.poll_interval)
+                if stop.is_set():
+                    poller.untrack(result["hash"])
+            except Exception as e:
+                result["error"] = str(e)
+                finish(result)
+
+        def download_stem(result, file_info, remaining):
+            output_filename = file_info.get("download", f"unknown_{time.time()}.mp3")
+            output_path = os.path.join(self.output_dir, output_filename)
+            try:
+                self.client.download_track(file_info["url"], output_path)
+                self._add_to_summary("bytes_downloaded", os.path.getsize(output_path))
+                with self._summary_lock:
+                    result["files"].append(output_path)
+            except Exception as e:
+                result["error"] = str(e)
+            with self._summary_lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            if not result["error"]:
+                self.journal.record(result["journal_key"], done=True,
+                                    files=[os.path.basename(path) for path in result["files"]])
+                if result.get("cache_key"):
+                    self.client.result_cache.put_files(result["cache_key"], result["files"])
+            finish(result)
+
+        def download(result, files):
+            # Every result file is a separate job of the download pool, so the stems of
+            # one task and of different tasks are all fetched at the same time
+            if not files:
+                finish(result)
+                return
+            remaining = [len(files)]
+            for file_info in files:
+                download_pool.submit(download_stem, result, file_info, remaining)
+
+        def feed():
+            for index, path in enumerate(file_paths):
+                while not in_flight.acquire(timeout=0.5):
+                    if stop.is_set():
+                        return
+                if stop.is_set():
+                    return
+                upload_pool.submit(upload, index, path)
+
+        def on_status(result, status, status_resp):
+            result["status"] = status
+            if status in StatusPoller.ACTIVE_STATUSES or stop.is_set():
+                return
+            if status == "done":
+                download(result, status_resp["data"]["files"])
+            else:
+                result["error"] = status_resp.get("error") or f"Separation status: {status}"
+                finish(result)
+
+        threading.Thread(target=feed, daemon=True).start()
+
+        pending = {}
+        next_index = 0
+        try:
+            for _ in range(len(file_paths)):
+                result = results.get()
+                if result["error"]:
+                    self.summary["failed"] += 1
+                else:
+                    self.summary["done"] += 1
+                if not ordered:
+                    yield result
+                    continue
+                pending[result["index"]] = result
+                while next_index in pending:
+                    yield pending.pop(next_index)
+                    next_index += 1
+        finally:
+            stop.set()
+            upload_pool.shutdown(wait=False, cancel_futures=True)
+            download_pool.shutdown(wait=False, cancel_futures=True)
+            with self._summary_lock:
+                task_hashes = list(tracked)
+            # Finished tasks were already dropped by the poller, so this only frees the slots of unfinished ones
+            for task_hash in task_hashes:
+                poller.untrack(task_hash)
+            self.summary["elapsed"] = time.monotonic() - start_time
+
+    def format_summary(self) -> str:
+        summary = self.summary
+        elapsed = max(summary.get("elapsed", 0), 1e-9)
+        return (f"Processed {summary['files']} files in {elapsed:.1f}s: {summary['done']} done, "
+                f"{summary['failed']} failed, {summary['files'] / elapsed * 60:.1f} files/min, "
+                f"upload {summary['bytes_uploaded'] / elapsed / 1024 / 1024:.2f} MB/s, "
+                f"download {summary['bytes_downloaded'] / elapsed / 1024 / 1024:.2f} MB/s")
+
+
+class SeparationGraph:
+    """Chains of separations where the result stems of one stage are separated again by the next ones.
+    stages is a list of dicts with a unique "name", the create_separation parameters (sep_type, add_opt1...)
+    and optionally "input" (name of the stage whose stems are separated, the original file if missing) and
+    "stem" (part of the result file name that selects the stems, e.g. "vocals"; every stem if missing):
+
+        [{"name": "split", "sep_type": 40, "output_format": 1},
+         {"name": "dereverb", "input": "split", "stem": "vocals", "sep_type": 22, "output_format": 1},
+         {"name": "karaoke", "input": "dereverb", "stem": "noreverb", "sep_type": 49, "output_format": 1}]
+
+    A stage starts as soon as the stems it needs are downloaded, and stages that don't depend on each other
+    run at the same time (up to `workers` separations at once). Every separation goes through
+    separate_file, so stages already finished (journal) or separated before (result cache) aren't uploaded
+    again and the stages after them start immediately."""
+
+    STAGE_KEYS = ["name", "input", "stem"]
+
+    def __init__(self, client: MVSEPClient, stages: List[Dict], workers: int = 8):
+        self.client = client
+        self.workers = workers
+        self.stages = {}
+        self.children = {None: []}
+        for stage in stages:
+            name = stage.get("name")
+            if not name or name in self.stages:
+                raise ValueError(f"Every stage needs a unique name: {stage}")
+            self.stages[name] = stage
+            self.children[name] = []
+        for stage in stages:
+            parent = stage.get("input")
+            if parent is not None and parent not in self.stages:
+                raise ValueError(f"Stage {stage['name']} reads the output of unknown stage {parent}")
+            self.children[parent].append(stage)
+        # Stages in a cycle are never reached from the original file
+        reachable = set()
+        todo = [None]
+        while todo:
+            for stage in self.children[todo.pop()]:
+                reachable.add(stage["name"])
+                todo.append(stage["name"])
+        if len(reachable) != len(self.stages):
+            raise ValueError(f"Stages in a cycle: {sorted(set(self.stages) - reachable)}")
+        self._journals = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def select_stems(paths: List[str], stem: Optional[str]) -> List[str]:
+        """Result files whose name contains stem (case insensitive); all of them if stem is None"""
+        if not stem:
+            return list(paths)
+        return [path for path in paths if stem.lower() in os.path.basename(path).lower()]
+
+    def _params(self, stage: Dict) -> Dict:
+        """create_separation parameters of a stage"""
+        return {key: value for key, value in stage.items() if key not in self.STAGE_KEYS}
+
+    def _journal(self, directory: str) -> JobJournal:
+        # One journal per folder, stems of the same stage are separated from several threads
+        with self._lock:
+            if directory not in self._journals:
+                os.makedirs(directory, exist_ok=True)
+                self._journals[directory] = JobJournal(directory)
+            return self._journals[directory]
+
+    def run(self, file_paths: List[str], output_dir: str) -> Iterator[Dict]:
+        """Yield one result dict per separation as soon as it is finished:
+        {"file", "stage", "input", "files", "error"}. The stems of stage S for file F are saved to
+        <output_dir>/<name of F>/<S>. A failed stage is reported and the stages after it are skipped.
+        Raises ValueError before any upload if a stage has invalid separation parameters."""
+        for stage in self.stages.values():
+            try:
+                self.client.check_separation_params(**self._params(stage))
+            except ValueError as e:
+                raise ValueError(f"Stage {stage['name']}: {e}") from None
+        results = queue.Queue()
+        pending = [0]
+        pool = ThreadPoolExecutor(self.workers, thread_name_prefix="mvsep-stage")
+
+        def submit(stage, source, input_path):
+            with self._lock:
+                pending[0] += 1
+            pool.submit(run_stage, stage, source, input_path)
+
+        def run_stage(stage, source, input_path):
+            result = {"file": source, "stage": stage["name"], "input": input_path, "files": [], "error": None}
+            try:
+                stage_dir = os.path.join(output_dir, os.path.splitext(os.path.basename(source))[0], stage["name"])
+                self.client._log_debug(f"Stage {stage['name']}: {input_path}")
+                result["files"] = self.client.separate_file(input_path, stage_dir, self._journal(stage_dir),
+                                                            **self._params(stage))
+                for child in self.children[stage["name"]]:
+                    stems = self.select_stems(result["files"], child.get("stem"))
+                    if not stems:
+                        raise Exception(f"No result file of stage {stage['name']} matches "
+                                        f"'{child.get('stem')}' for stage {child['name']}")
+                    for path in stems:
+                        submit(child, source, path)
+            except Exception as e:
+                result["error"] = str(e)
+            results.put(result)
+
+        for path in file_paths:
+            for stage in self.children[None]:
+                submit(stage, path, path)
+        try:
+            while True:
+                with self._lock:
+                    if not pending[0]:
+                        break
+                result = results.get()
+                with self._lock:
+                    pending[0] -= 1
+                yield result
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
 def parse_args(dict_args: Union[dict, None]) -> argparse.Namespace:
     """
     Parse command-line arguments for configuring the model, dataset, and training parameters.
@@ -293,12 +2332,25 @@ def parse_args(dict_args: Union[dict, None]) -> argparse.Namespace:
     create_separation_parser = subparsers.add_parser('separate', help="Create a new separation.")
     create_separation_parser.add_argument('--input', type=str, help="Path to the folder where to search files to be separated.")
     create_separation_parser.add_argument('--output_folder', type=str, default="./", help="Path to store the result files.")
-    create_separation_parser.add_argument('--token', type=str, help="API token for authentication.")
+    create_separation_parser.add_argument('--token', type=str, help="API token for authentication. Several comma separated tokens spread the separations over these accounts.")
+    create_separation_parser.add_argument('--token_concurrency', type=int, default=4, help="Maximum number of separations in progress per token (with several tokens).")
     create_separation_parser.add_argument('--output_format', type=int, default=1, help="Output format: MP3=0, WAV=1, FLAC=2")
     create_separation_parser.add_argument('--sep_type', type=int, default=20, help="Separation type.")
     create_separation_parser.add_argument('--add_opt1', type=str, default="", help="Additional option 1.")
     create_separation_parser.add_argument('--add_opt2', type=str, default="", help="Additional option 2.")
     create_separation_parser.add_argument('--add_opt3', type=str, default="", help="Additional option 3.")
+    create_separation_parser.add_argument('--concurrent', action='store_true', help="Upload, process and download many files at once.")
+    create_separation_parser.add_argument('--upload_workers', type=int, default=4, help="Number of parallel uploads (with --concurrent).")
+    create_separation_parser.add_argument('--download_workers', type=int, default=4, help="Number of parallel downloads (with --concurrent).")
+    create_separation_parser.add_argument('--max_in_flight', type=int, default=32, help="Maximum number of files in progress at once (with --concurrent).")
+    create_separation_parser.add_argument('--ordered', action='store_true', help="Report results in input order (with --concurrent).")
+    create_separation_parser.add_argument('--progress', action='store_true', help="Show upload and download progress.")
+    create_separation_parser.add_argument('--redownload', action='store_true', help="Download result files again even if they are already in the output folder.")
+    create_separation_parser.add_argument('--download_segments', type=int, default=1, help="Download result files of 64 MB and more as this many parallel byte ranges.")
+    create_separation_parser.add_argument('--stages', type=str, default="", help="JSON file with a chain of separations (see SeparationGraph). --sep_type and --add_opt* are ignored.")
+    create_separation_parser.add_argument('--stage_workers', type=int, default=8, help="Maximum number of separations in progress at once (with --stages).")
+    create_separation_parser.add_argument('--cache_dir', type=str, default="", help="Folder of the local result cache. Files already separated with the same parameters are not uploaded again.")
+    create_separation_parser.add_argument('--cache_size_mb', type=int, default=10240, help="Maximum size of result files kept in the cache.")
 
     args = parser.parse_args()
     return args
@@ -308,27 +2360,64 @@ if __name__ == "__main__":
     args = parse_args(None)
 
     # Example Usage
-    API_KEY = args.token
+    API_KEYS = [token.strip() for token in (args.token or "").split(",") if token.strip()]
+    API_KEY = API_KEYS[0] if API_KEYS else args.token
     client = MVSEPClient(api_key=API_KEY, debug=True)  # USE DEBUG, ELSE NOTHING WILL BE PRINTED ON TERMINAL, normal prints are not done yet
+    if len(API_KEYS) > 1:
+        client.token_pool = TokenPool(API_KEYS, max_concurrent=getattr(args, 'token_concurrency', 4))
+    if getattr(args, 'progress', False):
+        client.progress_callback = ConsoleProgress()
+    client.download_segments = getattr(args, 'download_segments', 1)
+    client.skip_existing = not getattr(args, 'redownload', False)
+    if getattr(args, 'cache_dir', ""):
+        client.result_cache = ResultCache(args.cache_dir, max_bytes=args.cache_size_mb * 1024 * 1024)
 
-    if args.command == 'separate':
+    if args.command == 'separate' and args.stages:
+        with open(args.stages, "r", encoding="utf-8") as f:
+            graph = SeparationGraph(client, json.load(f), workers=args.stage_workers)
+        file_paths = [os.path.join(args.input, filename) for filename in sorted(os.listdir(args.input))
+                      if os.path.splitext(filename)[1].lower() in [".mp3", ".wav", ".flac"]]
+        try:
+            for result in graph.run(file_paths, args.output_folder):
+                if result["error"]:
+                    print(f"Error in stage {result['stage']} of {os.path.basename(result['input'])}: {result['error']}")
+                else:
+                    print(f"Stage {result['stage']} of {os.path.basename(result['input'])}: {len(result['files'])} files")
+        except ValueError as e:
+            print(f"Error: {e}")
+    elif args.command == 'separate':
         algos = client.get_algorithms()
         print('Separate with algorithm: {}'.format(args.sep_type))
-        print(algos[args.sep_type])
+        print(algos.get(args.sep_type, "Unknown separation type"))
 
         # Process directory example / need to check if retries are working correctly !!!
-        client.process_directory(
-            input_dir = args.input,
-            output_dir = args.output_folder,
-            output_format = args.output_format,  # MP3=0, WAV=1, FLAC=2
-            sep_type = args.sep_type, # use client.get_algorithms() or check documentation details https://mvsep.com/en/full_api for now
-            add_opt1 = args.add_opt1, # use client.get_algorithms() or check documentation details https://mvsep.com/en/full_api for now
-            add_opt2 = args.add_opt2, # use client.get_algorithms() or check documentation details https://mvsep.com/en/full_api for now
-            add_opt3 = args.add_opt3, # use client.get_algorithms() or check documentation details https://mvsep.com/en/full_api for now
-        )
+        try:
+            client.process_directory(
+                input_dir = args.input,
+                output_dir = args.output_folder,
+                output_format = args.output_format,  # MP3=0, WAV=1, FLAC=2
+                sep_type = args.sep_type, # use client.get_algorithms() or check documentation details https://mvsep.com/en/full_api for now
+                add_opt1 = args.add_opt1, # use client.get_algorithms() or check documentation details https://mvsep.com/en/full_api for now
+                add_opt2 = args.add_opt2, # use client.get_algorithms() or check documentation details https://mvsep.com/en/full_api for now
+                add_opt3 = args.add_opt3, # use client.get_algorithms() or check documentation details https://mvsep.com/en/full_api for now
+                concurrent = args.concurrent,
+                upload_workers = args.upload_workers,
+                download_workers = args.download_workers,
+                max_in_flight = args.max_in_flight,
+                ordered = args.ordered,
+            )
+        except ValueError as e:
+            print(f"Error: {e}")
     else:
         # Get algos formated list : DONE !
         algos = client.get_algorithms()
         for algo in algos:
             print(algos[algo])
 
+    client._log_debug(f"Connection stats: {client.get_connection_stats()}")
+    client._log_debug(f"Retry stats: {client.get_retry_stats()}")
+    client._log_debug(f"Rate limiter stats: {client.rate_limiter.get_stats()}")
+    if client.token_pool is not None:
+        client._log_debug(f"Token pool stats: {client.token_pool.get_stats()}")
+    client.close()
+
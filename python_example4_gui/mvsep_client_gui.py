@@ -1,4 +1,6 @@
-import time, os, json
+import time, os
+import heapq, threading
+from concurrent.futures import ThreadPoolExecutor
 
 from PyQt6.QtWidgets import (
     QApplication, QWidget, QPushButton, QVBoxLayout, QLabel, QDialog,
@@ -6,10 +8,14 @@ from PyQt6.QtWidgets import (
 )
 import sys
 import requests
-import json
 from PyQt6.QtCore import QMimeData, Qt, QThread, pyqtSignal, pyqtSlot
 from PyQt6.QtGui import QDrag
 
+# The API helpers (algorithm catalog, uploads, downloads with the manifest) are shared with example 5
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "python_example5_gui"))
+from mvsep_jobs import (AlgorithmCatalog, get_catalog, create_separation, check_result, get_result,
+                        download_files, format_progress)
+
 # File directory
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 
@@ -41,178 +47,149 @@ path_hash_dict = {}
 separation_n = 0
 
 
-def get_separation_types():
-    # Request URL
-    api_url = 'https://mvsep.com/api/app/algorithms'
-
-    # Making a GET request
-    response = requests.get(api_url)
-
-    # Checking the response status code
-    if response.status_code == 200:
-        # Parsing the response into JSON
-        data = response.json()
-        result = {}  # Creating a new dictionary to save data by render_id
-        algorithm_fields_result = {}
-
-        # Data structure check (for debugging)
-        if isinstance(data, list):  # Checking that data is a list
-            for algorithm in data:
-                if isinstance(algorithm, dict):  # Checking that each element is a dictionary
-                    render_id = algorithm.get('render_id', 'N/A')
-                    name = algorithm.get('name', 'N/A')
-                    algorithm_group_id = algorithm.get('algorithm_group_id', 'N/A')
-                    # print(f"{render_id}: {name}, Group ID: {algorithm_group_id}")
-
-                    # Additional fields
-                    algorithm_fields = algorithm.get('algorithm_fields', [])
-                    for field in algorithm_fields:
-                        if isinstance(field, dict):
-                            field_name = field.get('name', 'N/A')
-                            field_text = field.get('text', 'N/A')
-                            field_options = field.get('options', 'N/A')
-                            # Printing additional fields (can be removed if not needed)
-                            # print(f"\tField Name: {field_name}, Field Text: {field_text}, Options: {field_options}")
-
-                    # Algorithm descriptions
-                    algorithm_descriptions = algorithm.get('algorithm_descriptions', [])
-                    for description in algorithm_descriptions:
-                        if isinstance(description, dict):
-                            short_desc = description.get('short_description', 'N/A')
-                            lang = description.get('lang', 'N/A')
-                            # Printing algorithm description (can be removed if not needed)
-                            # print(f"\tShort Description: {short_desc}, Language: {lang}")
-
-                    # Saving data to result by render_id
-                    result[render_id] = name
-                    # Printing data for example
-                    # print(f"{render_id}: {name}, Group ID: {algorithm_group_id}")
-
-                    algorithm_fields_result[render_id] = algorithm_fields
-
-        else:
-            print(f"Unexpected top-level data format: {data}")
-
-        # Returning the result (can be used for further processing)
-        # print(result)
-        return result, algorithm_fields_result
-    else:
-        print(f"Request failed with status code: {response.status_code}")
-
-
-def download_file(url, filename, save_path):
+class AdaptivePolling:
     """
-    Download the file from the specified URL and save it in the specified path.
+    Chooses when a separation is checked next from its status, its place in the queue and how long the
+    separations of this session took before, like AdaptivePolling of example 3:
+    - waiting: the expected wait is queue position * average wait per position, check when about half of it is left;
+    - processing: check when about half of the average processing time is left;
+    - distributing, merging: the result is almost ready, check after min_interval.
+    The averages start at wait_per_position and processing_estimate and follow the durations seen.
     """
-    print("start download")
-    response = requests.get(url)
-    print("end download")
-
-    if response.status_code == 200:
-        # Ensure the directory exists
-        if not os.path.exists(save_path):
-            os.makedirs(save_path)
-
-        file_path = os.path.join(save_path, filename)
 
-        # Save the content of the response to the file
-        with open(file_path, 'wb') as f:
-            f.write(response.content)
-        return f"File '{filename}' was downloaded successfully!"
-    else:
-        print(f"There was an error downloading the file '{filename}'. Status code: {response.status_code}.")
-
-
-def get_result(hash, save_path):
-    success, data = check_result(hash)
-    if success:
+    def __init__(self, min_interval=1, max_interval=60, processing_estimate=60, wait_per_position=30,
+                 smoothing=0.2):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.processing_estimate = processing_estimate
+        self.wait_per_position = wait_per_position
+        self.smoothing = smoothing
+        # hash -> [status, time of the status change, queue position when it started waiting]
+        self.tasks = {}
+
+    @staticmethod
+    def position(data):
         try:
-            files = data['data']['files']
-        except KeyError:
-            print("The separation is not ready yet.")
-            return ""
-        text = ""
-        for file_info in files:
-            url = file_info['url'].replace('\\/', '/')  # Correct slashes
-            filename = file_info['download']  # File name for saving
-            text += f'{download_file(url, filename, save_path)}\n'
-        return text
-    else:
-        print("An error occurred while retrieving file data.")
-
-
-def check_result(hash):
-    params = {'hash': hash}
-    response = requests.get('https://mvsep.com/api/separation/get', params=params)
-    data = json.loads(response.content.decode('utf-8'))
-
-    return data['success'], data
-
-
-def create_separation(path_to_file, api_token, sep_type, add_opt1, add_opt2, add_opt3):
-    files = {
-        'audiofile': open(path_to_file, 'rb'),
-        'api_token': (None, api_token),
-        'sep_type': (None, sep_type),
-        'add_opt1': (None, add_opt1),
-        'add_opt2': (None, add_opt2),
-        'add_opt3': (None, add_opt3),
-        'output_format': (None, '1'),
-        'is_demo': (None, '0'),
-    }
-    print("files")
-    print(files)
-
-    response = requests.post('https://mvsep.com/api/separation/create', files=files)
-    if response.status_code == 200:
-        response_content = response.content
-
-        # Converting byte array to string
-        string_response = response_content.decode('utf-8')
-
-        # Parsing string into JSON
-        parsed_json = json.loads(string_response)
-
-        # Outputting the result
-        hash = parsed_json["data"]["hash"]
-
-        return hash, response.status_code
-    else:
-        return response.content, response.status_code
+            return int(data['data']['current_order'])
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    def observe(self, hash, data):
+        """
+        Record the status of a check; the time spent in the previous status updates the averages.
+        """
+        now = time.time()
+        status = data.get('status')
+        task = self.tasks.setdefault(hash, [None, now, None])
+        if status != task[0]:
+            spent = now - task[1]
+            if task[0] == 'waiting' and task[2]:
+                self.wait_per_position += self.smoothing * (spent / task[2] - self.wait_per_position)
+            elif task[0] == 'processing':
+                self.processing_estimate += self.smoothing * (spent - self.processing_estimate)
+            task[:] = [status, now, self.position(data) if status == 'waiting' else None]
+
+    def next_interval(self, hash, data):
+        status = data.get('status')
+        task = self.tasks.get(hash)
+        elapsed = time.time() - task[1] if task else 0
+        if status == 'waiting':
+            remaining = max(self.position(data) or 1, 1) * self.wait_per_position
+        elif status == 'processing':
+            remaining = self.processing_estimate - elapsed
+            if remaining <= 0:
+                # Slower than usual: back off slowly instead of checking at the minimum interval
+                remaining = 2 * max(self.min_interval, 0.1 * elapsed)
+        else:
+            remaining = 0
+        return min(max(remaining / 2, self.min_interval), self.max_interval)
+
+    def forget(self, hash):
+        self.tasks.pop(hash, None)
 
 
 class SepThread(QThread):
+    """
+    One thread checks all running separations. Hashes are kept in a heap ordered by the time
+    of their next check, so the thread sleeps until a check is due instead of polling every hash in its own thread.
+    The time of the next check is chosen by AdaptivePolling from the status and queue position of the separation.
+    Finished separations are downloaded by a pool of `download_workers` threads, so a large download never
+    holds up the checks of the other hashes.
+    """
     stop_separation_signal = pyqtSignal(str)
+    progress_signal = pyqtSignal(str)
 
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, timeout=180, download_workers=2, polling=None):
         super(SepThread, self).__init__(parent)
-        self.hash = ""
+        self.timeout = timeout
+        self.polling = polling or AdaptivePolling()
+        self.queue = []
+        self.lock = threading.Lock()
+        self.wake_up = threading.Event()
+        self.downloads = ThreadPoolExecutor(max_workers=download_workers, thread_name_prefix="mvsep-download")
+
+    def add_hash(self, hash):
+        with self.lock:
+            heapq.heappush(self.queue, (time.time(), hash, time.time() + self.timeout))
+        self.wake_up.set()
+
+    def report_progress(self, filename, bytes_done, total, rate):
+        self.progress_signal.emit(format_progress(filename, bytes_done, total, rate))
+
+    def finish(self, result_text):
+        global separation_n
+        with self.lock:
+            separation_n -= 1
+        self.stop_separation_signal.emit(result_text)
+
+    def download(self, hash, files, output_dir):
+        try:
+            result_text = "".join(f"{message}\n" for _, message in download_files(files, output_dir, self.report_progress))
+        except Exception as e:
+            result_text = f"Download of {hash} failed: {e}"
+        # Displaying the text result in the dialog
+        print("good separation break")
+        print(result_text)
+        self.finish(result_text)
 
     def run(self):
-        global separation_n, path_hash_dict
-        i = 0
-        while i < 180:
-            # Getting the result
-            output_dir = path_hash_dict[self.hash]
-            result_text = get_result(self.hash, output_dir)
-            print(f"i={i}; {self.hash}")
-            print(path_hash_dict)
-            if result_text != "":
-                # Displaying the text result in the dialog
-                separation_n -= 1
-                print("good separation break")
-                print(result_text)
-                self.stop_separation_signal.emit(result_text)
-                break
+        while True:
+            with self.lock:
+                next_check = self.queue[0][0] if self.queue else None
+            if next_check is None or next_check > time.time():
+                # Sleep until the next check is due or a new hash is added
+                delay = None if next_check is None else next_check - time.time()
+                self.wake_up.wait(delay)
+                self.wake_up.clear()
+                continue
+
+            with self.lock:
+                _, hash, deadline = heapq.heappop(self.queue)
+
+            # Checking the status, the files are downloaded by the download pool
+            output_dir = path_hash_dict[hash]
+            try:
+                success, data = check_result(hash)
+            except (requests.exceptions.RequestException, ValueError) as e:
+                print(f"Could not check {hash}: {e}")
+                success, data = False, {}
+            files = data['data'].get('files') if success and isinstance(data.get('data'), dict) else None
+            print(f"{hash}: {data.get('status')}, {len(self.queue)} more in progress")
+            self.polling.observe(hash, data)
+            if files:
+                self.polling.forget(hash)
+                self.downloads.submit(self.download, hash, files, output_dir)
+            elif data.get('status') in ('failed', 'not_found'):
+                self.polling.forget(hash)
+                self.finish(f"Separation {hash} is {data['status']} on the server")
+            elif time.time() >= deadline:
+                self.polling.forget(hash)
+                # Displaying a negative result in the dialog
+                self.finish("No result per 3 min.")
             else:
-                i += 1
-                time.sleep(1)
-            print()
-
-        if i == 179:
-            # Displaying a negative result in the dialog
-            separation_n -= 1
-            self.stop_separation_signal.emit("No result per 3 min.")
+                next_check = min(time.time() + self.polling.next_interval(hash, data), deadline)
+                with self.lock:
+                    heapq.heappush(self.queue, (next_check, hash, deadline))
 
 
 class DragButton(QPushButton):
@@ -253,11 +230,10 @@ class MainWindow(QWidget):
         self.token_filename = os.path.join(BASE_DIR, "api_token.txt")
         self.selected_file = None
         self.output_dir = BASE_DIR + '/'
-        self.algorithm_fields = {}
-
-        self.alg_opt1 = {}
-        self.alg_opt2 = {}
-        self.alg_opt3 = {}
+        # AlgorithmField of the options shown in the option combo boxes
+        self.alg_opt1 = None
+        self.alg_opt2 = None
+        self.alg_opt3 = None
 
         self.selected_opt1 = 0
         self.selected_opt2 = 0
@@ -267,14 +243,13 @@ class MainWindow(QWidget):
         self.type_label = QLabel("Separation Type")
         self.type_label.setStyleSheet(label_style)
 
-        self.data, self.algorithm_fields = get_separation_types()
-
-        # Sorting the dictionary by key
-        sorted_data = {k: v for k, v in sorted(self.data.items())}
+        # The algorithm list is parsed once, see AlgorithmCatalog
+        self.catalog = get_catalog() or AlgorithmCatalog([])
 
         # Initializing QComboBox
         self.type_combo = QComboBox(self)
-        value = sorted_data.values()
+        # Sorted by render_id
+        value = self.catalog.names.values()
         # Adding items to the combobox
         self.type_combo.addItems(value)
 
@@ -376,8 +351,19 @@ class MainWindow(QWidget):
         self.create_button.clicked.connect(self.process_separation)
         layout.addWidget(self.create_button)
 
+        # Download progress
+        self.progress_label = QLabel("")
+        self.progress_label.setStyleSheet(label_style)
+        layout.addWidget(self.progress_label)
+
         self.setLayout(layout)
 
+        # One thread checks the progress of all separations
+        self.st = SepThread(self)
+        self.st.stop_separation_signal.connect(self.stop_separation)
+        self.st.progress_signal.connect(self.progress_label.setText)
+        self.st.start()
+
     def select_file(self):
         # Opening a dialog to select a file
         file_path, _ = QFileDialog.getOpenFileName(self, "Select File", "", "Audio Files (*.mp3 *.wav)")
@@ -395,80 +381,39 @@ class MainWindow(QWidget):
         # Getting the selected text
         selected_item = self.type_combo.currentText()
 
-        # Finding the corresponding key for the selected value
-        for key, value in self.data.items():
-            if value == selected_item:
-                self.selected_key = key
-                print(f"Selected key: {self.selected_key} - {selected_item}")
-
-                selected_algorithm = self.algorithm_fields[key]
-                print("Options Len:")
-                print(len(selected_algorithm))
-                print("Options:")
-                print(selected_algorithm)
-
-                # Clearing all ComboBoxes
-                self.option1_combo.clear()
-                self.option2_combo.clear()
-                self.option3_combo.clear()
-                self.option1_label.setText("Additional Option 1")
-                self.option2_label.setText("Additional Option 2")
-                self.option3_label.setText("Additional Option 3")
-
-                if len(self.algorithm_fields[key]) > 0:
-                    self.option1_label.setText(f"Additional Option 1: {selected_algorithm[0]['text']}")
-                    self.alg_opt1 = json.loads(selected_algorithm[0]['options'])
-                    # Sorting the dictionary by key
-                    sorted_data = {k: v for k, v in sorted(self.alg_opt1.items())}
-                    value = sorted_data.values()
-                    # Adding items to the combobox
-                    self.option1_combo.addItems(value)
-
-                if len(self.algorithm_fields[key]) > 1:
-                    self.option2_label.setText(f"Additional Option 2: {selected_algorithm[1]['text']}")
-                    self.alg_opt2 = json.loads(selected_algorithm[1]['options'])
-                    # Sorting the dictionary by key
-                    sorted_data = {k: v for k, v in sorted(self.alg_opt2.items())}
-                    value = sorted_data.values()
-                    # Adding items to the combobox
-                    self.option2_combo.addItems(value)
-
-                if len(self.algorithm_fields[key]) > 2:
-                    self.option3_label.setText(f"Additional Option 3: {selected_algorithm[2]['text']}")
-                    self.alg_opt3 = json.loads(selected_algorithm[2]['options'])
-                    # Sorting the dictionary by key
-                    sorted_data = {k: v for k, v in sorted(self.alg_opt3.items())}
-                    value = sorted_data.values()
-                    # Adding items to the combobox
-                    self.option3_combo.addItems(value)
-                break
+        algorithm = self.catalog.by_name.get(selected_item)
+        if algorithm is None:
+            return
+        self.selected_key = algorithm.render_id
+        print(f"Selected key: {self.selected_key} - {selected_item}")
+        print(f"Options: {algorithm.fields}")
+
+        # Clearing all ComboBoxes
+        combos = (self.option1_combo, self.option2_combo, self.option3_combo)
+        labels = (self.option1_label, self.option2_label, self.option3_label)
+        for number, (combo, label) in enumerate(zip(combos, labels), 1):
+            combo.clear()
+            label.setText(f"Additional Option {number}")
+        # Fields are matched to add_opt1..3 by name, see Algorithm.field
+        self.alg_opt1, self.alg_opt2, self.alg_opt3 = algorithm.option_fields
+        for number, (combo, label, field) in enumerate(zip(combos, labels, algorithm.option_fields), 1):
+            if field is None:
+                continue
+            label.setText(f"Additional Option {number}: {field.text}")
+            # Options are decoded and sorted by key once, by the catalog
+            combo.addItems(list(field.options.values()))
 
     def on_change_option1(self, index):
-        # Getting the selected text
-        selected_item = self.option1_combo.currentText()
-        # Finding the corresponding key for the selected value
-        for key, value in self.alg_opt1.items():
-            if value == selected_item:
-                self.selected_opt1 = key
-                break
+        if self.alg_opt1 is not None:
+            self.selected_opt1 = self.alg_opt1.keys.get(self.option1_combo.currentText(), self.selected_opt1)
 
     def on_change_option2(self, index):
-        # Getting the selected text
-        selected_item = self.option2_combo.currentText()
-        # Finding the corresponding key for the selected value
-        for key, value in self.alg_opt2.items():
-            if value == selected_item:
-                self.selected_opt2 = key
-                break
+        if self.alg_opt2 is not None:
+            self.selected_opt2 = self.alg_opt2.keys.get(self.option2_combo.currentText(), self.selected_opt2)
 
     def on_change_option3(self, index):
-        # Getting the selected text
-        selected_item = self.option3_combo.currentText()
-        # Finding the corresponding key for the selected value
-        for key, value in self.alg_opt3.items():
-            if value == selected_item:
-                self.selected_opt3 = key
-                break
+        if self.alg_opt3 is not None:
+            self.selected_opt3 = self.alg_opt3.keys.get(self.option3_combo.currentText(), self.selected_opt3)
 
     def select_output_dir(self):
         # Opening a dialog to select a directory
@@ -477,10 +422,9 @@ class MainWindow(QWidget):
 
     def process_separation(self):
         global path_hash_dict, start_result, separation_n
-        for key, value in self.data.items():
-            if value == self.type_combo.currentText():
-                self.selected_key = key
-                break
+        algorithm = self.catalog.by_name.get(self.type_combo.currentText())
+        if algorithm is not None:
+            self.selected_key = algorithm.render_id
         separation_type = self.selected_key
         api_token = self.api_input.text()
         option1 = self.selected_opt1
@@ -513,18 +457,24 @@ class MainWindow(QWidget):
             print(f"separation_type: {separation_type}")
             return
 
+        # The options are checked against the algorithm list before the file is uploaded
+        # (nothing is refused when the list could not be loaded)
+        errors = self.catalog.validate(separation_type, option1, option2, option3) if self.catalog.by_id else []
+        if errors:
+            self.type_combo.setStyleSheet(f"border: 2px solid red; {combo_style}")
+            QMessageBox.warning(self, "Error", "\n".join(errors))
+            return
+
         # Trying to start separation (e.g., generate a hash or error)
         result = self.start_separation(separation_type, api_token, option1, option2, option3, path)
         if 'hash' in result:
             # Connecting the separation progress check thread
             path_hash_dict[result["hash"]] = self.output_dir
             start_result = result
-            separation_n += 1
+            with self.st.lock:
+                separation_n += 1
             self.create_button.setText(f"Create Separation: [{separation_n} in progress]")
-            self.st = SepThread(self)
-            self.st.stop_separation_signal.connect(self.stop_separation)
-            self.st.hash = result["hash"]
-            self.st.start()
+            self.st.add_hash(result["hash"])
             QMessageBox.information(self, "Result", f"Thread #{separation_n}\nin progress")
 
     def stop_separation(self, result_text):
@@ -552,8 +502,8 @@ class MainWindow(QWidget):
         separation_dialog.setWindowTitle("Separation Types")
 
         # Getting and sorting data
-        self.data = get_separation_types()
-        sorted_data = {k: v for k, v in sorted(self.data.items())}
+        self.catalog = get_catalog() or self.catalog
+        sorted_data = self.catalog.names
 
         # Creating QScrollArea for scrolling
         scroll_area = QScrollArea(separation_dialog)
@@ -1,22 +1,21 @@
-import time, os, json
-import sqlite3, requests
-from datetime import datetime
+import os
 
 from PyQt6.QtWidgets import (
     QApplication, QWidget, QPushButton, QAbstractItemView, QGridLayout, QLabel, QDialog,
-    QComboBox, QLineEdit, QFileDialog, QTableWidget, QMessageBox, QScrollArea, QTableWidgetItem, QTextEdit
+    QComboBox, QLineEdit, QFileDialog, QTableView, QHeaderView, QMessageBox, QScrollArea, QTextEdit
 )
 import sys
-from PyQt6.QtCore import QMimeData, Qt, QThread, pyqtSignal, pyqtSlot
+from PyQt6.QtCore import QMimeData, Qt, QTimer, QAbstractTableModel, QModelIndex, pyqtSignal, pyqtSlot
 from PyQt6.QtGui import QDrag
 from PyQt6.QtGui import QIcon
 
+from mvsep_jobs import JobEngine, create_separation, get_catalog, AlgorithmCatalog
+
 # File directory
 if getattr(sys, 'frozen', False):
     BASE_DIR = os.path.dirname(sys.executable)
 else:
     BASE_DIR = os.path.abspath(os.getcwd())
-connection = sqlite3.connect(os.path.join(BASE_DIR, 'jobs.db'), check_same_thread=False)
 
 # Universal style for buttons and input fields (increased sizes)
 button_style = "font-size: 18px; padding: 20px; min-width: 300px; font-family: 'Poppins', sans-serif;"
@@ -47,274 +46,77 @@ path_hash_dict = {}
 separation_n = 0
 
 
-def create_separation(path_to_file, api_token, sep_type, add_opt1, add_opt2, add_opt3):
-    files = {
-        'audiofile': open(path_to_file, 'rb'),
-        'api_token': (None, api_token),
-        'sep_type': (None, sep_type),
-        'add_opt1': (None, add_opt1),
-        'add_opt2': (None, add_opt2),
-        'add_opt3': (None, add_opt3),
-        'output_format': (None, '1'),
-        'is_demo': (None, '0'),
-    }
-    print("files")
-    print(files)
-
-    response = requests.post('https://mvsep.com/api/separation/create', files=files)
-    if response.status_code == 200:
-        response_content = response.content
-
-        # Convert byte array to string
-        string_response = response_content.decode('utf-8')
-
-        # Parse string to JSON
-        parsed_json = json.loads(string_response)
-
-        # Output result
-        hash = parsed_json["data"]["hash"]
-
-        return hash, response.status_code
-    else:
-        return response.content, response.status_code
-
-
-def get_separation_types():
-    # URL for the request
-    api_url = 'https://mvsep.com/api/app/algorithms'
-
-    # Making a GET request
-    response = requests.get(api_url)
-
-    # Checking the response status code
-    if response.status_code == 200:
-        # Parsing the response to JSON
-        data = response.json()
-        result = {}  # Creating a new dictionary to store data by render_id
-        algorithm_fields_result = {}
-
-        # Data structure check (for debugging)
-        if isinstance(data, list):  # Checking that data is a list
-            for algorithm in data:
-                if isinstance(algorithm, dict):  # Checking that each element is a dictionary
-                    render_id = algorithm.get('render_id', 'N/A')
-                    name = algorithm.get('name', 'N/A')
-                    algorithm_group_id = algorithm.get('algorithm_group_id', 'N/A')
-                    # print(f"{render_id}: {name}, Group ID: {algorithm_group_id}")
-
-                    # Additional fields
-                    algorithm_fields = algorithm.get('algorithm_fields', [])
-                    for field in algorithm_fields:
-                        if isinstance(field, dict):
-                            field_name = field.get('name', 'N/A')
-                            field_text = field.get('text', 'N/A')
-                            field_options = field.get('options', 'N/A')
-                            # Printing additional fields (can be removed if not needed)
-                            # print(f"\tField Name: {field_name}, Field Text: {field_text}, Options: {field_options}")
-
-                    # Algorithm descriptions
-                    algorithm_descriptions = algorithm.get('algorithm_descriptions', [])
-                    for description in algorithm_descriptions:
-                        if isinstance(description, dict):
-                            short_desc = description.get('short_description', 'N/A')
-                            lang = description.get('lang', 'N/A')
-                            # Printing algorithm description (can be removed if not needed)
-                            # print(f"\tShort Description: {short_desc}, Language: {lang}")
-
-                    # Saving data to result by render_id
-                    result[render_id] = name
-                    # Printing data for example
-                    # print(f"{render_id}: {name}, Group ID: {algorithm_group_id}")
-
-                    algorithm_fields_result[render_id] = algorithm_fields
-
-        else:
-            print(f"Unexpected top-level data format: {data}")
-
-        # Returning the result (can be used for further processing)
-        # print(result)
-        return result, algorithm_fields_result
-    else:
-        print(f"Request failed with status code: {response.status_code}")
-
-
-def download_file(url, filename, save_path):
+class JobTableModel(QAbstractTableModel):
     """
-    Download the file from the specified URL and save it in the specified path.
+    The jobs of jobs.db for the status table, newest first.
+    refresh() runs on the GUI thread (from a timer) and only reads the jobs whose version grew since the last
+    call: new jobs are inserted at the top and dataChanged is emitted for the rows that changed.
+    The view only asks for the rows on screen, so 100k jobs cost no more to show than 10.
     """
-    print("start download")
-    response = requests.get(url)
-    print("end download")
-
-    if response.status_code == 200:
-        # Ensure the directory exists
-        if not os.path.exists(save_path):
-            os.makedirs(save_path)
-
-        file_path = os.path.join(save_path, filename)
-
-        # Save the content of the response to the file
-        with open(file_path, 'wb') as f:
-            f.write(response.content)
-        return f"File '{filename}' uploaded successfully!"
-    else:
-        print(f"There was an error loading the file '{filename}'. Status code: {response.status_code}.")
-
-
-def get_result(hash, save_path):
-    success, data = check_result(hash)
-    if success:
-        try:
-            files = data['data']['files']
-        except KeyError:
-            print("The separation is not ready yet.")
-            return ""
-        text = ""
-        for file_info in files:
-            url = file_info['url'].replace('\\/', '/')  # Correct slashes
-            filename = file_info['download']  # File name for saving
-            text += f'{download_file(url, filename, save_path)}\n'
-        return text
-    else:
-        print("An error occurred while retrieving file data.")
-
-
-def check_result(hash):
-    params = {'hash': hash}
-    response = requests.get('https://mvsep.com/api/separation/get', params=params)
-    data = json.loads(response.content.decode('utf-8'))
-
-    return data['success'], data
-
-
-class SepThread(QThread):
-
-    def __init__(self, api_token=None, data_table=None, base_dir_label=None):
-        super(SepThread, self).__init__()
-        self.data_table = data_table
-        self.api_token = api_token
-        self.base_dir_label = base_dir_label
-
-    def run(self):
-        # Creating a database connection (file my_database.db will be created)
-        # self.connection = sqlite3.connect(os.path.join(BASE_DIR, 'jobs.db'), check_same_thread=False)
-        global connection
-        self.cursor = connection.cursor()
-
-        while True:
-
-            # checking running processes
-            # self.cursor.execute('INSERT INTO Jobs (start_time, update_time, filename, out_dir, hash[5], status[6], separation, option1, option2, option3) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', (int(time.time()), int(time.time()), path, self.output_dir, "", "Added", separation_type, option1, option2, option3))
-            self.cursor.execute('SELECT * FROM Jobs ORDER BY id DESC')
-            jobs = self.cursor.fetchall()
-            for row, job in enumerate(jobs):
-                # self.data_table.setHorizontalHeaderLabels(["ID", "Start Time", "FileName", "Out Dir", "Separation Type", "Adv.Opt #1", "Adv.Opt #2", "Adv.Opt #3", "Status", "Update Status"])
-                # self.data_table.setHorizontalHeaderLabels(["ID", "FileName", "Separation Type""Status"])
-                job_id = int(job[0])
-                # self.data_table.setItem(row, 0, QTableWidgetItem(str(job_id)))
-                # start_date = datetime.strptime(str(job[1]), '%Y-%m-%d %H:%M')
-                start_date = datetime.fromtimestamp(job[1])
-                start_date = str(start_date.strftime('%Y-%m-%d %H:%M'))
-
-                file_name = os.path.basename(job[3])
-                self.data_table.setItem(row, 0, QTableWidgetItem(file_name))
-
-                out_dir = job[4]
-                separation_type = str(job[7])
-                self.data_table.setItem(row, 1, QTableWidgetItem(separation_type))  # separation
-                """
-                self.data_table.setItem(row, 5, QTableWidgetItem(job[8])) #  option1
-                self.data_table.setItem(row, 6, QTableWidgetItem(job[9])) #  option2
-                self.data_table.setItem(row, 7, QTableWidgetItem(job[10])) #  option 3
-                """
-                status = str(job[6])
-                self.data_table.setItem(row, 2, QTableWidgetItem(status))  # status
-                update_time = datetime.fromtimestamp(job[2])
-                update_time = str(update_time.strftime('%H:%M:%S'))
-
-                if job[6] == "Added":
-                    # Attempting to start separation (e.g., generate hash or error)
-                    # self.base_dir_label.setText(f"Token: {self.api_token}")
-
-                    hash_val, status_code = create_separation(job[3], self.api_token, separation_type,
-                                                              job[8], job[9], job[10])
-
-                    if status_code == 200:  # Success with hash
-                        self.cursor.execute('UPDATE Jobs SET hash = ? WHERE id = ?', (hash_val, job[0]))
-                        self.cursor.execute('UPDATE Jobs SET status = ? WHERE id = ?', ("Process", job[0]))
-                        self.cursor.execute('UPDATE Jobs SET update_time = ? WHERE id = ?', (int(time.time()), job[0]))
-
-                        self.cursor.execute(
-                            'INSERT INTO Log (job_id, update_time, action, comment) VALUES (?, ?, ?, ?)',
-                            (job_id, int(time.time()), "Added -> Process", ""))
-
-                    else:
-                        self.cursor.execute(
-                            'INSERT INTO Log (job_id, update_time, action, comment) VALUES (?, ?, ?, ?)',
-                            (job_id, int(time.time()), "Error Start Process", f"response.content: {hash_val}"))
-                        print("error start process")
-                        print(hash_val)
-
-                # connecting the thread to check separation progress
-                if job[6] == "Process":
-                    self.cursor.execute('UPDATE Jobs SET update_time = ? WHERE id = ?', (int(time.time()), job[0]))
-                    self.cursor.execute('INSERT INTO Log (job_id, update_time, action, comment) VALUES (?, ?, ?, ?)',
-                                        (job_id, int(time.time()), "Process", f""))
-
-                    params = {'hash': job[5]}
-                    response = requests.get('https://mvsep.com/api/separation/get', params=params)
-                    data = json.loads(response.content.decode('utf-8'))
-
-                    if data['success']:
-                        self.cursor.execute(
-                            'INSERT INTO Log (job_id, update_time, action, comment) VALUES (?, ?, ?, ?)',
-                            (job_id, int(time.time()), "Process -> Success", f""))
-
-                        files = []
-                        try:
-                            files = data['data']['files']
-                        except KeyError:
-                            pass
-                            self.cursor.execute(
-                                'INSERT INTO Log (job_id, update_time, action, comment) VALUES (?, ?, ?, ?)',
-                                (job_id, int(time.time()), "Process -> No Files", f""))
-
-                        for file_info in files:
-                            url = file_info['url'].replace('\\/', '/')  # Correct slashes
-                            filename = file_info['download']  # File name for saving
-                            # download_file(url, filename, save_path)
-                            self.cursor.execute('UPDATE Jobs SET status = ? WHERE id = ?', ("Download", job[0]))
-                            self.cursor.execute('UPDATE Jobs SET update_time = ? WHERE id = ?',
-                                                (int(time.time()), job[0]))
-                            self.cursor.execute(
-                                'INSERT INTO Log (job_id, update_time, action, comment) VALUES (?, ?, ?, ?)',
-                                (job_id, int(time.time()), "Process -> Download", f"filename: {filename}"))
-
-                            print(f"Start download: {url}")
-                            response_dl = requests.get(url)  # Renamed to avoid conflict
-                            if response_dl.status_code == 200:
-                                # Ensure the directory exists
-                                if not os.path.exists(job[4]):
-                                    os.makedirs(job[4])
-                                file_path = os.path.join(job[4], filename)
-                                # Save the content of the response to the file
-                                with open(file_path, 'wb') as f:
-                                    f.write(response_dl.content)
-                                    self.cursor.execute('UPDATE Jobs SET status = ? WHERE id = ?', ("Complete", job[0]))
-                                self.cursor.execute(
-                                    'INSERT INTO Log (job_id, update_time, action, comment) VALUES (?, ?, ?, ?)',
-                                    (job_id, int(time.time()), "Process -> Complete", f"filename: {filename}"))
-
-
-                    else:
-                        self.cursor.execute('UPDATE Jobs SET status = ? WHERE id = ?', ("Error", job[0]))
-                        self.cursor.execute(
-                            'INSERT INTO Log (job_id, update_time, action, comment) VALUES (?, ?, ?, ?)',
-                            (job_id, int(time.time()), "Process -> Error", f""))
-
-            # self.data_table.resizeColumnsToContents()
-            connection.commit()
-            time.sleep(1)
+
+    HEADERS = ["FileName", "Separation Type", "Status"]
+
+    def __init__(self, engine, parent=None):
+        super().__init__(parent)
+        self.engine = engine
+        # [id, filename, separation, status] in id order, so new jobs are appended
+        self.jobs = []
+        # job id -> position in self.jobs
+        self.positions = {}
+        # Highest version read so far. Versions come from a counter in jobs.db (see migrate_version), not from
+        # a clock, so the changes of engines on other machines are never missed
+        self.version = None
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.jobs)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def job(self, row):
+        return self.jobs[len(self.jobs) - 1 - row]
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role != Qt.ItemDataRole.DisplayRole:
+            return None
+        job = self.job(index.row())
+        if index.column() == 0:
+            return os.path.basename(job[1])
+        return str(job[index.column() + 1])
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return self.HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+    def refresh(self):
+        if self.version is None:
+            rows = self.engine.execute('SELECT id, filename, separation, status, version FROM Jobs ORDER BY id',
+                                       fetch=True)
+        else:
+            # Sorted here, so sqlite uses the version index instead of walking the table in id order
+            rows = sorted(self.engine.execute(
+                'SELECT id, filename, separation, status, version FROM Jobs WHERE version > ?',
+                (self.version,), fetch=True))
+        self.version = self.version or 0
+        new_jobs = []
+        for job_id, filename, separation, status, version in rows:
+            self.version = max(self.version, version)
+            position = self.positions.get(job_id)
+            if position is None:
+                new_jobs.append([job_id, filename, separation, status])
+                continue
+            job = self.jobs[position]
+            if job[1:] != [filename, separation, status]:
+                job[1:] = [filename, separation, status]
+                row = len(self.jobs) - 1 - position
+                self.dataChanged.emit(self.index(row, 0), self.index(row, len(self.HEADERS) - 1))
+        if new_jobs:
+            self.beginInsertRows(QModelIndex(), 0, len(new_jobs) - 1)
+            for job in new_jobs:
+                self.positions[job[0]] = len(self.jobs)
+                self.jobs.append(job)
+            self.endInsertRows()
 
 
 class DragButton(QPushButton):
@@ -344,43 +146,12 @@ class DragButton(QPushButton):
 
 
 class MainWindow(QWidget):
+    # Emitted by the threads of the job engine, the label is updated on the GUI thread
+    progress_signal = pyqtSignal(str)
+
     def __init__(self):
         super().__init__()
 
-        # Creating a database connection (file my_database.db will be created)
-        global connection
-        self.cursor = connection.cursor()
-
-        # Creating table Jobs
-        self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS Jobs (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        start_time INTEGER,
-        update_time INTEGER,
-        filename TEXT NOT NULL,
-        out_dir TEXT NOT NULL,
-        hash TEXT NOT NULL,
-        status TEXT NOT NULL,
-        separation INTEGER,
-        option1 TEXT NOT NULL,
-        option2 TEXT NOT NULL,
-        option3 TEXT NOT NULL
-        )
-        ''')
-        connection.commit()
-
-        # Creating table Log
-        self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS Log (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        job_id INTEGER,
-        update_time INTEGER,
-        action TEXT NOT NULL,
-        comment TEXT NOT NULL
-        )
-        ''')
-        connection.commit()
-
         self.setWindowTitle("MVSep.com API: Create Separation")
         self.setGeometry(50, 50, 400, 400)
         self.setFixedSize(740, 600)
@@ -394,11 +165,10 @@ class MainWindow(QWidget):
             self.output_dir = os.path.join(os.path.abspath(os.getcwd()), 'output/')
         if not os.path.exists(self.output_dir):  # Ensure output directory exists at startup
             os.makedirs(self.output_dir)
-        self.algorithm_fields = {}
-
-        self.alg_opt1 = {}
-        self.alg_opt2 = {}
-        self.alg_opt3 = {}
+        # AlgorithmField of the options shown in the option combo boxes
+        self.alg_opt1 = None
+        self.alg_opt2 = None
+        self.alg_opt3 = None
 
         self.selected_opt1 = "0"  # Defaulting to string "0" if these are option keys
         self.selected_opt2 = "0"
@@ -406,7 +176,8 @@ class MainWindow(QWidget):
 
         self.selected_algoritms_list = []
 
-        self.data, self.algorithm_fields = get_separation_types()
+        # The algorithm list is parsed once, see AlgorithmCatalog
+        self.catalog = get_catalog() or AlgorithmCatalog([])
 
         """
 ████████    █████    █████     ██        ███████
@@ -415,18 +186,14 @@ class MainWindow(QWidget):
    ██      ██   ██   ██   ██   ██   ██   ██
    ██      ██   ██   █████     ██████    ███████
         """
-        # Create a table
-        self.data_table = QTableWidget(self)
-        self.data_table.setColumnCount(3)  # Set three columns
-        self.data_table.setColumnWidth(0, 185)
-        self.data_table.setColumnWidth(1, 100)
-        self.data_table.setColumnWidth(2, 50)
-        self.data_table.setRowCount(10)
-        self.data_table.setHorizontalHeaderLabels(["FileName", "Separation Type", "Status"])
+        # Create a table, its rows come from JobTableModel (set below when the job engine exists)
+        self.data_table = QTableView(self)
         self.data_table.setMinimumWidth(350)
         self.data_table.setMinimumHeight(350)
         # self.data_table.setAutoScroll(True)
         self.data_table.setVerticalScrollMode(QAbstractItemView.ScrollMode.ScrollPerPixel)
+        # Rows all have the same height, so the view never measures rows that are not on screen
+        self.data_table.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
 
         layout.addWidget(self.data_table, 0, 1, 7, 1,
                          alignment=Qt.AlignmentFlag.AlignTop)  # Span changed to match GUI better
@@ -508,14 +275,37 @@ class MainWindow(QWidget):
         self.base_dir_label.setStyleSheet(small_label_style)
         layout.addWidget(self.base_dir_label, 10, 0)
 
+        # Download progress
+        self.progress_label = QLabel("")
+        self.progress_label.setStyleSheet(small_label_style)
+        layout.addWidget(self.progress_label, 11, 0, 1, 2)
+
         self.setLayout(layout)
         # self.connection.close()
 
-        # connecting the thread to check separation progress
+        # Uploads, status checks and downloads are done by the job engine in its own threads,
+        # the jobs are shown by JobTableModel. The engine creates or upgrades the tables of jobs.db.
+        self.engine = JobEngine(db_path=os.path.join(BASE_DIR, 'jobs.db'), api_token=self.api_input.text(),
+                                on_progress=self.progress_signal.emit)
+        self.progress_signal.connect(self.progress_label.setText)
+        self.engine.start()
 
-        self.st = SepThread(api_token=self.api_input.text(), data_table=self.data_table,
-                            base_dir_label=self.base_dir_label)
-        self.st.start()
+        self.job_model = JobTableModel(self.engine, self)
+        self.data_table.setModel(self.job_model)
+        self.data_table.setColumnWidth(0, 185)
+        self.data_table.setColumnWidth(1, 100)
+        self.data_table.setColumnWidth(2, 50)
+        self.job_model.refresh()
+        # Only the jobs changed since the last tick are read
+        self.job_timer = QTimer(self)
+        self.job_timer.timeout.connect(self.job_model.refresh)
+        self.job_timer.start(1000)
+
+    def closeEvent(self, event):
+        self.job_timer.stop()
+        # Unfinished jobs are continued by the next start, or by another engine on the same jobs.db
+        self.engine.stop(wait=False)
+        super().closeEvent(event)
 
     def clear_files(self):
         self.selected_files = []
@@ -559,81 +349,42 @@ class MainWindow(QWidget):
         # Getting the selected text
         selected_item = self.type_combo.currentText()  # type_combo is not defined in MainWindow scope
 
-        # Searching for the corresponding key for the selected value
-        for key, value in self.data.items():
-            if value == selected_item:
-                self.selected_key = key
-                print(f"Selected key: {self.selected_key} - {selected_item}")
-
-                selected_algorithm = self.algorithm_fields[key]
-                print("Options Len:")
-                print(len(selected_algorithm))
-                print("Options:")
-                print(selected_algorithm)
-
-                # clearing all ComboBoxes
-                self.option1_combo.clear()  # option1_combo is not defined in MainWindow scope
-                self.option2_combo.clear()  # option2_combo is not defined in MainWindow scope
-                self.option3_combo.clear()  # option3_combo is not defined in MainWindow scope
-                self.option1_label.setText("Additional Option 1")  # option1_label is not defined in MainWindow scope
-                self.option2_label.setText("Additional Option 2")  # option2_label is not defined in MainWindow scope
-                self.option3_label.setText("Additional Option 3")  # option3_label is not defined in MainWindow scope
-
-                if len(self.algorithm_fields[key]) > 0:
-                    self.option1_label.setText(f"Additional Option 1: {selected_algorithm[0]['text']}")
-                    self.alg_opt1 = json.loads(selected_algorithm[0]['options'])
-                    # Sorting the dictionary by key
-                    sorted_data = {k: v for k, v in sorted(self.alg_opt1.items())}
-                    value_items = sorted_data.values()  # Renamed to avoid conflict
-                    # Adding items to the combobox
-                    self.option1_combo.addItems(value_items)
-
-                if len(self.algorithm_fields[key]) > 1:
-                    self.option2_label.setText(f"Additional Option 2: {selected_algorithm[1]['text']}")
-                    self.alg_opt2 = json.loads(selected_algorithm[1]['options'])
-                    # Sorting the dictionary by key
-                    sorted_data = {k: v for k, v in sorted(self.alg_opt2.items())}
-                    value_items = sorted_data.values()  # Renamed to avoid conflict
-                    # Adding items to the combobox
-                    self.option2_combo.addItems(value_items)
-
-                if len(self.algorithm_fields[key]) > 2:
-                    self.option3_label.setText(f"Additional Option 3: {selected_algorithm[2]['text']}")
-                    self.alg_opt3 = json.loads(selected_algorithm[2]['options'])
-                    # Sorting the dictionary by key
-                    sorted_data = {k: v for k, v in sorted(self.alg_opt3.items())}
-                    value_items = sorted_data.values()  # Renamed to avoid conflict
-                    # Adding items to the combobox
-                    self.option3_combo.addItems(value_items)
-
-                break
+        algorithm = self.catalog.by_name.get(selected_item)
+        if algorithm is None:
+            return
+        self.selected_key = algorithm.render_id
+        print(f"Selected key: {self.selected_key} - {selected_item}")
+        print(f"Options: {algorithm.fields}")
+
+        # clearing all ComboBoxes
+        combos = (self.option1_combo, self.option2_combo, self.option3_combo)  # not defined in MainWindow scope
+        labels = (self.option1_label, self.option2_label, self.option3_label)  # not defined in MainWindow scope
+        for number, (combo, label) in enumerate(zip(combos, labels), 1):
+            combo.clear()
+            label.setText(f"Additional Option {number}")
+        # Fields are matched to add_opt1..3 by name, see Algorithm.field
+        self.alg_opt1, self.alg_opt2, self.alg_opt3 = algorithm.option_fields
+        for number, (combo, label, field) in enumerate(zip(combos, labels, algorithm.option_fields), 1):
+            if field is None:
+                continue
+            label.setText(f"Additional Option {number}: {field.text}")
+            # Options are already sorted by key
+            combo.addItems(list(field.options.values()))
 
     def on_change_option1(self, index):  # This method appears unused
-        # Getting the selected text
-        selected_item = self.option1_combo.currentText()  # option1_combo is not defined in MainWindow scope
-        # Searching for the corresponding key for the selected value
-        for key, value in self.alg_opt1.items():
-            if value == selected_item:
-                self.selected_opt1 = key
-                break
+        # option1_combo is not defined in MainWindow scope
+        if self.alg_opt1 is not None:
+            self.selected_opt1 = self.alg_opt1.keys.get(self.option1_combo.currentText(), self.selected_opt1)
 
     def on_change_option2(self, index):  # This method appears unused
-        # Getting the selected text
-        selected_item = self.option2_combo.currentText()  # option2_combo is not defined in MainWindow scope
-        # Searching for the corresponding key for the selected value
-        for key, value in self.alg_opt2.items():
-            if value == selected_item:
-                self.selected_opt2 = key
-                break
+        # option2_combo is not defined in MainWindow scope
+        if self.alg_opt2 is not None:
+            self.selected_opt2 = self.alg_opt2.keys.get(self.option2_combo.currentText(), self.selected_opt2)
 
     def on_change_option3(self, index):  # This method appears unused
-        # Getting the selected text
-        selected_item = self.option3_combo.currentText()  # option3_combo is not defined in MainWindow scope
-        # Searching for the corresponding key for the selected value
-        for key, value in self.alg_opt3.items():
-            if value == selected_item:
-                self.selected_opt3 = key
-                break
+        # option3_combo is not defined in MainWindow scope
+        if self.alg_opt3 is not None:
+            self.selected_opt3 = self.alg_opt3.keys.get(self.option3_combo.currentText(), self.selected_opt3)
 
     def select_output_dir(self):
         # Opening dialog to select folder
@@ -643,7 +394,7 @@ class MainWindow(QWidget):
             self.output_dir_label.setText(f"Output Dir: {self.output_dir}")
 
     def process_separation(self):
-        global path_hash_dict, separation_n, connection
+        global path_hash_dict, separation_n
 
         api_token = self.api_input.text()
 
@@ -682,7 +433,7 @@ class MainWindow(QWidget):
             print(f"Algorithms selected: {len(self.selected_algoritms_list)}")
             return
 
-        self.st.api_token = self.api_input.text()
+        self.engine.api_token = self.api_input.text()
         """
         start_time INTEGER,
         update_time INTEGER,
@@ -702,6 +453,7 @@ class MainWindow(QWidget):
         # If a default/single separation without master was intended, it needs to be explicitly handled.
 
         if len(self.selected_algoritms_list) > 0:
+            jobs = []
             for new_item in self.selected_algoritms_list:
                 separation_type = new_item["selected_key"]
                 option1 = new_item["selected_opt1"]
@@ -709,34 +461,10 @@ class MainWindow(QWidget):
                 option3 = new_item["selected_opt3"]
 
                 for file_path in self.selected_files:  # Renamed 'file' to 'file_path'
-                    # Adding a new job
-                    self.cursor.execute(
-                        'INSERT INTO Jobs (start_time, update_time, filename, out_dir, hash, status, separation, option1, option2, option3) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
-                        (int(time.time()), int(time.time()), file_path, self.output_dir, "", "Added", separation_type,
-                         str(option1), str(option2), str(option3)))  # Ensure options are strings
-                    connection.commit()
-
-                    self.cursor.execute('SELECT * FROM Jobs ORDER BY id DESC LIMIT 0,1')
-                    jobs = self.cursor.fetchall()
-                    job_id = -1  # Default value
-                    if jobs:
-                        job_id = int(jobs[0][0])
-                    print(f"job_id: {job_id}")
-
-                    # Logging
-                    """
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    job_id INTEGER,
-                    update_time INTEGER,
-                    action TEXT NOT NULL,
-                    comment TEXT NOT NULL
-
-                    """
-                    if job_id != -1:
-                        self.cursor.execute(
-                            'INSERT INTO Log (job_id, update_time, action, comment) VALUES (?, ?, ?, ?)',
-                            (job_id, int(time.time()), "Added from Master", ""))
-                        connection.commit()
+                    jobs.append((file_path, self.output_dir, separation_type, option1, option2, option3))
+            # All jobs are added in one transaction, they are logged as "Added from Master"
+            for job_id in self.engine.add_jobs(jobs, comment="Added from Master"):
+                print(f"job_id: {job_id}")
 
             # self.selected_algoritms_list = [] # Clearing list after processing might be desired depending on workflow
 
@@ -784,16 +512,13 @@ class MainWindow(QWidget):
         self.type_label_master = QLabel("Separation Type")
         self.type_label_master.setStyleSheet(label_style)
 
-        self.data, self.algorithm_fields = get_separation_types()
-
-        # Sorting the dictionary by key
-        sorted_data = {k: v for k, v in sorted(self.data.items())}
+        # The list is cached on disk, so opening the dialog does not wait for the API
+        self.catalog = get_catalog() or self.catalog
 
         # Initializing QComboBox
         self.type_combo_master = QComboBox(separation_dialog)  # Parent should be dialog
-        value_items = sorted_data.values()  # Renamed
-        # Adding items to the combobox
-        self.type_combo_master.addItems(list(value_items))  # Ensure it's a list of strings
+        # Adding items to the combobox, sorted by render_id
+        self.type_combo_master.addItems(list(self.catalog.names.values()))
 
         # Setting up handler for selection
         self.type_combo_master.currentIndexChanged.connect(self.on_selection_master_change)
@@ -878,33 +603,19 @@ class MainWindow(QWidget):
         separation_dialog.exec()
 
     def _update_algo_list_text(self):
-        selected_algo_text = ""
+        lines = []
         for new_item in self.selected_algoritms_list:
-            key = new_item["selected_key"]
-            selected_opt1 = str(new_item["selected_opt1"])  # Ensure string for dict key
-            selected_opt2 = str(new_item["selected_opt2"])
-            selected_opt3 = str(new_item["selected_opt3"])
-
-            alg_name = self.data.get(key, "Unknown Algorithm")
-            selected_algo_text += f"{alg_name}"
-
-            current_algorithm_fields = self.algorithm_fields.get(key, [])
-
-            if len(current_algorithm_fields) > 0:
-                alg_opt1_data = json.loads(current_algorithm_fields[0].get('options', '{}'))
-                opt1_text = alg_opt1_data.get(selected_opt1, f"Opt1Val-{selected_opt1}")
-                selected_algo_text += f": {opt1_text}"
-            if len(current_algorithm_fields) > 1:
-                alg_opt2_data = json.loads(current_algorithm_fields[1].get('options', '{}'))
-                opt2_text = alg_opt2_data.get(selected_opt2, f"Opt2Val-{selected_opt2}")
-                selected_algo_text += f", {opt2_text}"
-            if len(current_algorithm_fields) > 2:
-                alg_opt3_data = json.loads(current_algorithm_fields[2].get('options', '{}'))
-                opt3_text = alg_opt3_data.get(selected_opt3, f"Opt3Val-{selected_opt3}")
-                selected_algo_text += f", {opt3_text}"
-
-            selected_algo_text += f"\n"
-        self.algo_list_text.setPlainText(selected_algo_text)
+            algorithm = self.catalog.get(new_item["selected_key"])
+            if algorithm is None:
+                lines.append("Unknown Algorithm")
+                continue
+            selected = [str(new_item["selected_opt1"]), str(new_item["selected_opt2"]), str(new_item["selected_opt3"])]
+            # Options are decoded once by the catalog, not on every change
+            texts = [field.options.get(value, f"Opt{number}Val-{value}")
+                     for number, (field, value) in enumerate(zip(algorithm.option_fields, selected), 1)
+                     if field is not None]
+            lines.append(algorithm.name + (f": {', '.join(texts)}" if texts else ""))
+        self.algo_list_text.setPlainText("".join(line + "\n" for line in lines))
 
     def clear_algo(self):
         self.selected_algoritms_list = []
@@ -912,23 +623,18 @@ class MainWindow(QWidget):
 
     def add_algoritm(self):
         # Getting the selected text
-        selected_item_text = self.type_combo_master.currentText()
-        separation_type_key = None  # Initialize
-        for key, value in self.data.items():
-            if value == selected_item_text:
-                separation_type_key = key
-                break
+        algorithm = self.catalog.by_name.get(self.type_combo_master.currentText())
 
         # It's good practice to reset styles from previous errors
         self.type_combo_master.setStyleSheet(combo_style)  # Reset style
 
-        if not separation_type_key:  # If separation type is not selected or not found
+        if algorithm is None:  # If separation type is not selected or not found
             self.type_combo_master.setStyleSheet(f"border: 2px solid red; {combo_style}")
             QMessageBox.warning(self, "Error", "Please select a valid separation type.")
             return
 
         new_item = {}
-        new_item["selected_key"] = separation_type_key
+        new_item["selected_key"] = algorithm.render_id
         new_item["selected_opt1"] = self.selected_opt1  # These are set by on_change_master_optionX
         new_item["selected_opt2"] = self.selected_opt2
         new_item["selected_opt3"] = self.selected_opt3
@@ -938,98 +644,51 @@ class MainWindow(QWidget):
         self._update_algo_list_text()
 
     def on_selection_master_change(self, index):
-        # Getting the selected text
-        selected_item_text = self.type_combo_master.currentText()
-        self.selected_key = None  # Reset
-
-        # Searching for the corresponding key for the selected value
-        for key, value in self.data.items():
-            if value == selected_item_text:
-                self.selected_key = key
-                break
-
-        if not self.selected_key: return  # Should not happen if combo is populated correctly
-
-        current_algorithm_fields = self.algorithm_fields.get(self.selected_key, [])
+        algorithm = self.catalog.by_name.get(self.type_combo_master.currentText())
+        if algorithm is None:
+            return  # Should not happen if combo is populated correctly
+        self.selected_key = algorithm.render_id
 
+        combos = (self.option1_combo_master, self.option2_combo_master, self.option3_combo_master)
+        labels = (self.option1_label_master, self.option2_label_master, self.option3_label_master)
         # clearing all ComboBoxes in the master window
-        self.option1_combo_master.clear()
-        self.option2_combo_master.clear()
-        self.option3_combo_master.clear()
-        self.option1_label_master.setText("Additional Option 1")
-        self.option2_label_master.setText("Additional Option 2")
-        self.option3_label_master.setText("Additional Option 3")
+        for number, (combo, label) in enumerate(zip(combos, labels), 1):
+            combo.blockSignals(True)
+            combo.clear()
+            combo.blockSignals(False)
+            label.setText(f"Additional Option {number}")
 
         # Reset selected options to defaults (e.g., first item or "0")
         self.selected_opt1 = "0"
         self.selected_opt2 = "0"
         self.selected_opt3 = "0"
-
-        if len(current_algorithm_fields) > 0:
-            field1_info = current_algorithm_fields[0]
-            self.option1_label_master.setText(f"Option 1: {field1_info.get('text', 'N/A')}")
-            self.alg_opt1 = json.loads(field1_info.get('options', '{}'))
-            # Sorting the dictionary by key (assuming keys are sortable, e.g., numbers as strings)
-            try:  # Handle cases where keys might not be directly sortable as integers
-                sorted_data_opt1 = {k: v for k, v in sorted(self.alg_opt1.items(), key=lambda item: int(item[0]))}
-            except ValueError:
-                sorted_data_opt1 = {k: v for k, v in sorted(self.alg_opt1.items())}
-
-            value_items1 = list(sorted_data_opt1.values())
-            # Adding items to the combobox
-            self.option1_combo_master.addItems(value_items1)
-            if value_items1: self.on_change_master_option1(0)  # Set default
-
-        if len(current_algorithm_fields) > 1:
-            field2_info = current_algorithm_fields[1]
-            self.option2_label_master.setText(f"Option 2: {field2_info.get('text', 'N/A')}")
-            self.alg_opt2 = json.loads(field2_info.get('options', '{}'))
-            try:
-                sorted_data_opt2 = {k: v for k, v in sorted(self.alg_opt2.items(), key=lambda item: int(item[0]))}
-            except ValueError:
-                sorted_data_opt2 = {k: v for k, v in sorted(self.alg_opt2.items())}
-            value_items2 = list(sorted_data_opt2.values())
-            self.option2_combo_master.addItems(value_items2)
-            if value_items2: self.on_change_master_option2(0)
-
-        if len(current_algorithm_fields) > 2:
-            field3_info = current_algorithm_fields[2]
-            self.option3_label_master.setText(f"Option 3: {field3_info.get('text', 'N/A')}")
-            self.alg_opt3 = json.loads(field3_info.get('options', '{}'))
-            try:
-                sorted_data_opt3 = {k: v for k, v in sorted(self.alg_opt3.items(), key=lambda item: int(item[0]))}
-            except ValueError:
-                sorted_data_opt3 = {k: v for k, v in sorted(self.alg_opt3.items())}
-            value_items3 = list(sorted_data_opt3.values())
-            self.option3_combo_master.addItems(value_items3)
-            if value_items3: self.on_change_master_option3(0)
+        # Fields are matched to add_opt1..3 by name, see Algorithm.field
+        self.alg_opt1, self.alg_opt2, self.alg_opt3 = algorithm.option_fields
+
+        handlers = (self.on_change_master_option1, self.on_change_master_option2, self.on_change_master_option3)
+        for number, (combo, label, field, handler) in enumerate(zip(combos, labels, algorithm.option_fields, handlers), 1):
+            if field is None:
+                continue
+            label.setText(f"Option {number}: {field.text}")
+            # Options are already sorted by key
+            value_items = list(field.options.values())
+            combo.blockSignals(True)
+            combo.addItems(value_items)
+            combo.blockSignals(False)
+            if value_items:
+                handler(0)  # Set default
 
     def on_change_master_option1(self, index):
-        # Getting the selected text
-        selected_item_text = self.option1_combo_master.currentText()
-        # Searching for the corresponding key for the selected value
-        for key, value in self.alg_opt1.items():
-            if value == selected_item_text:
-                self.selected_opt1 = key
-                break
+        if self.alg_opt1 is not None:
+            self.selected_opt1 = self.alg_opt1.keys.get(self.option1_combo_master.currentText(), self.selected_opt1)
 
     def on_change_master_option2(self, index):
-        # Getting the selected text
-        selected_item_text = self.option2_combo_master.currentText()
-        # Searching for the corresponding key for the selected value
-        for key, value in self.alg_opt2.items():
-            if value == selected_item_text:
-                self.selected_opt2 = key
-                break
+        if self.alg_opt2 is not None:
+            self.selected_opt2 = self.alg_opt2.keys.get(self.option2_combo_master.currentText(), self.selected_opt2)
 
     def on_change_master_option3(self, index):
-        # Getting the selected text
-        selected_item_text = self.option3_combo_master.currentText()
-        # Searching for the corresponding key for the selected value
-        for key, value in self.alg_opt3.items():
-            if value == selected_item_text:
-                self.selected_opt3 = key
-                break
+        if self.alg_opt3 is not None:
+            self.selected_opt3 = self.alg_opt3.keys.get(self.option3_combo_master.currentText(), self.selected_opt3)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,1173 @@
+import time, os, json, sys
+import hashlib, threading, socket
+import sqlite3, requests
+import argparse
+from contextlib import contextmanager
+from datetime import datetime
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType
+
+# Job engine of the GUI without any UI: the same jobs.db can be processed on a server without a display.
+#   python mvsep_jobs.py add --sep_type 48 --add_opt1 1 song1.mp3 song2.wav
+#   python mvsep_jobs.py run --token <token> --exit_when_done
+#   python mvsep_jobs.py list --status Error
+
+# File directory
+if getattr(sys, 'frozen', False):
+    BASE_DIR = os.path.dirname(sys.executable)
+else:
+    BASE_DIR = os.path.abspath(os.getcwd())
+
+
+def create_separation(path_to_file, api_token, sep_type, add_opt1, add_opt2, add_opt3, timeout=(60, 300)):
+    # The file is closed as soon as the upload is finished; a stalled upload fails after timeout
+    # instead of holding an upload worker forever
+    with open(path_to_file, 'rb') as audio_file:
+        files = {
+            'audiofile': audio_file,
+            'api_token': (None, api_token),
+            'sep_type': (None, sep_type),
+            'add_opt1': (None, add_opt1),
+            'add_opt2': (None, add_opt2),
+            'add_opt3': (None, add_opt3),
+            'output_format': (None, '1'),
+            'is_demo': (None, '0'),
+        }
+
+        response = requests.post('https://mvsep.com/api/separation/create', files=files, timeout=timeout)
+    if response.status_code == 200:
+        response_content = response.content
+
+        # Convert byte array to string
+        string_response = response_content.decode('utf-8')
+
+        # Parse string to JSON
+        parsed_json = json.loads(string_response)
+
+        # Output result
+        hash = parsed_json["data"]["hash"]
+
+        return hash, response.status_code
+    else:
+        return response.content, response.status_code
+
+
+ALGORITHMS_CACHE = os.path.join(os.path.expanduser("~"), ".mvsep", "algorithms.json")
+ALGORITHMS_TTL = 3600
+
+
+def load_algorithms(ttl=ALGORITHMS_TTL, timeout=5):
+    """
+    The app/algorithms list, cached in ~/.mvsep/algorithms.json (the same file as CatalogCache of example 3).
+    For ttl seconds the saved list is used without a request. After that it is revalidated with
+    If-None-Match/If-Modified-Since, and if the API does not answer within timeout seconds the saved list
+    is used anyway. Returns None if there is no saved list and the request failed.
+    """
+    entry = None
+    try:
+        with open(ALGORITHMS_CACHE, "r", encoding="utf-8") as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        pass
+    if entry is not None and time.time() - entry.get("fetched", 0) < ttl:
+        return entry["algorithms"]
+
+    headers = {}
+    if entry and entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry and entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+    try:
+        response = requests.get('https://mvsep.com/api/app/algorithms', headers=headers,
+                                timeout=timeout if entry else 60)
+        if response.status_code == 304 and entry is not None:
+            entry["fetched"] = time.time()
+        elif response.status_code == 200:
+            entry = {"fetched": time.time(), "etag": response.headers.get("ETag"),
+                     "last_modified": response.headers.get("Last-Modified"), "algorithms": response.json()}
+        else:
+            print(f"Request failed with status code: {response.status_code}")
+            return entry["algorithms"] if entry else None
+    except (requests.exceptions.RequestException, ValueError) as e:
+        print(f"Request failed: {e}")
+        return entry["algorithms"] if entry else None
+    try:
+        os.makedirs(os.path.dirname(ALGORITHMS_CACHE), exist_ok=True)
+        tmp_path = f"{ALGORITHMS_CACHE}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, ALGORITHMS_CACHE)
+    except OSError:
+        pass
+    return entry["algorithms"]
+
+
+AlgorithmField = namedtuple("AlgorithmField", ["name", "text", "options", "keys"])
+OPTION_NAMES = ("add_opt1", "add_opt2", "add_opt3")
+
+
+class Algorithm(namedtuple("Algorithm", ["render_id", "name", "group_id", "fields"])):
+    __slots__ = ()
+
+    def field(self, name):
+        """
+        The field sent as option name (add_opt1, add_opt2 or add_opt3), None if the algorithm does not have it.
+        Fields are matched by name; a field with a name of its own stands for the option at its position.
+        """
+        for field in self.fields:
+            if field.name == name:
+                return field
+        index = OPTION_NAMES.index(name) if name in OPTION_NAMES else len(self.fields)
+        if index < len(self.fields) and self.fields[index].name not in OPTION_NAMES:
+            return self.fields[index]
+        return None
+
+    @property
+    def option_fields(self):
+        # Fields of add_opt1, add_opt2 and add_opt3, None for the options the algorithm does not have
+        return tuple(self.field(name) for name in OPTION_NAMES)
+
+
+class AlgorithmCatalog:
+    """
+    The algorithm list parsed once: options of every field are decoded and sorted by key (field.options)
+    with the reverse mapping text -> key (field.keys), and algorithms are found by render_id, name or group
+    without walking the list. The catalog can't be changed after it was built.
+    """
+
+    def __init__(self, algorithms):
+        by_id, by_name, by_group = {}, {}, {}
+        for item in sorted(algorithms, key=lambda algo: algo['render_id']):
+            fields = []
+            for index, field in enumerate(item.get('algorithm_fields') or []):
+                options = field.get('options') or {}
+                if isinstance(options, str):
+                    options = json.loads(options) if options.strip() else {}
+                options = {str(key): str(value) for key, value in options.items()}
+                keys = sorted(options, key=lambda key: (not key.lstrip("-").isdigit(),
+                                                        int(key) if key.lstrip("-").isdigit() else 0, key))
+                name = field.get('name') or (OPTION_NAMES[index] if index < 3 else f"field{index}")
+                fields.append(AlgorithmField(name, field.get('text', name),
+                                             MappingProxyType({key: options[key] for key in keys}),
+                                             MappingProxyType({options[key]: key for key in reversed(keys)})))
+            algorithm = Algorithm(item['render_id'], item.get('name', str(item['render_id'])),
+                                  item.get('algorithm_group_id'), tuple(fields))
+            by_id[algorithm.render_id] = algorithm
+            by_name.setdefault(algorithm.name, algorithm)
+            by_group.setdefault(algorithm.group_id, []).append(algorithm)
+        object.__setattr__(self, "by_id", MappingProxyType(by_id))
+        object.__setattr__(self, "by_name", MappingProxyType(by_name))
+        object.__setattr__(self, "by_group", MappingProxyType({group: tuple(items) for group, items in by_group.items()}))
+        # render_id -> name, in render_id order, for combo boxes
+        object.__setattr__(self, "names", MappingProxyType({render_id: algorithm.name for render_id, algorithm in by_id.items()}))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("AlgorithmCatalog can't be changed")
+
+    def get(self, render_id):
+        try:
+            return self.by_id.get(int(render_id))
+        except (TypeError, ValueError):
+            return None
+
+    def validate(self, sep_type, add_opt1=None, add_opt2=None, add_opt3=None):
+        """
+        Problems of these separation parameters, an empty list if the API should accept them.
+        Options are matched to the fields by name, as in AlgorithmCatalog of example 3. Options that are not
+        given (None, "") are left to the server; "0" is accepted for options the algorithm does not have.
+        """
+        algorithm = self.get(sep_type)
+        if algorithm is None:
+            return [f"Unknown sep_type {sep_type}"]
+        errors = []
+        for name, value in zip(OPTION_NAMES, (add_opt1, add_opt2, add_opt3)):
+            if value is None or str(value) == "":
+                continue
+            field = algorithm.field(name)
+            if field is None:
+                if str(value) != "0":
+                    errors.append(f"{algorithm.name} (sep_type {algorithm.render_id}) has no {name}")
+            elif field.options and str(value) not in field.options:
+                errors.append(f"{name}={value} is not valid for {algorithm.name} (sep_type {algorithm.render_id}), "
+                              f"use one of: " + ", ".join(f"{key} ({text})" for key, text in field.options.items()))
+        return errors
+
+
+def get_catalog():
+    """
+    AlgorithmCatalog of load_algorithms(), None if the list is not available.
+    """
+    algorithms = load_algorithms()
+    return AlgorithmCatalog(algorithms) if algorithms is not None else None
+
+
+def format_progress(filename, bytes_done, total, rate):
+    mb = 1024 * 1024
+    if total:
+        return f"{filename}: {100 * bytes_done / total:.0f}% of {total / mb:.1f} MB, {rate / mb:.2f} MB/s"
+    return f"{filename}: {bytes_done / mb:.1f} MB, {rate / mb:.2f} MB/s"
+
+
+MANIFEST_NAME = ".mvsep_manifest.jsonl"
+manifest_lock = threading.Lock()
+
+
+def read_manifest(save_path):
+    """
+    Read the download manifest of a folder: file name -> size, sha256 and mtime of the downloaded file.
+    """
+    entries = {}
+    try:
+        with open(os.path.join(save_path, MANIFEST_NAME), encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                entries[entry["name"]] = entry
+    except OSError:
+        pass
+    return entries
+
+
+def add_to_manifest(file_path, sha256, url):
+    stat = os.stat(file_path)
+    entry = {"name": os.path.basename(file_path), "size": stat.st_size, "sha256": sha256,
+             "mtime_ns": stat.st_mtime_ns, "url": url}
+    with manifest_lock:
+        with open(os.path.join(os.path.dirname(file_path), MANIFEST_NAME), "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+
+
+def file_sha256(file_path, size=None):
+    """
+    SHA-256 of a file, or a hashlib object of its first `size` bytes if size is given.
+    """
+    digest = hashlib.sha256()
+    remaining = size
+    with open(file_path, "rb") as f:
+        while remaining is None or remaining > 0:
+            chunk = f.read(1024 * 1024 if remaining is None else min(1024 * 1024, remaining))
+            if not chunk:
+                break
+            digest.update(chunk)
+            if remaining is not None:
+                remaining -= len(chunk)
+    return digest.hexdigest() if size is None else digest
+
+
+def is_downloaded(url, file_path):
+    """
+    Check if file_path is already the complete file: it must match the manifest (by url, and by size and mtime,
+    or by hash if the file was touched). Files from before the manifest are compared with the server's size.
+    """
+    if not os.path.exists(file_path):
+        return False
+    stat = os.stat(file_path)
+    entry = read_manifest(os.path.dirname(file_path)).get(os.path.basename(file_path))
+    if entry is not None and entry.get("url") is not None:
+        if entry["url"] != url:
+            # A file of the same name from another separation
+            return False
+        if stat.st_size != entry["size"]:
+            return False
+        if stat.st_mtime_ns != entry["mtime_ns"]:
+            if file_sha256(file_path) != entry["sha256"]:
+                return False
+            add_to_manifest(file_path, entry["sha256"], url)
+        return True
+    try:
+        response = requests.head(url, allow_redirects=True, timeout=(60, 300))
+    except requests.exceptions.RequestException:
+        return False
+    if response.status_code != 200 or response.headers.get('Content-Length') != str(stat.st_size):
+        return False
+    add_to_manifest(file_path, file_sha256(file_path), url)
+    return True
+
+
+def download_file(url, filename, save_path, progress_callback=None, retries=5):
+    """
+    Download the file from the specified URL and save it in the specified path.
+    The file is written to disk in chunks; progress_callback(filename, bytes_done, total, rate)
+    is called at most twice per second while the file is downloaded.
+    Data goes to a .part file that is renamed when complete. If the connection drops, or a .part file
+    is left from an earlier run, the download continues from where it stopped with a Range request.
+    Size and SHA-256 of the file are recorded in the folder's manifest; a file that is already there
+    and matches the manifest is not downloaded again.
+    """
+    # Ensure the directory exists (several files of a job are downloaded at the same time)
+    os.makedirs(save_path, exist_ok=True)
+
+    file_path = os.path.join(save_path, filename)
+    if is_downloaded(url, file_path):
+        print(f"File '{filename}' is already downloaded")
+        return f"File '{filename}' is already downloaded"
+    print("start download")
+    part_path = file_path + ".part"
+    start_time = last_report = time.time()
+    received = 0
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    digest = file_sha256(part_path, offset) if offset else hashlib.sha256()
+
+    for attempt in range(retries + 1):
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        headers = {'Range': f'bytes={offset}-'} if offset else {}
+        try:
+            with requests.get(url, stream=True, headers=headers, timeout=(60, 300)) as response:
+                if response.status_code == 416:
+                    if response.headers.get('Content-Range', '').endswith(f'/{offset}'):
+                        # The .part file is already complete
+                        break
+                    # The .part file does not match the file on the server, start again
+                    os.remove(part_path)
+                    digest = hashlib.sha256()
+                    raise requests.exceptions.RequestException("partial file is larger than the file on the server")
+                if response.status_code not in (200, 206):
+                    print(f"There was an error downloading the file '{filename}'. Status code: {response.status_code}.")
+                    return None
+                if response.status_code == 200:
+                    # The server sends the whole file
+                    offset = 0
+                    digest = hashlib.sha256()
+                length = response.headers.get('Content-Length', '')
+                total = offset + int(length) if length.isdigit() else None
+                bytes_done = offset
+
+                # Save the content of the response to the file
+                with open(part_path, 'ab' if offset else 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=65536):
+                        f.write(chunk)
+                        digest.update(chunk)
+                        bytes_done += len(chunk)
+                        received += len(chunk)
+                        now = time.time()
+                        if progress_callback and (now - last_report >= 0.5 or bytes_done == total):
+                            last_report = now
+                            progress_callback(filename, bytes_done, total, received / max(now - start_time, 1e-6))
+            if total is None or bytes_done >= total:
+                break
+        except requests.exceptions.RequestException as e:
+            print(f"Download of '{filename}' interrupted: {e}")
+        if attempt == retries:
+            print(f"Could not download '{filename}' after {retries} retries")
+            return None
+        time.sleep(min(2 ** attempt, 30))
+
+    os.replace(part_path, file_path)
+    add_to_manifest(file_path, digest.hexdigest(), url)
+    print("end download")
+    return f"File '{filename}' was downloaded successfully!"
+
+
+def download_files(files, save_path, progress_callback=None, max_workers=4):
+    """
+    Download all result files of a separation at the same time. All files come from the same
+    server, so max_workers is also the limit of connections to this host.
+    Returns a list of (filename, result of download_file) in the order of files.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = []
+        for file_info in files:
+            url = file_info['url'].replace('\\/', '/')  # Correct slashes
+            filename = file_info['download']  # File name for saving
+            futures.append((filename, pool.submit(download_file, url, filename, save_path, progress_callback)))
+        return [(filename, future.result()) for filename, future in futures]
+
+
+def get_result(hash, save_path, progress_callback=None):
+    success, data = check_result(hash)
+    if success:
+        try:
+            files = data['data']['files']
+        except KeyError:
+            print("The separation is not ready yet.")
+            return ""
+        text = ""
+        for filename, message in download_files(files, save_path, progress_callback):
+            text += f'{message}\n'
+        return text
+    else:
+        print("An error occurred while retrieving file data.")
+
+
+def check_result(hash, timeout=(60, 300)):
+    params = {'hash': hash}
+    response = requests.get('https://mvsep.com/api/separation/get', params=params, timeout=timeout)
+    data = json.loads(response.content.decode('utf-8'))
+
+    return data['success'], data
+
+
+JOB_STATUSES = ("Added", "Process", "Download", "Complete", "Error")
+# Jobs in these statuses are still processed by an engine
+ACTIVE_STATUSES = ("Added", "Process", "Download")
+
+
+class SeparationError(Exception):
+    pass
+
+
+def migrate_jobs(cursor):
+    """
+    Version 1: the Jobs and Log tables of the first version of the GUI.
+    """
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS Jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    start_time INTEGER,
+    update_time INTEGER,
+    filename TEXT NOT NULL,
+    out_dir TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    status TEXT NOT NULL,
+    separation INTEGER,
+    option1 TEXT NOT NULL,
+    option2 TEXT NOT NULL,
+    option3 TEXT NOT NULL
+    )
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS Log (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id INTEGER,
+    update_time INTEGER,
+    action TEXT NOT NULL,
+    comment TEXT NOT NULL
+    )
+    ''')
+
+
+def migrate_leases(cursor):
+    """
+    Version 2: owner and lease_until of the job claims. Databases of older versions of this file may
+    have the columns already without a schema version, so they are only added when missing.
+    """
+    columns = [row[1] for row in cursor.execute('PRAGMA table_info(Jobs)')]
+    if 'owner' not in columns:
+        cursor.execute("ALTER TABLE Jobs ADD COLUMN owner TEXT NOT NULL DEFAULT ''")
+    if 'lease_until' not in columns:
+        cursor.execute("ALTER TABLE Jobs ADD COLUMN lease_until INTEGER NOT NULL DEFAULT 0")
+
+
+def migrate_status_enum(cursor):
+    """
+    Version 3: status can only be one of JOB_STATUSES (any other value becomes Error). SQLite can't add a
+    CHECK constraint to an existing table, so the jobs are copied into a new Jobs table that has it.
+    """
+    statuses = ", ".join(f"'{status}'" for status in JOB_STATUSES)
+    cursor.execute(f'''
+    CREATE TABLE JobsNew (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    start_time INTEGER,
+    update_time INTEGER,
+    filename TEXT NOT NULL,
+    out_dir TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    status TEXT NOT NULL CHECK (status IN ({statuses})),
+    separation INTEGER,
+    option1 TEXT NOT NULL,
+    option2 TEXT NOT NULL,
+    option3 TEXT NOT NULL,
+    owner TEXT NOT NULL DEFAULT '',
+    lease_until INTEGER NOT NULL DEFAULT 0
+    )
+    ''')
+    columns = "start_time, update_time, filename, out_dir, hash, separation, option1, option2, option3, owner, lease_until"
+    cursor.execute(f"INSERT INTO JobsNew (id, status, {columns}) "
+                   f"SELECT id, CASE WHEN status IN ({statuses}) THEN status ELSE 'Error' END, {columns} FROM Jobs")
+    cursor.execute('DROP TABLE Jobs')
+    cursor.execute('ALTER TABLE JobsNew RENAME TO Jobs')
+
+
+def migrate_indexes(cursor):
+    """
+    Version 4: indexes of the queries run every second: claim_jobs and count_jobs (status),
+    heartbeat and release_jobs (owner), the GUI table (update_time), hash lookups and the log of a job.
+    """
+    cursor.execute('CREATE INDEX IF NOT EXISTS JobsStatus ON Jobs (status, id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS JobsOwner ON Jobs (owner, status)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS JobsUpdateTime ON Jobs (update_time)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS JobsHash ON Jobs (hash)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS LogJob ON Log (job_id)')
+
+
+def migrate_watch(cursor):
+    """
+    Version 5: the folder index of mvsep_watch.py. WatchedDirs keeps the mtime and the subfolders of every
+    folder, so a folder that did not change is not listed again. WatchedFiles keeps every audio file seen,
+    enqueued = 0 until it was added to Jobs.
+    """
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS WatchedDirs (
+    path TEXT PRIMARY KEY,
+    mtime INTEGER,
+    subdirs TEXT NOT NULL
+    )
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS WatchedFiles (
+    path TEXT PRIMARY KEY,
+    dir TEXT NOT NULL,
+    size INTEGER,
+    mtime INTEGER,
+    enqueued INTEGER NOT NULL
+    )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS WatchedFilesDir ON WatchedFiles (dir)')
+
+
+def migrate_next_attempt(cursor):
+    """
+    Version 6: next_attempt, the time before which a job whose upload or download failed is not claimed again.
+    """
+    cursor.execute("ALTER TABLE Jobs ADD COLUMN next_attempt INTEGER NOT NULL DEFAULT 0")
+
+
+def migrate_version(cursor):
+    """
+    Version 7: version, a change counter of the jobs. Triggers give a job the highest version + 1 when it is
+    added and whenever its filename, separation or status changes. sqlite serializes all writes to jobs.db,
+    so unlike update_time the counter never goes back, whatever the clocks of the engines sharing the file.
+    """
+    cursor.execute("ALTER TABLE Jobs ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+    cursor.execute("UPDATE Jobs SET version = id")
+    cursor.execute('CREATE INDEX IF NOT EXISTS JobsVersion ON Jobs (version)')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS JobsInsertVersion AFTER INSERT ON Jobs
+    BEGIN
+        UPDATE Jobs SET version = (SELECT MAX(version) FROM Jobs) + 1 WHERE id = NEW.id;
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS JobsUpdateVersion AFTER UPDATE OF filename, separation, status ON Jobs
+    BEGIN
+        UPDATE Jobs SET version = (SELECT MAX(version) FROM Jobs) + 1 WHERE id = NEW.id;
+    END
+    ''')
+
+
+# Schema version n is reached by running MIGRATIONS[n - 1]; new versions are only ever appended
+MIGRATIONS = [migrate_jobs, migrate_leases, migrate_status_enum, migrate_indexes, migrate_watch,
+              migrate_next_attempt, migrate_version]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def create_tables(connection):
+    """
+    Create the tables of jobs.db, or bring an older jobs.db up to SCHEMA_VERSION (kept in PRAGMA user_version).
+    The migrations run in one write transaction, so engines started at the same time don't run them twice.
+    """
+    if connection.execute('PRAGMA user_version').fetchone()[0] >= SCHEMA_VERSION:
+        return
+    if connection.in_transaction:
+        connection.commit()
+    cursor = connection.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        version = cursor.execute('PRAGMA user_version').fetchone()[0]
+        for number, migration in enumerate(MIGRATIONS[version:], version + 1):
+            migration(cursor)
+            cursor.execute(f'PRAGMA user_version = {number}')
+        connection.commit()
+    except BaseException:
+        connection.rollback()
+        raise
+
+
+def connect(db_path, journal_mode="WAL"):
+    """
+    Connection to jobs.db. In WAL mode readers don't wait for the writer and a commit doesn't sync the file,
+    so the GUI table and the engine threads don't block each other. WAL needs all processes on one machine:
+    for a jobs.db on a network volume shared by several machines use journal_mode="DELETE".
+    """
+    # Other connections may hold the write lock for a moment
+    connection = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+    if journal_mode:
+        connection.execute(f'PRAGMA journal_mode = {journal_mode}')
+        if journal_mode.upper() == "WAL":
+            connection.execute('PRAGMA synchronous = NORMAL')
+    return connection
+
+
+class JobEngine:
+    """
+    Runs the jobs stored in the Jobs table through Added -> Process -> Download -> Complete (or Error).
+    Uploads, status checks and downloads run in bounded thread pools, and at most a few jobs per worker
+    are handed to a pool at once, so thousands of queued jobs do not create thousands of threads or requests.
+    The engine does not depend on any UI: the GUI and the command line both use it.
+    on_change(job_id) is called after the status of a job changed, on_progress(text) during downloads.
+
+    Several engines (on one or several machines) can process the same jobs.db on a shared volume.
+    A job is claimed by one engine (owner = worker_id) with a lease that the engine renews while it runs.
+    Jobs of an engine that stopped or crashed can be claimed by the others when the lease has expired,
+    and continue from their status, so a job that has a hash is not uploaded again.
+    """
+
+    def __init__(self, db_path=None, api_token=None, connection=None, upload_workers=4, poll_workers=4,
+                 download_workers=4, poll_interval=5, max_poll_interval=60, max_upload_attempts=5,
+                 max_download_attempts=5, retry_delay=10, max_retry_delay=300, on_change=None, on_progress=None, worker_id=None, lease_seconds=30, journal_mode="WAL"):
+        self.db_path = db_path or os.path.join(BASE_DIR, 'jobs.db')
+        self.journal_mode = journal_mode
+        # With a connection given, all threads share it; otherwise every thread opens its own (see db())
+        self.shared_connection = connection
+        self.local = threading.local()
+        # Writes of all threads are serialized here instead of waiting for the sqlite lock
+        self.db_lock = threading.RLock()
+        with self.db_lock:
+            create_tables(self.db())
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.lease_seconds = lease_seconds
+        self.next_heartbeat = 0
+        self.api_token = api_token
+        self.upload_workers = upload_workers
+        self.poll_workers = poll_workers
+        self.download_workers = download_workers
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.max_upload_attempts = max_upload_attempts
+        self.max_download_attempts = max_download_attempts
+        # A failed upload or download is tried again after retry_delay seconds, doubled after every failure
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.on_change = on_change
+        self.on_progress = on_progress
+
+        self.stop_event = threading.Event()
+        # Set when a worker is free again, so the next job is scheduled at once
+        self.wake_event = threading.Event()
+        self.thread = None
+        self.upload_pool = ThreadPoolExecutor(upload_workers, thread_name_prefix="mvsep-upload")
+        self.poll_pool = ThreadPoolExecutor(poll_workers, thread_name_prefix="mvsep-poll")
+        self.download_pool = ThreadPoolExecutor(download_workers, thread_name_prefix="mvsep-download")
+        # job_id -> "upload", "poll" or "download" for jobs handed to a pool
+        self.in_flight = {}
+        self.in_flight_lock = threading.Lock()
+        # job_id -> (next check time, interval) for jobs in Process status
+        self.next_check = {}
+        self.upload_attempts = {}
+        self.download_attempts = {}
+        # Ids of the jobs left in Download by an earlier run, "Resume Download" is logged when this engine claims them
+        self.resume_ids = set()
+        # Algorithm list used to check the parameters of jobs before they are uploaded
+        self.catalog = None
+        self.catalog_time = 0
+        self.catalog_lock = threading.Lock()
+
+    # Database helpers
+
+    def db(self):
+        """
+        Connection of the calling thread (or the shared connection given to the engine).
+        """
+        if self.shared_connection is not None:
+            return self.shared_connection
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = self.local.connection = connect(self.db_path, self.journal_mode)
+        return connection
+
+    @contextmanager
+    def transaction(self):
+        """
+        with engine.transaction() as connection: ... runs the statements in one write transaction,
+        committed at the end or rolled back on an exception. A transaction opened inside another one
+        on the same thread is part of the outer one.
+        """
+        with self.db_lock:
+            connection = self.db()
+            if getattr(self.local, "in_transaction", False):
+                yield connection
+                return
+            if connection.in_transaction:
+                connection.commit()
+            connection.execute('BEGIN IMMEDIATE')
+            self.local.in_transaction = True
+            try:
+                yield connection
+                connection.commit()
+            except BaseException:
+                connection.rollback()
+                raise
+            finally:
+                self.local.in_transaction = False
+
+    def execute(self, query, params=(), fetch=False):
+        """
+        Rows of a query with fetch=True, otherwise run one write statement and return its lastrowid.
+        """
+        if fetch:
+            if self.shared_connection is None:
+                return self.db().execute(query, params).fetchall()
+            with self.db_lock:
+                return self.shared_connection.execute(query, params).fetchall()
+        with self.transaction() as connection:
+            return connection.execute(query, params).lastrowid
+
+    def log(self, job_id, action, comment=""):
+        self.execute('INSERT INTO Log (job_id, update_time, action, comment) VALUES (?, ?, ?, ?)',
+                     (job_id, int(time.time()), action, comment))
+
+    def set_status(self, job_id, status, action=None, comment="", hash=None, logs=()):
+        """
+        Change the status (and the hash, if given) of a job with one statement, and write action and
+        the other (action, comment) pairs of logs to the Log table in the same transaction.
+        """
+        now = int(time.time())
+        with self.transaction() as connection:
+            # Only the owner of a job changes its status
+            changed = connection.execute(
+                "UPDATE Jobs SET status = ?, update_time = ?, hash = COALESCE(?, hash), next_attempt = 0 "
+                "WHERE id = ? AND owner IN (?, '')",
+                (status, now, hash, job_id, self.worker_id)).rowcount
+            if not changed:
+                # The lease expired and another engine took the job over
+                logs, action, comment = (), "Lease lost", f"{self.worker_id}: {status} not saved"
+            logs = list(logs) + ([(action, comment)] if action else [])
+            connection.executemany('INSERT INTO Log (job_id, update_time, action, comment) VALUES (?, ?, ?, ?)',
+                                   [(job_id, now, log_action, log_comment) for log_action, log_comment in logs])
+        if self.on_change:
+            self.on_change(job_id)
+
+    def add_job(self, filename, out_dir, separation, option1="0", option2="0", option3="0", comment="Added"):
+        """
+        Add a job in Added status and return its id.
+        """
+        return self.add_jobs([(filename, out_dir, separation, option1, option2, option3)], comment)[0]
+
+    def add_jobs(self, jobs, comment="Added"):
+        """
+        Add jobs given as (filename, out_dir, separation, option1, option2, option3) in one transaction
+        and return their ids.
+        """
+        now = int(time.time())
+        rows = [(now, now, filename, out_dir, "", "Added", separation, str(option1), str(option2), str(option3))
+                for filename, out_dir, separation, option1, option2, option3 in jobs]
+        if not rows:
+            return []
+        with self.transaction() as connection:
+            connection.executemany(
+                'INSERT INTO Jobs (start_time, update_time, filename, out_dir, hash, status, separation, option1, option2, option3) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                rows)
+            # Nobody else writes during the transaction, so AUTOINCREMENT gave the rows consecutive ids
+            last_id = connection.execute('SELECT last_insert_rowid()').fetchone()[0]
+            job_ids = list(range(last_id - len(rows) + 1, last_id + 1))
+            connection.executemany('INSERT INTO Log (job_id, update_time, action, comment) VALUES (?, ?, ?, ?)',
+                                   [(job_id, now, comment, "") for job_id in job_ids])
+        if self.on_change:
+            for job_id in job_ids:
+                self.on_change(job_id)
+        return job_ids
+
+    def get_catalog(self, max_age=ALGORITHMS_TTL):
+        """
+        AlgorithmCatalog used to check jobs, None if the algorithm list is not available.
+        It is loaded again (see load_algorithms) if it was loaded more than max_age seconds ago.
+        """
+        with self.catalog_lock:
+            if time.time() - self.catalog_time >= max_age:
+                algorithms = load_algorithms(ttl=max_age)
+                if algorithms is not None:
+                    self.catalog = AlgorithmCatalog(algorithms)
+                # Also after a failure, so an unreachable API is not asked again for every job
+                self.catalog_time = time.time()
+            return self.catalog
+
+    def check_params(self, separation, option1="0", option2="0", option3="0"):
+        """
+        Problems of these separation parameters (see AlgorithmCatalog.validate), an empty list if they look valid.
+        Before refusing them, a list older than a minute is revalidated, in case the algorithm was added since.
+        Nothing is refused when the algorithm list is not available.
+        """
+        catalog = self.get_catalog()
+        errors = catalog.validate(separation, option1, option2, option3) if catalog is not None else []
+        if errors:
+            catalog = self.get_catalog(max_age=60)
+            errors = catalog.validate(separation, option1, option2, option3)
+        return errors
+
+    def get_jobs(self, status=None):
+        """
+        Rows of the Jobs table, newest first, optionally only with the given status.
+        """
+        if status:
+            return self.execute('SELECT * FROM Jobs WHERE status = ? ORDER BY id DESC', (status,), fetch=True)
+        return self.execute('SELECT * FROM Jobs ORDER BY id DESC', fetch=True)
+
+    def count_jobs(self):
+        """
+        Number of jobs in every status.
+        """
+        rows = self.execute('SELECT status, COUNT(*) FROM Jobs GROUP BY status', fetch=True)
+        return {status: count for status, count in rows}
+
+    # Claiming
+
+    def claim_jobs(self, status, limit=None, exclude=()):
+        """
+        Jobs in status that this engine owns or can claim (no owner or lease expired), at most limit of them,
+        without the ids in exclude and the jobs waiting for their next_attempt. The jobs that had no owner are
+        claimed in the same write transaction, so two engines never get the same job.
+        """
+        now = int(time.time())
+        query = ("SELECT * FROM Jobs WHERE status = ? AND (owner IN (?, '') OR lease_until < ?) AND next_attempt <= ? "
+                 "ORDER BY id")
+        params = (status, self.worker_id, now, now)
+        if limit is not None:
+            query += ' LIMIT ?'
+            params += (limit + len(exclude),)
+        with self.transaction() as connection:
+            jobs = [job for job in connection.execute(query, params).fetchall() if job[0] not in exclude]
+            if limit is not None:
+                jobs = jobs[:limit]
+            connection.executemany('UPDATE Jobs SET owner = ?, lease_until = ? WHERE id = ?',
+                                   [(self.worker_id, now + self.lease_seconds, job[0])
+                                    for job in jobs if job[11] != self.worker_id])
+            connection.executemany('INSERT INTO Log (job_id, update_time, action, comment) VALUES (?, ?, ?, ?)',
+                                   [(job[0], now, "Claimed", f"{self.worker_id}: lease of {job[11]} expired")
+                                    for job in jobs if job[11] not in (self.worker_id, '')])
+            resumed = [job[0] for job in jobs if job[0] in self.resume_ids]
+            self.resume_ids.difference_update(resumed)
+            connection.executemany('INSERT INTO Log (job_id, update_time, action, comment) VALUES (?, ?, ?, ?)',
+                                   [(job_id, now, "Resume Download", self.worker_id) for job_id in resumed])
+        return jobs
+
+    def heartbeat(self):
+        """
+        Renew the leases of the unfinished jobs of this engine.
+        """
+        self.execute("UPDATE Jobs SET lease_until = ? WHERE owner = ? AND status IN (?, ?, ?)",
+                     (int(time.time()) + self.lease_seconds, self.worker_id) + ACTIVE_STATUSES)
+        self.next_heartbeat = time.monotonic() + self.lease_seconds / 3
+
+    def release_jobs(self, exclude=()):
+        """
+        Give up the unfinished jobs of this engine, except the ids in exclude, so other engines can take them at once.
+        """
+        query = "UPDATE Jobs SET owner = '', lease_until = 0 WHERE owner = ? AND status IN (?, ?, ?)"
+        if exclude:
+            query += f" AND id NOT IN ({', '.join('?' * len(exclude))})"
+        self.execute(query, (self.worker_id,) + ACTIVE_STATUSES + tuple(exclude))
+
+    def retry_later(self, job_id, attempts, action, comment=""):
+        """
+        Leave a job in its status after a failed attempt. It is not claimed again for retry_delay seconds,
+        doubled for every earlier attempt (up to max_retry_delay).
+        """
+        delay = min(self.retry_delay * 2 ** (attempts - 1), self.max_retry_delay)
+        now = int(time.time())
+        with self.transaction() as connection:
+            connection.execute('UPDATE Jobs SET next_attempt = ? WHERE id = ?', (now + int(delay), job_id))
+            connection.execute('INSERT INTO Log (job_id, update_time, action, comment) VALUES (?, ?, ?, ?)',
+                               (job_id, now, action, f"{comment} (attempt {attempts}, next in {delay:.0f}s)"))
+
+    # Scheduling
+
+    def submit(self, kind, job):
+        """
+        Run the step of a job that matches its status in the pool of that kind, unless it is already running.
+        """
+        job_id = job[0]
+        with self.in_flight_lock:
+            if job_id in self.in_flight:
+                return
+            self.in_flight[job_id] = kind
+        pool, function = {
+            "upload": (self.upload_pool, self.upload_job),
+            "poll": (self.poll_pool, self.check_job),
+            "download": (self.download_pool, self.download_job),
+        }[kind]
+
+        def run():
+            try:
+                # Steps still queued when the engine stops are not started, the job is handed back below
+                if not self.stop_event.is_set():
+                    function(job)
+            except Exception as e:
+                print(f"Job {job_id} failed: {e}")
+                self.set_status(job_id, "Error", "Error", str(e))
+            finally:
+                with self.in_flight_lock:
+                    del self.in_flight[job_id]
+                if self.stop_event.is_set():
+                    # stop() did not release the jobs that were running, each one is released when its step ends
+                    self.release_jobs(self.running())
+                self.wake_event.set()
+
+        pool.submit(run)
+
+    def free_slots(self, kind, workers):
+        # Hand at most two jobs per worker to a pool; the rest stays queued in the database
+        with self.in_flight_lock:
+            busy = sum(1 for running in self.in_flight.values() if running == kind)
+        return max(2 * workers - busy, 0)
+
+    def running(self):
+        with self.in_flight_lock:
+            return set(self.in_flight)
+
+    def schedule(self):
+        """
+        Hand due jobs to the worker pools. Called by the engine thread about once per second.
+        """
+        for status, kind, workers in (("Added", "upload", self.upload_workers),
+                                      ("Download", "download", self.download_workers)):
+            limit = self.free_slots(kind, workers)
+            # Without a token nothing can be uploaded; the jobs wait until it is set
+            if limit == 0 or (kind == "upload" and not self.api_token):
+                continue
+            for job in self.claim_jobs(status, limit, self.running()):
+                self.submit(kind, job)
+
+        limit = self.free_slots("poll", self.poll_workers)
+        busy = self.running()
+        now = time.time()
+        # Jobs in Process that this engine owns are checked when due; their leases are renewed by heartbeat()
+        owned = self.execute("SELECT * FROM Jobs WHERE owner = ? AND status = 'Process' ORDER BY id",
+                             (self.worker_id,), fetch=True)
+        for job in owned:
+            if limit == 0:
+                break
+            next_check, interval = self.next_check.setdefault(job[0], (now, self.poll_interval))
+            if next_check <= now and job[0] not in busy:
+                self.next_check[job[0]] = (now + interval, min(interval * 1.5, self.max_poll_interval))
+                self.submit("poll", job)
+                limit -= 1
+        # Only as many other jobs are claimed as there are free poll slots, the rest is left to other engines
+        if limit > 0:
+            for job in self.claim_jobs("Process", limit, busy | {job[0] for job in owned}):
+                self.next_check[job[0]] = (now + self.poll_interval, min(self.poll_interval * 1.5, self.max_poll_interval))
+                self.submit("poll", job)
+
+    def upload_job(self, job):
+        job_id = job[0]
+        # A job the API would refuse is not uploaded at all
+        errors = self.check_params(job[7], job[8], job[9], job[10])
+        if errors:
+            self.set_status(job_id, "Error", "Added -> Error", "; ".join(errors))
+            return
+        try:
+            hash_val, status_code = create_separation(job[3], self.api_token, str(job[7]), job[8], job[9], job[10])
+        except requests.exceptions.RequestException as e:
+            hash_val, status_code = str(e), None
+        if status_code == 200:
+            self.upload_attempts.pop(job_id, None)
+            self.set_status(job_id, "Process", "Added -> Process", hash=hash_val)
+            return
+        attempts = self.upload_attempts.get(job_id, 0) + 1
+        self.upload_attempts[job_id] = attempts
+        comment = f"response.content: {hash_val}"
+        print(f"error start process: {hash_val}")
+        # The request itself was refused (e.g. 400 for invalid parameters): uploading it again can't help
+        refused = status_code is not None and 400 <= status_code < 500 and status_code not in (408, 429)
+        if refused or attempts >= self.max_upload_attempts:
+            self.upload_attempts.pop(job_id, None)
+            self.set_status(job_id, "Error", "Added -> Error", f"{attempts} failed attempts",
+                            logs=[("Error Start Process", comment)])
+        else:
+            self.retry_later(job_id, attempts, "Error Start Process", comment)
+
+    def get_files(self, job):
+        """
+        Result files of a finished job, None if it is not finished yet.
+        Raises SeparationError if the separation failed, is unknown to the server or is done without any files.
+        """
+        success, data = check_result(job[5])
+        if not success or data.get('status') in ("failed", "not_found"):
+            raise SeparationError(str(data.get('data', ''))[:500])
+        files = data['data'].get('files') if isinstance(data.get('data'), dict) else None
+        if data.get('status') == "done" and not files:
+            # Checking it again would not bring the files
+            raise SeparationError("the separation is done, but the server returned no result files")
+        return files or None
+
+    def check_job(self, job):
+        job_id = job[0]
+        try:
+            files = self.get_files(job)
+        except SeparationError as e:
+            self.next_check.pop(job_id, None)
+            self.set_status(job_id, "Error", "Process -> Error", str(e))
+            return
+        except (requests.exceptions.RequestException, json.JSONDecodeError) as e:
+            # Checked again later
+            print(f"Status check of job {job_id} failed: {e}")
+            return
+        if not files:
+            return
+        self.next_check.pop(job_id, None)
+        self.set_status(job_id, "Download", logs=[("Process -> Download", f"filename: {file_info['download']}")
+                                                  for file_info in files])
+
+    def download_job(self, job):
+        job_id = job[0]
+        try:
+            files = self.get_files(job)
+            error = None if files else "the separation is not finished"
+        except SeparationError as e:
+            self.download_attempts.pop(job_id, None)
+            self.set_status(job_id, "Error", "Download -> Error", str(e))
+            return
+        except (requests.exceptions.RequestException, json.JSONDecodeError) as e:
+            error = f"status check failed: {e}"
+        if error:
+            # The job stays in Download status and is tried again later
+            print(f"Download of job {job_id}: {error}")
+            attempts = self.download_attempts.get(job_id, 0) + 1
+            self.download_attempts[job_id] = attempts
+            if attempts >= self.max_download_attempts:
+                self.download_attempts.pop(job_id, None)
+                self.set_status(job_id, "Error", "Download -> Error", f"{attempts} failed attempts, {error}")
+            else:
+                self.retry_later(job_id, attempts, "Error Download", error)
+            return
+        self.download_attempts.pop(job_id, None)
+        failed, logs = [], []
+        for filename, message in download_files(files, job[4], self.report_progress):
+            if message:
+                logs.append(("Process -> Complete", f"filename: {filename}"))
+            else:
+                failed.append(filename)
+        if failed:
+            self.set_status(job_id, "Error", "Download -> Error", f"filenames: {', '.join(failed)}", logs=logs)
+        else:
+            self.set_status(job_id, "Complete", logs=logs)
+
+    def report_progress(self, filename, bytes_done, total, rate):
+        if self.on_progress:
+            self.on_progress(format_progress(filename, bytes_done, total, rate))
+
+    # Running
+
+    def is_idle(self):
+        counts = self.count_jobs()
+        return not self.running() and not counts.get("Added") and not counts.get("Process") and not counts.get("Download")
+
+    def run(self, exit_when_done=False):
+        """
+        Process jobs until stop() is called (or, with exit_when_done, until no job is left to process).
+        Jobs left in Process or Download by a crash continue without uploading the file again: the hash
+        is in the Jobs table, finished stems are skipped by the download manifest and partly downloaded
+        stems continue from their .part files.
+        """
+        self.resume_ids = {row[0] for row in self.execute("SELECT id FROM Jobs WHERE status = 'Download'", fetch=True)}
+        while not self.stop_event.is_set():
+            self.wake_event.clear()
+            if time.monotonic() >= self.next_heartbeat:
+                self.heartbeat()
+            self.schedule()
+            if exit_when_done and self.is_idle():
+                break
+            self.wake_event.wait(1)
+
+    def start(self):
+        """
+        Run the engine in a background thread.
+        """
+        self.thread = threading.Thread(target=self.run, name="mvsep-jobs", daemon=True)
+        self.thread.start()
+
+    def stop(self, wait=True):
+        """
+        Stop the engine and hand its unfinished jobs back. With wait=False the steps that are running are not
+        waited for; their jobs are handed back when the steps end.
+        """
+        self.stop_event.set()
+        self.wake_event.set()
+        # The engine thread ends within one round of scheduling, so it claims nothing after the release below
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+        for pool in (self.upload_pool, self.poll_pool, self.download_pool):
+            pool.shutdown(wait=wait)
+        self.release_jobs(self.running())
+
+
+def read_token(token=None):
+    """
+    API token from the command line or from api_token.txt saved by the GUI.
+    """
+    if token:
+        return token
+    token_filename = os.path.join(BASE_DIR, "api_token.txt")
+    if os.path.isfile(token_filename):
+        with open(token_filename, "r") as f:
+            return f.read().strip()
+    return None
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Headless job queue for MVSep API (same jobs.db as the GUI)")
+    parser.add_argument('--db', type=str, default=os.path.join(BASE_DIR, 'jobs.db'), help="Path to the jobs database.")
+    parser.add_argument('--journal_mode', type=str, default="WAL", help="SQLite journal mode of the database. Use DELETE for a jobs.db shared by several machines on a network volume.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+
+    add_parser = subparsers.add_parser('add', help="Add files to the queue.")
+    add_parser.add_argument('files', nargs='+', help="Audio files or folders with audio files.")
+    add_parser.add_argument('--output_dir', type=str, default=os.path.join(BASE_DIR, 'output'), help="Folder for the result files.")
+    add_parser.add_argument('--sep_type', type=int, required=True, help="Separation type.")
+    add_parser.add_argument('--add_opt1', type=str, default="0", help="Additional option 1.")
+    add_parser.add_argument('--add_opt2', type=str, default="0", help="Additional option 2.")
+    add_parser.add_argument('--add_opt3', type=str, default="0", help="Additional option 3.")
+
+    run_parser = subparsers.add_parser('run', help="Process the queued jobs.")
+    run_parser.add_argument('--token', type=str, help="API token (default: api_token.txt).")
+    run_parser.add_argument('--upload_workers', type=int, default=4, help="Number of parallel uploads.")
+    run_parser.add_argument('--poll_workers', type=int, default=4, help="Number of parallel status checks.")
+    run_parser.add_argument('--download_workers', type=int, default=4, help="Number of jobs downloaded at once.")
+    run_parser.add_argument('--poll_interval', type=float, default=5, help="Seconds before the first status check of a job.")
+    run_parser.add_argument('--exit_when_done', action='store_true', help="Stop when no job is left to process.")
+    run_parser.add_argument('--worker_id', type=str, help="Name of this engine in the owner column (default: host name and process id).")
+    run_parser.add_argument('--lease_seconds', type=float, default=30, help="Jobs of an engine that stopped renewing its leases for this long are taken over by the others.")
+
+    list_parser = subparsers.add_parser('list', help="Show the jobs.")
+    list_parser.add_argument('--status', type=str, choices=JOB_STATUSES, help="Show only jobs with this status.")
+
+    args = parser.parse_args()
+    return args
+
+
+AUDIO_EXTENSIONS = ('.mp3', '.wav', '.flac', '.m4a', '.mp4')
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    if args.command == 'add':
+        engine = JobEngine(db_path=args.db, journal_mode=args.journal_mode)
+        errors = engine.check_params(args.sep_type, args.add_opt1, args.add_opt2, args.add_opt3)
+        if errors:
+            print("Invalid separation parameters: " + "; ".join(errors))
+            sys.exit(1)
+        for path in args.files:
+            if os.path.isdir(path):
+                paths = [os.path.join(path, name) for name in sorted(os.listdir(path))
+                         if name.lower().endswith(AUDIO_EXTENSIONS)]
+            else:
+                paths = [path]
+            # All files of a folder are added in one transaction
+            job_ids = engine.add_jobs([(os.path.abspath(file_path), os.path.abspath(args.output_dir), args.sep_type,
+                                        args.add_opt1, args.add_opt2, args.add_opt3) for file_path in paths])
+            for job_id, file_path in zip(job_ids, paths):
+                print(f"job_id: {job_id} {file_path}")
+    elif args.command == 'run':
+        api_token = read_token(args.token)
+        if not api_token:
+            print("No API token: use --token or save it in api_token.txt")
+            sys.exit(1)
+        engine = JobEngine(db_path=args.db, api_token=api_token, upload_workers=args.upload_workers,
+                           poll_workers=args.poll_workers, download_workers=args.download_workers,
+                           poll_interval=args.poll_interval, worker_id=args.worker_id, journal_mode=args.journal_mode,
+                           lease_seconds=args.lease_seconds, on_change=lambda job_id: print(f"job {job_id}: {engine.count_jobs()}"))
+        try:
+            engine.run(exit_when_done=args.exit_when_done)
+        except KeyboardInterrupt:
+            print("Stopping, unfinished jobs are continued on the next run (or by other engines after the lease expired)")
+        engine.stop(wait=False)
+    else:
+        engine = JobEngine(db_path=args.db, journal_mode=args.journal_mode)
+        for job in engine.get_jobs(args.status):
+            start_date = datetime.fromtimestamp(job[1]).strftime('%Y-%m-%d %H:%M')
+            print(f"{job[0]}\t{start_date}\t{job[6]}\t{job[7]}\t{os.path.basename(job[3])}\t{job[5]}")
+        print(engine.count_jobs())
@@ -0,0 +1,326 @@
+import time, os, sys, json
+import threading
+import argparse
+
+try:
+    # watchdog reports changes with inotify on Linux (FSEvents on macOS, ReadDirectoryChangesW on Windows).
+    # Without it the folder is polled.
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+from mvsep_jobs import JobEngine, AUDIO_EXTENSIONS, BASE_DIR, read_token
+
+# Watch folder: audio files copied into a folder (and its subfolders) are added to jobs.db once they are
+# completely written, one job per separation profile.
+#   python mvsep_watch.py /ingest --output_dir /results --profile 48:1 --profile 20 --token <token>
+
+
+def parse_profile(text):
+    """
+    "sep_type[:add_opt1[:add_opt2[:add_opt3]]]" -> (sep_type, add_opt1, add_opt2, add_opt3)
+    """
+    parts = text.split(":")
+    if len(parts) > 4 or not parts[0].isdigit():
+        raise argparse.ArgumentTypeError(f"Profile must be sep_type[:add_opt1[:add_opt2[:add_opt3]]]: {text}")
+    parts += ["0"] * (4 - len(parts))
+    return int(parts[0]), parts[1], parts[2], parts[3]
+
+
+class WatchEvents(FileSystemEventHandler):
+    def __init__(self, watcher):
+        self.watcher = watcher
+
+    def on_any_event(self, event):
+        for path in (event.src_path, getattr(event, "dest_path", "")):
+            if path:
+                self.watcher.mark_dirty(os.fsdecode(path), event.is_directory)
+
+
+class FolderWatcher:
+    """
+    Adds the audio files of root and its subfolders to the JobEngine, one job per profile
+    (sep_type, add_opt1, add_opt2, add_opt3). A file is added when its size and mtime did not change
+    for stable_seconds, so files that are still being copied are not uploaded half written.
+    Results go to output_dir, in the same subfolders as the file.
+
+    Every folder and file seen is kept in jobs.db. A scan only lists the folders whose mtime changed
+    (a file was created, removed or renamed in it), so a scan of a large tree that did not change costs
+    one stat per folder. With watchdog installed, changes are picked up from file system events at once
+    and the full scan only runs every full_scan_interval seconds in case an event was lost;
+    otherwise the tree is scanned every interval seconds.
+    Raises ValueError if a profile has separation parameters the API would refuse.
+    """
+
+    def __init__(self, engine, root, output_dir, profiles, interval=10, stable_seconds=5,
+                 use_events=True, full_scan_interval=600, ignore_existing=False):
+        self.engine = engine
+        self.root = os.path.abspath(root)
+        self.output_dir = os.path.abspath(output_dir)
+        for profile in profiles:
+            errors = engine.check_params(*profile)
+            if errors:
+                raise ValueError(f"Invalid profile {':'.join(map(str, profile))}: " + "; ".join(errors))
+        self.profiles = profiles
+        self.interval = interval
+        self.stable_seconds = stable_seconds
+        self.use_events = use_events and Observer is not None
+        self.full_scan_interval = full_scan_interval
+        # The WatchedDirs and WatchedFiles tables are created by create_tables of mvsep_jobs.py
+        # path -> (mtime, subfolders) of every folder listed before
+        self.dirs = {path: (mtime, json.loads(subdirs)) for path, mtime, subdirs
+                     in engine.execute('SELECT path, mtime, subdirs FROM WatchedDirs', fetch=True)}
+        # With an empty index, files that are already in the folder are only recorded, not processed
+        self.ignore_existing = ignore_existing and not self.dirs
+        # path -> (size, mtime, time of last change) of files that are not enqueued yet
+        self.pending = {}
+        for path, size, mtime in engine.execute('SELECT path, size, mtime FROM WatchedFiles WHERE enqueued = 0',
+                                                fetch=True):
+            self.pending[path] = (size, mtime, time.monotonic())
+        self.dirty = set()
+        self.dirty_lock = threading.Lock()
+        self.wake_event = threading.Event()
+        self.stop_event = threading.Event()
+        self.stats = {"scans": 0, "listed_dirs": 0, "enqueued": 0}
+
+    # Scanning
+
+    def scan(self, top=None):
+        """
+        Walk the tree under top (root by default), listing only the folders that changed.
+        """
+        stack = [top or self.root]
+        while stack:
+            path = stack.pop()
+            if path == self.output_dir or path.startswith(self.output_dir + os.sep):
+                continue
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                self.forget_dir(path)
+                continue
+            known = self.dirs.get(path)
+            if known is not None and known[0] == mtime:
+                stack.extend(known[1])
+            else:
+                stack.extend(self.list_dir(path, mtime))
+        self.ignore_existing = False
+        self.stats["scans"] += 1
+
+    def list_dir(self, path, mtime):
+        """
+        List a folder: new and replaced audio files become pending, removed ones are forgotten.
+        Returns the subfolders.
+        """
+        known = {row[0]: row[1:] for row in self.engine.execute(
+            'SELECT path, size, mtime, enqueued FROM WatchedFiles WHERE dir = ?', (path,), fetch=True)}
+        subdirs = []
+        rows = []
+        now = time.monotonic()
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.path)
+                            continue
+                        if not entry.name.lower().endswith(AUDIO_EXTENSIONS) or not entry.is_file():
+                            continue
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    old = known.pop(entry.path, None)
+                    if old is not None and old[2] and (old[0], old[1]) == (stat.st_size, stat.st_mtime_ns):
+                        continue
+                    if self.ignore_existing:
+                        rows.append((entry.path, path, stat.st_size, stat.st_mtime_ns, 1))
+                        continue
+                    if entry.path not in self.pending:
+                        self.pending[entry.path] = (stat.st_size, stat.st_mtime_ns, now)
+                    rows.append((entry.path, path, stat.st_size, stat.st_mtime_ns, 0))
+        except OSError:
+            self.forget_dir(path)
+            return []
+        for removed in known:
+            self.pending.pop(removed, None)
+        for removed in set(self.dirs.get(path, (0, []))[1]) - set(subdirs):
+            self.forget_dir(removed)
+        # A folder changed within the last 2 seconds may still get files with the same mtime
+        # (coarse timestamps on some file systems), so it is listed again next time
+        if time.time_ns() - mtime < 2 * 10 ** 9:
+            mtime = -1
+        with self.engine.transaction() as connection:
+            connection.executemany('DELETE FROM WatchedFiles WHERE path = ?', [(removed,) for removed in known])
+            connection.executemany('INSERT OR REPLACE INTO WatchedFiles (path, dir, size, mtime, enqueued) '
+                                   'VALUES (?, ?, ?, ?, ?)', rows)
+            connection.execute('INSERT OR REPLACE INTO WatchedDirs (path, mtime, subdirs) VALUES (?, ?, ?)',
+                               (path, mtime, json.dumps(subdirs)))
+        self.dirs[path] = (mtime, subdirs)
+        self.stats["listed_dirs"] += 1
+        return subdirs
+
+    def forget_dir(self, path):
+        """
+        Remove a folder that no longer exists, with its subfolders and files, from the index.
+        """
+        prefix = path.rstrip(os.sep) + os.sep
+        for known in [known for known in self.dirs if known == path or known.startswith(prefix)]:
+            del self.dirs[known]
+        for pending in [pending for pending in self.pending if pending.startswith(prefix)]:
+            del self.pending[pending]
+        like = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        with self.engine.transaction() as connection:
+            connection.execute("DELETE FROM WatchedDirs WHERE path = ? OR path LIKE ? ESCAPE '\\'", (path, like))
+            connection.execute("DELETE FROM WatchedFiles WHERE dir = ? OR dir LIKE ? ESCAPE '\\'", (path, like))
+
+    def check_file(self, path):
+        """
+        A file changed in place (no new folder mtime): make it pending again if it differs from the index.
+        """
+        if not path.lower().endswith(AUDIO_EXTENSIONS) or path in self.pending:
+            return
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return
+        row = self.engine.execute('SELECT size, mtime FROM WatchedFiles WHERE path = ? AND enqueued = 1',
+                                  (path,), fetch=True)
+        if row and tuple(row[0]) == (stat.st_size, stat.st_mtime_ns):
+            return
+        self.pending[path] = (stat.st_size, stat.st_mtime_ns, time.monotonic())
+        self.engine.execute('INSERT OR REPLACE INTO WatchedFiles (path, dir, size, mtime, enqueued) '
+                            'VALUES (?, ?, ?, ?, 0)', (path, os.path.dirname(path), stat.st_size, stat.st_mtime_ns))
+
+    def check_pending(self):
+        """
+        Enqueue the pending files whose size and mtime did not change for stable_seconds.
+        """
+        now = time.monotonic()
+        stable = []
+        for path, (size, mtime, since) in list(self.pending.items()):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                del self.pending[path]
+                continue
+            if (stat.st_size, stat.st_mtime_ns) != (size, mtime):
+                self.pending[path] = (stat.st_size, stat.st_mtime_ns, now)
+            elif stat.st_size and now - since >= self.stable_seconds:
+                stable.append((path, size, mtime))
+        if stable:
+            self.enqueue(stable)
+
+    def enqueue(self, files):
+        """
+        Add one job per profile for every (path, size, mtime) of files and mark the files enqueued,
+        all in one transaction.
+        """
+        jobs = []
+        for path, size, mtime in files:
+            out_dir = os.path.normpath(os.path.join(self.output_dir, os.path.relpath(os.path.dirname(path), self.root)))
+            jobs.extend((path, out_dir, sep_type, add_opt1, add_opt2, add_opt3)
+                        for sep_type, add_opt1, add_opt2, add_opt3 in self.profiles)
+        with self.engine.transaction() as connection:
+            self.engine.add_jobs(jobs, comment="Added by watcher")
+            connection.executemany('UPDATE WatchedFiles SET size = ?, mtime = ?, enqueued = 1 WHERE path = ?',
+                                   [(size, mtime, path) for path, size, mtime in files])
+        for path, size, mtime in files:
+            del self.pending[path]
+        self.stats["enqueued"] += len(files)
+
+    # Running
+
+    def mark_dirty(self, path, is_directory):
+        """
+        Called from the watchdog thread: path (or the folder it is in) is looked at on the next loop.
+        """
+        with self.dirty_lock:
+            self.dirty.add((path, is_directory))
+        self.wake_event.set()
+
+    def run(self):
+        """
+        Watch until stop() is called.
+        """
+        observer = None
+        if self.use_events:
+            observer = Observer()
+            observer.schedule(WatchEvents(self), self.root, recursive=True)
+            observer.start()
+        try:
+            # Changes made while the watcher was not running
+            self.scan()
+            scan_interval = self.full_scan_interval if observer else self.interval
+            next_scan = time.monotonic() + scan_interval
+            while not self.stop_event.is_set():
+                with self.dirty_lock:
+                    dirty, self.dirty = self.dirty, set()
+                for path, is_directory in dirty:
+                    if is_directory or os.path.isdir(path):
+                        self.scan(path)
+                    else:
+                        self.scan(os.path.dirname(path))
+                        self.check_file(path)
+                self.check_pending()
+                if time.monotonic() >= next_scan:
+                    self.scan()
+                    next_scan = time.monotonic() + scan_interval
+                timeout = next_scan - time.monotonic()
+                if self.pending:
+                    timeout = min(timeout, 1)
+                self.wake_event.wait(max(timeout, 0))
+                self.wake_event.clear()
+        finally:
+            if observer is not None:
+                observer.stop()
+                observer.join()
+
+    def stop(self):
+        self.stop_event.set()
+        self.wake_event.set()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Add audio files copied into a folder to the MVSep job queue")
+    parser.add_argument('folder', help="Folder to watch (with subfolders).")
+    parser.add_argument('--output_dir', type=str, default=os.path.join(BASE_DIR, 'output'), help="Folder for the result files.")
+    parser.add_argument('--profile', type=parse_profile, action='append', required=True, help="Separation of every new file: sep_type[:add_opt1[:add_opt2[:add_opt3]]]. Can be given several times.")
+    parser.add_argument('--db', type=str, default=os.path.join(BASE_DIR, 'jobs.db'), help="Path to the jobs database.")
+    parser.add_argument('--journal_mode', type=str, default="WAL", help="SQLite journal mode of the database. Use DELETE for a jobs.db shared by several machines on a network volume.")
+    parser.add_argument('--token', type=str, help="API token (default: api_token.txt).")
+    parser.add_argument('--no_engine', action='store_true', help="Only add jobs, 'mvsep_jobs.py run' processes them.")
+    parser.add_argument('--interval', type=float, default=10, help="Seconds between scans without watchdog.")
+    parser.add_argument('--stable_seconds', type=float, default=5, help="A file is added when it did not change for this many seconds.")
+    parser.add_argument('--polling', action='store_true', help="Scan the folder even if watchdog is installed.")
+    parser.add_argument('--ignore_existing', action='store_true', help="On the first run, skip the files already in the folder.")
+    args = parser.parse_args()
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    api_token = None
+    if not args.no_engine:
+        api_token = read_token(args.token)
+        if not api_token:
+            print("No API token: use --token, save it in api_token.txt or use --no_engine")
+            sys.exit(1)
+    engine = JobEngine(db_path=args.db, api_token=api_token, journal_mode=args.journal_mode,
+                       on_change=lambda job_id: print(f"job {job_id}: {engine.count_jobs()}"))
+    try:
+        watcher = FolderWatcher(engine, args.folder, args.output_dir, args.profile, interval=args.interval,
+                                stable_seconds=args.stable_seconds, use_events=not args.polling,
+                                ignore_existing=args.ignore_existing)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+    print(f"Watching {watcher.root} ({'file system events' if watcher.use_events else 'polling'})")
+    if not args.no_engine:
+        engine.start()
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        print("Stopping, unfinished jobs are continued on the next run")
+    engine.stop(wait=False)
@@ -0,0 +1,48 @@
+"""Time segmented downloads against the stand-in server with a per-connection bandwidth limit and request latency.
+
+    python3 tests/benchmark_segments.py --size_mb 48 --latency 0.05 --rate_mb 6.5 --segments 1,2,4,8
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "python_example3"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mvsep_client import MVSEPClient  # noqa: E402
+from stand_in_server import StandInServer  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of multi-segment downloads.")
+    parser.add_argument('--size_mb', type=float, default=48, help="Size of the downloaded file.")
+    parser.add_argument('--latency', type=float, default=0.05, help="Seconds before every response.")
+    parser.add_argument('--rate_mb', type=float, default=6.5, help="MB/s of one connection.")
+    parser.add_argument('--segments', type=str, default="1,2,4,8", help="Comma separated segment counts.")
+    parser.add_argument('--max_downloads_per_host', type=int, default=8, help="Connection limit per host.")
+    args = parser.parse_args()
+
+    mb = 1024 * 1024
+    with StandInServer({"stem.wav": os.urandom(int(args.size_mb * mb))}) as server:
+        server.latency = args.latency
+        server.rate = args.rate_mb * mb
+        print(f"{args.size_mb:g} MB, {args.latency * 1000:g} ms latency, {args.rate_mb:g} MB/s per connection, "
+              f"max_downloads_per_host={args.max_downloads_per_host}")
+        for segments in [int(value) for value in args.segments.split(",")]:
+            with tempfile.TemporaryDirectory() as output_dir:
+                client = MVSEPClient("token", debug=False, download_segments=segments, segment_min_size=1,
+                                     max_downloads_per_host=args.max_downloads_per_host)
+                server.max_active = 0
+                start = time.perf_counter()
+                client.download_track(server.file_url("stem.wav"), os.path.join(output_dir, "stem.wav"))
+                elapsed = time.perf_counter() - start
+                client.close()
+            print(f"  segments={segments:<3} {elapsed:6.2f}s {args.size_mb / elapsed:6.1f} MB/s "
+                  f"{server.max_active} connections")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for example in ("python_example1", "python_example2", "python_example3", "python_example5_gui"):
+    sys.path.insert(0, os.path.join(ROOT, example))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stand_in_server import StandInServer  # noqa: E402
+
+
+@pytest.fixture
+def server():
+    with StandInServer() as stand_in:
+        yield stand_in
@@ -0,0 +1,271 @@
+import json
+import re
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+
+ALGORITHMS = [
+    {
+        "render_id": 20,
+        "name": "Demucs4 HT",
+        "algorithm_group_id": 1,
+        "algorithm_fields": [
+            {"name": "add_opt1", "text": "Model type", "options": json.dumps({"0": "htdemucs", "1": "htdemucs_ft"})},
+        ],
+        "algorithm_descriptions": [],
+    },
+    {
+        "render_id": 40,
+        "name": "BS Roformer",
+        "algorithm_group_id": 2,
+        "algorithm_fields": [
+            {"name": "add_opt1", "text": "Version", "options": json.dumps({"81": "2024.08", "29": "2024.04"})},
+            {"name": "add_opt2", "text": "Extract", "options": json.dumps({"0": "vocals", "1": "instrum"})},
+        ],
+        "algorithm_descriptions": [],
+    },
+]
+
+
+class StandInServer:
+    """Local stand-in for the MVSEP API and its file host, served from a background thread.
+    Separations are created instantly; their status goes through `statuses` and then lists every
+    file in `files`, served under /files/<name> with Range support.
+
+    Faults are injected by changing attributes while the server runs:
+      fail_statuses - HTTP statuses returned (one per request) before API requests are handled,
+                      (status, headers) tuples to add headers such as Retry-After
+      drop_after    - {file name: [byte counts]}: the next downloads of the file are cut after that many bytes
+      ranges        - False to ignore Range headers and always send the whole file
+      latency       - seconds of delay before every response
+      rate          - bytes per second per connection for file downloads (None for no limit)
+      keep_uploads  - False to read request bodies in chunks and drop them (uploads then holds b""),
+                      so the server's memory does not grow with the size of an upload
+    Every request is recorded in `requests` as (method, path, headers), and `max_active` is the highest
+    number of requests that were handled at the same time."""
+
+    def __init__(self, files: Optional[Dict[str, bytes]] = None, algorithms: Optional[List[Dict]] = None,
+                 statuses: Optional[List[str]] = None):
+        self.files = dict(files or {})
+        self.algorithms = algorithms if algorithms is not None else ALGORITHMS
+        self.statuses = list(statuses or ["waiting", "processing", "done"])
+        self.etag = '"algorithms-1"'
+        self.fail_statuses = []
+        self.drop_after = {}
+        self.ranges = True
+        self.latency = 0.0
+        self.rate = None
+        self.keep_uploads = True
+        self.requests = []
+        self.uploads = []
+        self.tasks = {}
+        self.created = 0
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._server.daemon_threads = True
+        self._server.stand_in = self
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    @property
+    def api_url(self) -> str:
+        return self.url + "/api"
+
+    def file_url(self, name: str) -> str:
+        return f"{self.url}/files/{name}"
+
+    def start(self) -> "StandInServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="stand-in-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def requests_to(self, path: str) -> List[tuple]:
+        with self._lock:
+            return [request for request in self.requests if urlsplit(request[1]).path == path]
+
+    def add_task(self, task_hash: str, statuses: Optional[List[str]] = None) -> None:
+        with self._lock:
+            self.tasks[task_hash] = list(statuses if statuses is not None else self.statuses)
+
+    def _next_failure(self):
+        with self._lock:
+            if not self.fail_statuses:
+                return None
+            failure = self.fail_statuses.pop(0)
+        return failure if isinstance(failure, tuple) else (failure, {})
+
+    def _next_drop(self, name: str) -> Optional[int]:
+        with self._lock:
+            drops = self.drop_after.get(name)
+            return drops.pop(0) if drops else None
+
+    def _create(self, body: bytes) -> Dict:
+        with self._lock:
+            self.created += 1
+            task_hash = f"task-{self.created}"
+            self.tasks[task_hash] = list(self.statuses)
+            self.uploads.append(body)
+        return {"success": True, "data": {"hash": task_hash, "link": f"{self.url}/result/{task_hash}"}}
+
+    def _status(self, task_hash: str) -> Dict:
+        with self._lock:
+            statuses = self.tasks.get(task_hash)
+            if statuses is None:
+                return {"success": False, "status": "not_found", "data": {"message": "Hash not found"}}
+            status = statuses.pop(0) if len(statuses) > 1 else statuses[0]
+        if status != "done":
+            return {"success": True, "status": status, "data": {"queue_count": 1, "current_order": 1}}
+        # Result names start with the task hash, like the real ones start with the name of the uploaded file
+        files = [{"url": self.file_url(name), "download": f"{task_hash}_{name}", "size": str(len(content))}
+                 for name, content in self.files.items()]
+        return {"success": True, "status": "done", "data": {"files": files}}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def stand_in(self) -> StandInServer:
+        return self.server.stand_in
+
+    def _read_body(self) -> bytes:
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            body = b""
+            while True:
+                size = int(self.rfile.readline().strip(), 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return body
+                body += self.rfile.read(size)
+                self.rfile.readline()
+        length = int(self.headers.get("Content-Length") or 0)
+        if self.stand_in.keep_uploads:
+            return self.rfile.read(length)
+        while length > 0:
+            chunk = self.rfile.read(min(length, 65536))
+            if not chunk:
+                break
+            length -= len(chunk)
+        return b""
+
+    def _send(self, status: int, body: bytes = b"", headers: Optional[Dict] = None) -> None:
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _send_json(self, data, headers: Optional[Dict] = None) -> None:
+        self._send(200, json.dumps(data).encode("utf-8"), dict({"Content-Type": "application/json"}, **(headers or {})))
+
+    def _handle(self) -> None:
+        stand_in = self.stand_in
+        with stand_in._lock:
+            stand_in.requests.append((self.command, self.path, dict(self.headers)))
+            stand_in.active += 1
+            stand_in.max_active = max(stand_in.max_active, stand_in.active)
+        try:
+            self._respond()
+        finally:
+            with stand_in._lock:
+                stand_in.active -= 1
+
+    def _respond(self) -> None:
+        stand_in = self.stand_in
+        body = self._read_body() if self.command == "POST" else b""
+        if stand_in.latency:
+            time.sleep(stand_in.latency)
+        url = urlsplit(self.path)
+        if url.path.startswith("/files/"):
+            return self._send_file(url.path[len("/files/"):])
+        if not url.path.startswith("/api/"):
+            return self._send(404)
+
+        failure = stand_in._next_failure()
+        if failure is not None:
+            return self._send(failure[0], b"{}", failure[1])
+        endpoint = url.path[len("/api/"):]
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        if endpoint == "separation/create":
+            return self._send_json(stand_in._create(body))
+        if endpoint == "separation/get":
+            return self._send_json(stand_in._status(query.get("hash", "")))
+        if endpoint == "app/algorithms":
+            if self.headers.get("If-None-Match") == stand_in.etag:
+                return self._send(304, headers={"ETag": stand_in.etag})
+            return self._send_json(stand_in.algorithms, {"ETag": stand_in.etag})
+        return self._send_json({"success": True, "data": {}})
+
+    def _send_file(self, name: str) -> None:
+        stand_in = self.stand_in
+        content = stand_in.files.get(name)
+        if content is None:
+            return self._send(404)
+        total = len(content)
+        start, end, status = 0, total - 1, 200
+        match = re.fullmatch(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        if match and stand_in.ranges:
+            start = int(match.group(1))
+            end = min(int(match.group(2)), total - 1) if match.group(2) else total - 1
+            if start >= total:
+                return self._send(416, headers={"Content-Range": f"bytes */{total}"})
+            status = 206
+        headers = {"Accept-Ranges": "bytes"} if stand_in.ranges else {}
+        if status == 206:
+            headers["Content-Range"] = f"bytes {start}-{end}/{total}"
+        if self.command == "HEAD":
+            self.send_response(status)
+            for key, value in headers.items():
+                self.send_header(key, value)
+            self.send_header("Content-Length", str(end + 1 - start))
+            self.end_headers()
+            return
+
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(end + 1 - start))
+        self.end_headers()
+        data = content[start:end + 1]
+        drop = stand_in._next_drop(name)
+        if drop is not None:
+            data = data[:drop]
+        step = 65536
+        for pos in range(0, len(data), step):
+            block = data[pos:pos + step]
+            self.wfile.write(block)
+            if stand_in.rate:
+                time.sleep(len(block) / stand_in.rate)
+        if drop is not None:
+            # Cut the connection in the middle of the body, as a dropped link would
+            self.wfile.flush()
+            self.connection.shutdown(socket.SHUT_RDWR)
+            self.close_connection = True
+
+    do_GET = _handle
+    do_POST = _handle
+    do_HEAD = _handle
@@ -0,0 +1,281 @@
+import asyncio
+import hashlib
+import os
+import threading
+import time
+
+import aiohttp
+import pytest
+
+import mvsep_async_client
+from mvsep_async_client import AsyncMVSEPClient
+from mvsep_client import CatalogCache, DownloadManifest, ExponentialBackoff, RateLimiter
+
+
+def make_client(server, tmp_path, **kwargs) -> AsyncMVSEPClient:
+    client = AsyncMVSEPClient("token", retry_interval=0.01, debug=False,
+                              retry_policy=ExponentialBackoff(retries=3, base=0.01, cap=0.05),
+                              rate_limiter=RateLimiter(rate=1000, burst=1000),
+                              catalog_cache=CatalogCache(str(tmp_path / "algorithms.json")), **kwargs)
+    client.base_url = server.api_url
+    return client
+
+
+def run(server, tmp_path, coroutine_function, **kwargs):
+    async def main():
+        async with make_client(server, tmp_path, **kwargs) as client:
+            return await coroutine_function(client)
+    return asyncio.run(main())
+
+
+def write_input(path, size=50000) -> str:
+    with open(path, "wb") as f:
+        f.write(os.urandom(size))
+    return str(path)
+
+
+def test_process_file_uploads_polls_and_downloads_all_results(server, tmp_path):
+    server.files = {"vocals.wav": os.urandom(300000), "instrum.wav": os.urandom(200000)}
+    audio = write_input(tmp_path / "song.wav")
+    output_dir = tmp_path / "out"
+
+    run(server, tmp_path, lambda client: client.process_file(audio, str(output_dir), sep_type=20, add_opt1=1))
+
+    assert len(server.uploads) == 1
+    with open(audio, "rb") as f:
+        assert f.read() in server.uploads[0]
+    assert len(server.requests_to("/api/separation/get")) == 3
+    manifest = DownloadManifest(str(output_dir))
+    for name, content in server.files.items():
+        path = output_dir / f"task-1_{name}"
+        assert path.read_bytes() == content
+        assert manifest.get(path.name)["sha256"] == hashlib.sha256(content).hexdigest()
+    assert not [name for name in os.listdir(output_dir) if name.endswith(".part")]
+
+
+def test_other_endpoints(server, tmp_path):
+    zip_path = write_input(tmp_path / "results.zip", 1000)
+
+    async def calls(client):
+        return [await client.get_queue_info(), await client.get_news(), await client.get_separation_history(),
+                await client.enable_premium(), await client.disable_premium(),
+                await client.enable_long_filenames(), await client.disable_long_filenames(),
+                await client.create_quality_entry(zip_path, "algo", "text"),
+                await client.get_separation_status("unknown")]
+
+    responses = run(server, tmp_path, calls)
+    assert all(response["success"] for response in responses[:-1])
+    assert responses[-1]["status"] == "not_found"
+    assert len(server.requests) == len(responses)
+
+
+def test_algorithms(server, tmp_path):
+    algorithms = run(server, tmp_path, lambda client: client.get_algorithms())
+    assert sorted(algorithms) == [20, 40]
+    assert "htdemucs_ft" in algorithms[20]
+
+
+def test_algorithm_list_is_revalidated_with_the_saved_etag(server, tmp_path):
+    async def fetch_twice(client):
+        first = await client.get_algorithm_list()
+        return first, await client.get_algorithm_list(refresh=True)
+
+    first, second = run(server, tmp_path, fetch_twice)
+    assert first == second == server.algorithms
+    assert CatalogCache(str(tmp_path / "algorithms.json")).load()["etag"] == server.etag
+    requests = server.requests_to("/api/app/algorithms")
+    assert [headers.get("If-None-Match") for _, _, headers in requests] == [None, server.etag]
+
+
+def test_first_algorithm_fetch_is_retried_and_keeps_the_etag(server, tmp_path):
+    server.fail_statuses = [503]
+    algorithms = run(server, tmp_path, lambda client: client.get_algorithm_list())
+    assert algorithms == server.algorithms
+    assert CatalogCache(str(tmp_path / "algorithms.json")).load()["etag"] == server.etag
+    assert len(server.requests_to("/api/app/algorithms")) == 2
+
+
+def test_threads_share_one_manifest_per_directory(tmp_path, monkeypatch):
+    class SlowManifest(DownloadManifest):
+        def __init__(self, directory):
+            time.sleep(0.05)
+            super().__init__(directory)
+
+    monkeypatch.setattr(mvsep_async_client, "DownloadManifest", SlowManifest)
+    client = AsyncMVSEPClient("token", debug=False)
+    start = threading.Barrier(8)
+    manifests = []
+
+    def get_manifest():
+        start.wait()
+        manifests.append(client.get_manifest(str(tmp_path)))
+
+    threads = [threading.Thread(target=get_manifest) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len({id(manifest) for manifest in manifests}) == 1
+
+
+def test_server_errors_are_retried(server, tmp_path):
+    server.fail_statuses = [500, 503]
+
+    async def call(client):
+        response = await client.get_queue_info()
+        return response, client.get_retry_stats()
+
+    response, stats = run(server, tmp_path, call)
+    assert response["success"]
+    assert stats["retries"] == 2
+    assert len(server.requests_to("/api/app/queue")) == 3
+
+
+def test_rate_limited_request_waits_for_retry_after(server, tmp_path):
+    server.fail_statuses = [(429, {"Retry-After": "0.3"})]
+    start = time.monotonic()
+    response = run(server, tmp_path, lambda client: client.get_queue_info())
+    assert response["success"]
+    assert time.monotonic() - start >= 0.3
+
+
+def test_client_errors_are_not_retried(server, tmp_path):
+    server.fail_statuses = [403]
+    with pytest.raises(aiohttp.ClientResponseError):
+        run(server, tmp_path, lambda client: client.get_queue_info())
+    assert len(server.requests_to("/api/app/queue")) == 1
+
+
+def test_invalid_parameters_are_refused_before_the_upload(server, tmp_path):
+    audio = write_input(tmp_path / "song.wav")
+    with pytest.raises(ValueError, match="add_opt1=7"):
+        run(server, tmp_path, lambda client: client.create_separation(audio, sep_type=20, add_opt1=7))
+    assert not server.requests_to("/api/separation/create")
+
+
+def test_download_resumes_after_disconnects(server, tmp_path):
+    content = os.urandom(3 * 1024 * 1024 + 123)
+    server.files = {"stem.wav": content}
+    server.drop_after = {"stem.wav": [1000000, 1500000]}
+    output = tmp_path / "out" / "stem.wav"
+
+    run(server, tmp_path, lambda client: client.download_track(server.file_url("stem.wav"), str(output)))
+
+    assert output.read_bytes() == content
+    ranges = [headers.get("Range") for _, _, headers in server.requests_to("/files/stem.wav")]
+    # Data received but not yet read when the connection drops is lost, so a resume may start a little earlier
+    offsets = [int(value[len("bytes="):-1]) for value in ranges[1:]]
+    assert ranges[0] is None and len(offsets) == 2
+    assert 0 < offsets[0] <= 1000000 < offsets[1] <= offsets[0] + 1500000
+    manifest = DownloadManifest(str(output.parent))
+    assert manifest.get("stem.wav")["sha256"] == hashlib.sha256(content).hexdigest()
+
+
+def test_download_continues_part_file_of_an_earlier_run(server, tmp_path):
+    content = os.urandom(500000)
+    server.files = {"stem.wav": content}
+    output = tmp_path / "stem.wav"
+    (tmp_path / "stem.wav.part").write_bytes(content[:200000])
+
+    run(server, tmp_path, lambda client: client.download_track(server.file_url("stem.wav"), str(output)))
+
+    assert output.read_bytes() == content
+    assert [headers.get("Range") for _, _, headers in server.requests_to("/files/stem.wav")] == ["bytes=200000-"]
+    assert DownloadManifest(str(tmp_path)).get("stem.wav")["sha256"] == hashlib.sha256(content).hexdigest()
+
+
+def test_complete_part_file_is_renamed(server, tmp_path):
+    content = os.urandom(100000)
+    server.files = {"stem.wav": content}
+    output = tmp_path / "stem.wav"
+    (tmp_path / "stem.wav.part").write_bytes(content)
+
+    run(server, tmp_path, lambda client: client.download_track(server.file_url("stem.wav"), str(output)))
+
+    assert output.read_bytes() == content
+    assert not (tmp_path / "stem.wav.part").exists()
+
+
+def test_download_restarts_when_server_ignores_ranges(server, tmp_path):
+    content = os.urandom(400000)
+    server.files = {"stem.wav": content}
+    server.ranges = False
+    server.drop_after = {"stem.wav": [150000]}
+    output = tmp_path / "stem.wav"
+
+    run(server, tmp_path, lambda client: client.download_track(server.file_url("stem.wav"), str(output)))
+
+    assert output.read_bytes() == content
+    assert DownloadManifest(str(tmp_path)).get("stem.wav")["sha256"] == hashlib.sha256(content).hexdigest()
+
+
+def test_downloaded_file_is_not_fetched_again(server, tmp_path):
+    server.files = {"stem.wav": os.urandom(100000)}
+    output = str(tmp_path / "stem.wav")
+
+    async def download_twice(client):
+        await client.download_track(server.file_url("stem.wav"), output)
+        await client.download_track(server.file_url("stem.wav"), output)
+
+    run(server, tmp_path, download_twice)
+    assert len(server.requests_to("/files/stem.wav")) == 1
+
+
+def test_file_of_the_same_name_from_another_task_is_downloaded(server, tmp_path):
+    # Stems of one song have the same size, so only the url tells them apart
+    server.files = {"first.wav": os.urandom(100000), "second.wav": os.urandom(100000)}
+    output = tmp_path / "stem.wav"
+
+    async def download_both(client):
+        await client.download_track(server.file_url("first.wav"), str(output))
+        await client.download_track(server.file_url("second.wav"), str(output))
+        await client.download_track(server.file_url("second.wav"), str(output))
+
+    run(server, tmp_path, download_both)
+    assert output.read_bytes() == server.files["second.wav"]
+    assert len(server.requests_to("/files/second.wav")) == 1
+
+
+def test_hashing_and_writes_run_outside_the_event_loop(server, tmp_path, monkeypatch):
+    content = os.urandom(3 * 1024 * 1024)
+    server.files = {"stem.wav": content}
+    (tmp_path / "stem.wav.part").write_bytes(content[:1024 * 1024])
+    threads = {"hash": set(), "write": set()}
+
+    def file_sha256(*args):
+        threads["hash"].add(threading.get_ident())
+        return real_file_sha256(*args)
+
+    def write_block(*args):
+        threads["write"].add(threading.get_ident())
+        return real_write_block(*args)
+
+    real_file_sha256, real_write_block = mvsep_async_client.file_sha256, mvsep_async_client._write_block
+    monkeypatch.setattr(mvsep_async_client, "file_sha256", file_sha256)
+    monkeypatch.setattr(mvsep_async_client, "_write_block", write_block)
+
+    async def download(client):
+        await client.download_track(server.file_url("stem.wav"), str(tmp_path / "stem.wav"))
+        return threading.get_ident()
+
+    loop_thread = run(server, tmp_path, download)
+    assert (tmp_path / "stem.wav").read_bytes() == content
+    assert threads["hash"] and loop_thread not in threads["hash"]
+    assert threads["write"] and loop_thread not in threads["write"]
+
+
+def test_one_event_loop_runs_many_files_at_once(server, tmp_path):
+    server.files = {"vocals.wav": os.urandom(20000)}
+    server.latency = 0.05
+    input_dir = tmp_path / "in"
+    input_dir.mkdir()
+    for i in range(40):
+        write_input(input_dir / f"song{i}.mp3", 2000)
+
+    run(server, tmp_path, lambda client: client.process_directory(str(input_dir), str(tmp_path / "out"),
+                                                                  concurrency=16, sep_type=20))
+
+    results = sorted(name for name in os.listdir(tmp_path / "out") if name.endswith(".wav"))
+    assert len(results) == 40
+    assert len(server.uploads) == 40
+    assert server.max_active >= 5
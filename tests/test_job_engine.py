@@ -0,0 +1,111 @@
+import threading
+import time
+from collections import Counter
+
+import pytest
+
+import mvsep_jobs
+from mvsep_jobs import JobEngine
+
+
+@pytest.fixture
+def stand_in_api(monkeypatch):
+    """Uploads, status checks and downloads of mvsep_jobs answered locally, each taking a little time"""
+    monkeypatch.setattr(mvsep_jobs, "load_algorithms", lambda *args, **kwargs: None)
+
+    def create_separation(path, api_token, *args):
+        time.sleep(0.02)
+        return f"hash-{path}", 200
+
+    def check_result(hash, timeout=None):
+        return True, {"success": True, "status": "done",
+                      "data": {"files": [{"url": f"https://example.com/{hash}.wav", "download": f"{hash}.wav"}]}}
+
+    def download_files(files, save_path, progress_callback=None, max_workers=4):
+        time.sleep(0.02)
+        return [(file_info["download"], "ok") for file_info in files]
+
+    monkeypatch.setattr(mvsep_jobs, "create_separation", create_separation)
+    monkeypatch.setattr(mvsep_jobs, "check_result", check_result)
+    monkeypatch.setattr(mvsep_jobs, "download_files", download_files)
+
+
+def record_submits(engine, submitted):
+    submit = engine.submit
+
+    def recording_submit(kind, job):
+        with engine.in_flight_lock:
+            running = job[0] in engine.in_flight
+        if not running:
+            submitted.append((engine.worker_id, kind, job[0]))
+        submit(kind, job)
+
+    engine.submit = recording_submit
+
+
+@pytest.mark.parametrize("start_status", ["Added", "Process"])
+def test_two_engines_share_the_jobs_of_one_database(tmp_path, stand_in_api, start_status):
+    db_path = str(tmp_path / "jobs.db")
+    engines = [JobEngine(db_path=db_path, api_token="token", worker_id=worker_id, upload_workers=2,
+                         poll_workers=2, download_workers=2, poll_interval=0.05) for worker_id in ("a", "b")]
+    job_ids = engines[0].add_jobs([(f"song{i}.wav", str(tmp_path), 20, "0", "0", "0") for i in range(40)])
+    if start_status == "Process":
+        # Uploaded by an engine that was stopped, so nobody owns them
+        engines[0].execute("UPDATE Jobs SET status = 'Process', hash = 'hash-' || filename")
+    kinds = ("upload", "poll", "download") if start_status == "Added" else ("poll", "download")
+    submitted = []
+    for engine in engines:
+        record_submits(engine, submitted)
+
+    threads = [threading.Thread(target=engine.run, kwargs={"exit_when_done": True}) for engine in engines]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+    for engine in engines:
+        engine.stop()
+
+    assert engines[0].count_jobs() == {"Complete": len(job_ids)}
+    # Every step of every job was run once, by one of the engines
+    steps = Counter((kind, job_id) for _, kind, job_id in submitted)
+    assert set(steps) == {(kind, job_id) for kind in kinds for job_id in job_ids}
+    assert set(steps.values()) == {1}
+    for kind in kinds:
+        workers = Counter(worker_id for worker_id, step, _ in submitted if step == kind)
+        assert workers["a"] and workers["b"], (kind, workers)
+
+
+def test_done_job_without_result_files_is_not_checked_again(tmp_path, stand_in_api, monkeypatch):
+    checks = []
+
+    def check_result(hash, timeout=None):
+        checks.append(hash)
+        return True, {"success": True, "status": "done", "data": {"files": []}}
+
+    monkeypatch.setattr(mvsep_jobs, "check_result", check_result)
+    engine = JobEngine(db_path=str(tmp_path / "jobs.db"), api_token="token", poll_interval=0.05)
+    engine.add_jobs([("song.wav", str(tmp_path), 20, "0", "0", "0")])
+    engine.execute("UPDATE Jobs SET status = 'Process', hash = 'hash-song'")
+    thread = threading.Thread(target=engine.run, kwargs={"exit_when_done": True})
+    thread.start()
+    thread.join(10)
+    engine.stop()
+
+    assert not thread.is_alive()
+    assert engine.count_jobs() == {"Error": 1}
+    assert checks == ["hash-song"]
+
+
+def test_upload_has_a_timeout(tmp_path, monkeypatch):
+    calls = []
+
+    def post(url, **kwargs):
+        calls.append(kwargs)
+        raise mvsep_jobs.requests.exceptions.Timeout("stalled")
+
+    monkeypatch.setattr(mvsep_jobs.requests, "post", post)
+    audio = tmp_path / "song.wav"
+    audio.write_bytes(b"RIFF")
+    with pytest.raises(mvsep_jobs.requests.exceptions.Timeout):
+        mvsep_jobs.create_separation(str(audio), "token", 20, "0", "0", "0")
+    assert calls[0]["timeout"] == (60, 300)
@@ -0,0 +1,73 @@
+import types
+
+import pytest
+
+import mvsep_client
+from mvsep_client import AdaptivePolling, FixedPolling
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Time seen by the polling strategies, moved forward by the tests"""
+    now = [1000.0]
+    monkeypatch.setattr(mvsep_client, "time", types.SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+def status(name, position=None):
+    data = {"queue_count": 100, "current_order": position} if position is not None else {}
+    return {"success": True, "status": name, "data": data}
+
+
+def poll(strategy, task_hash, response):
+    strategy.observe(task_hash, response["status"], response)
+    return strategy.next_interval(task_hash, response["status"], response)
+
+
+def test_fixed_polling_always_uses_its_interval():
+    strategy = FixedPolling(interval=7)
+    for response in (status("waiting", 50), status("processing"), status("merging")):
+        assert poll(strategy, "task", response) == 7
+
+
+def test_deep_queue_position_gives_a_long_interval(clock):
+    strategy = AdaptivePolling(min_interval=3, max_interval=120, wait_per_position=30)
+    deep = poll(strategy, "deep", status("waiting", 50))
+    near = poll(strategy, "near", status("waiting", 1))
+    assert deep == 120
+    assert near == 15
+    assert poll(strategy, "merging", status("merging")) == 3
+
+
+def test_queue_depth_is_used_when_the_response_has_no_position(clock):
+    class Client:
+        calls = 0
+
+        def get_queue_info(self):
+            Client.calls += 1
+            return {"success": True, "data": {"queue": 20}}
+
+    strategy = AdaptivePolling(Client(), min_interval=3, max_interval=600, wait_per_position=10)
+    assert poll(strategy, "a", status("waiting")) == 100
+    assert poll(strategy, "b", status("waiting")) == 100
+    # The queue depth is cached for queue_ttl seconds
+    assert Client.calls == 1
+
+
+def test_processing_with_a_known_history_gives_a_short_interval(clock):
+    strategy = AdaptivePolling(min_interval=1, max_interval=120, processing_estimate=60, smoothing=0.5)
+    assert poll(strategy, "first", status("processing")) == 30
+    # Earlier tasks took 4 seconds to process
+    for task_hash in ("a", "b", "c", "d", "e", "f"):
+        poll(strategy, task_hash, status("processing"))
+        clock[0] += 4
+        poll(strategy, task_hash, status("done"))
+    assert strategy.processing_estimate < 6
+    assert poll(strategy, "next", status("processing")) < 3
+
+
+def test_slow_processing_backs_off_slowly(clock):
+    strategy = AdaptivePolling(min_interval=1, max_interval=120, processing_estimate=10)
+    poll(strategy, "task", status("processing"))
+    clock[0] += 100
+    assert poll(strategy, "task", status("processing")) == 10
@@ -0,0 +1,248 @@
+import hashlib
+import os
+
+import pytest
+
+import api_example
+import api_example2
+import mvsep_jobs
+from mvsep_client import DownloadManifest, ExponentialBackoff, MVSEPClient
+
+
+def make_client(**kwargs) -> MVSEPClient:
+    kwargs.setdefault("retry_policy", ExponentialBackoff(retries=5, base=0.01, cap=0.05))
+    return MVSEPClient("token", debug=False, **kwargs)
+
+
+def ranges_sent(server, name):
+    return [headers.get("Range") for method, _, headers in server.requests_to(f"/files/{name}") if method == "GET"]
+
+
+def check_downloaded(path, content):
+    with open(path, "rb") as f:
+        assert f.read() == content
+    assert not os.path.exists(path + ".part")
+    assert not os.path.exists(path + ".part.segments")
+    manifest = DownloadManifest(os.path.dirname(path))
+    assert manifest.get(os.path.basename(path))["sha256"] == hashlib.sha256(content).hexdigest()
+
+
+def test_stream_resumes_after_disconnects(server, tmp_path):
+    content = os.urandom(2 * 1024 * 1024 + 5)
+    server.files = {"stem.wav": content}
+    server.drop_after = {"stem.wav": [700000, 300000, 0]}
+    output = str(tmp_path / "stem.wav")
+
+    with make_client() as client:
+        client.download_track(server.file_url("stem.wav"), output)
+
+    check_downloaded(output, content)
+    ranges = ranges_sent(server, "stem.wav")
+    assert ranges[0] is None and len(ranges) == 4
+    offsets = [int(value[len("bytes="):-1]) for value in ranges[1:]]
+    assert offsets == sorted(offsets) and offsets[-1] <= 1000000
+
+
+def test_stream_resumes_part_file_after_restart(server, tmp_path):
+    content = os.urandom(1024 * 1024)
+    server.files = {"stem.wav": content}
+    server.drop_after = {"stem.wav": [400000]}
+    output = str(tmp_path / "stem.wav")
+
+    # The first run gives up after the disconnect, as if the process had been stopped
+    with make_client(retry_policy=ExponentialBackoff(retries=0)) as client:
+        with pytest.raises(Exception, match="Download failed"):
+            client.download_track(server.file_url("stem.wav"), output)
+    offset = os.path.getsize(output + ".part")
+    assert 0 < offset <= 400000
+
+    with make_client() as client:
+        client.download_track(server.file_url("stem.wav"), output)
+    check_downloaded(output, content)
+    assert ranges_sent(server, "stem.wav")[-1] == f"bytes={offset}-"
+
+
+def test_complete_part_file_is_renamed(server, tmp_path):
+    content = os.urandom(100000)
+    server.files = {"stem.wav": content}
+    output = str(tmp_path / "stem.wav")
+    with open(output + ".part", "wb") as f:
+        f.write(content)
+
+    with make_client() as client:
+        client.download_track(server.file_url("stem.wav"), output)
+    check_downloaded(output, content)
+    assert ranges_sent(server, "stem.wav") == ["bytes=100000-"]
+
+
+def test_part_file_larger_than_the_file_is_downloaded_again(server, tmp_path):
+    content = os.urandom(100000)
+    server.files = {"stem.wav": content}
+    output = str(tmp_path / "stem.wav")
+    with open(output + ".part", "wb") as f:
+        f.write(os.urandom(150000))
+
+    with make_client() as client:
+        client.download_track(server.file_url("stem.wav"), output)
+    check_downloaded(output, content)
+
+
+def test_server_without_ranges_sends_the_whole_file_again(server, tmp_path):
+    content = os.urandom(500000)
+    server.files = {"stem.wav": content}
+    server.ranges = False
+    server.drop_after = {"stem.wav": [200000]}
+    output = str(tmp_path / "stem.wav")
+
+    with make_client() as client:
+        client.download_track(server.file_url("stem.wav"), output)
+    check_downloaded(output, content)
+
+
+def test_segments_resume_after_disconnects(server, tmp_path):
+    content = os.urandom(4 * 1024 * 1024 + 17)
+    server.files = {"stem.wav": content}
+    server.drop_after = {"stem.wav": [None, 300000, 600000, 0]}
+    output = str(tmp_path / "stem.wav")
+
+    with make_client(download_segments=4, segment_min_size=1) as client:
+        client.download_track(server.file_url("stem.wav"), output)
+    check_downloaded(output, content)
+    # Size probe, 4 segments and the 3 retries of the cut segments
+    assert len(ranges_sent(server, "stem.wav")) == 8
+
+
+def test_segments_resume_after_restart(server, tmp_path):
+    content = os.urandom(8 * 1024 * 1024)
+    server.files = {"stem.wav": content}
+    server.drop_after = {"stem.wav": [None, 5 * 1024 * 1024 // 2]}
+    output = str(tmp_path / "stem.wav")
+
+    with make_client(download_segments=2, segment_min_size=1, retry_policy=ExponentialBackoff(retries=0)) as client:
+        with pytest.raises(Exception, match="Download failed"):
+            client.download_track(server.file_url("stem.wav"), output)
+    assert os.path.exists(output + ".part.segments")
+
+    with make_client(download_segments=2, segment_min_size=1) as client:
+        client.download_track(server.file_url("stem.wav"), output)
+    check_downloaded(output, content)
+    # Only the rest of the cut segment is requested again
+    resumed = ranges_sent(server, "stem.wav")[3:]
+    assert len(resumed) == 1
+    start, end = (int(value) for value in resumed[0][len("bytes="):].split("-"))
+    assert start not in (0, 4 * 1024 * 1024) and end in (4 * 1024 * 1024 - 1, 8 * 1024 * 1024 - 1)
+
+
+def test_segments_fall_back_to_one_stream_without_ranges(server, tmp_path):
+    content = os.urandom(1024 * 1024)
+    server.files = {"stem.wav": content}
+    server.ranges = False
+    output = str(tmp_path / "stem.wav")
+
+    with make_client(download_segments=4, segment_min_size=1) as client:
+        client.download_track(server.file_url("stem.wav"), output)
+    check_downloaded(output, content)
+    assert len(ranges_sent(server, "stem.wav")) == 2
+
+
+def test_api_example_continues_an_interrupted_download(server, tmp_path, capsys):
+    content = os.urandom(1024 * 1024)
+    server.files = {"stem.wav": content}
+    server.drop_after = {"stem.wav": [300000]}
+
+    api_example.download_file(server.file_url("stem.wav"), "stem.wav", str(tmp_path))
+    assert "interrupted" in capsys.readouterr().out
+    assert not (tmp_path / "stem.wav").exists()
+    offset = os.path.getsize(tmp_path / "stem.wav.part")
+
+    api_example.download_file(server.file_url("stem.wav"), "stem.wav", str(tmp_path))
+    assert (tmp_path / "stem.wav").read_bytes() == content
+    assert ranges_sent(server, "stem.wav") == [None, f"bytes={offset}-"]
+
+
+def test_api_example_renames_a_complete_part_file(server, tmp_path):
+    content = os.urandom(100000)
+    server.files = {"stem.wav": content}
+    (tmp_path / "stem.wav.part").write_bytes(content)
+
+    api_example.download_file(server.file_url("stem.wav"), "stem.wav", str(tmp_path))
+    assert (tmp_path / "stem.wav").read_bytes() == content
+    assert not (tmp_path / "stem.wav.part").exists()
+
+
+def test_api_example_removes_a_part_file_that_does_not_match(server, tmp_path):
+    content = os.urandom(100000)
+    server.files = {"stem.wav": content}
+    (tmp_path / "stem.wav.part").write_bytes(os.urandom(150000))
+
+    api_example.download_file(server.file_url("stem.wav"), "stem.wav", str(tmp_path))
+    assert not (tmp_path / "stem.wav.part").exists()
+    api_example.download_file(server.file_url("stem.wav"), "stem.wav", str(tmp_path))
+    assert (tmp_path / "stem.wav").read_bytes() == content
+
+
+def test_api_example2_renames_a_complete_part_file(server, tmp_path):
+    content = os.urandom(100000)
+    server.files = {"stem.wav": content}
+    (tmp_path / "stem.wav.part").write_bytes(content)
+
+    assert api_example2.download_file(server.file_url("stem.wav"), "stem.wav", str(tmp_path)) is True
+    assert (tmp_path / "stem.wav").read_bytes() == content
+    assert not (tmp_path / "stem.wav.part").exists()
+
+
+def test_api_example2_restarts_a_part_file_that_does_not_match(server, tmp_path):
+    content = os.urandom(100000)
+    server.files = {"stem.wav": content}
+    (tmp_path / "stem.wav.part").write_bytes(os.urandom(150000))
+
+    assert api_example2.download_file(server.file_url("stem.wav"), "stem.wav", str(tmp_path)) is True
+    assert (tmp_path / "stem.wav").read_bytes() == content
+    assert ranges_sent(server, "stem.wav") == ["bytes=150000-", None]
+
+
+def test_api_example2_continues_an_interrupted_download(server, tmp_path):
+    content = os.urandom(1024 * 1024)
+    server.files = {"stem.wav": content}
+    server.drop_after = {"stem.wav": [300000]}
+
+    # Interrupted is not failed: the task is kept and the download continues at the next check
+    assert api_example2.download_file(server.file_url("stem.wav"), "stem.wav", str(tmp_path)) is None
+    offset = os.path.getsize(tmp_path / "stem.wav.part")
+    assert api_example2.download_file(server.file_url("stem.wav"), "stem.wav", str(tmp_path)) is True
+    assert (tmp_path / "stem.wav").read_bytes() == content
+    assert ranges_sent(server, "stem.wav") == [None, f"bytes={offset}-"]
+
+
+def test_file_of_the_same_name_from_another_task_is_downloaded(server, tmp_path):
+    # Stems of one song have the same size, so only the url tells them apart
+    server.files = {"first.wav": os.urandom(100000), "second.wav": os.urandom(100000)}
+    output = str(tmp_path / "stem.wav")
+
+    with make_client() as client:
+        client.download_track(server.file_url("first.wav"), output)
+        client.download_track(server.file_url("second.wav"), output)
+        client.download_track(server.file_url("second.wav"), output)
+    check_downloaded(output, server.files["second.wav"])
+    assert len(server.requests_to("/files/second.wav")) == 1
+
+
+def test_mvsep_jobs_downloads_a_file_of_the_same_name_from_another_task(server, tmp_path):
+    server.files = {"first.wav": os.urandom(100000), "second.wav": os.urandom(100000)}
+
+    for name in ("first.wav", "second.wav", "second.wav"):
+        mvsep_jobs.download_file(server.file_url(name), "stem.wav", str(tmp_path))
+    assert (tmp_path / "stem.wav").read_bytes() == server.files["second.wav"]
+    assert len(server.requests_to("/files/second.wav")) == 1
+
+
+def test_segments_share_the_host_download_limit(server, tmp_path):
+    server.files = {f"stem{i}.wav": os.urandom(2 * 1024 * 1024) for i in range(3)}
+    server.rate = 4 * 1024 * 1024
+    files = [{"url": server.file_url(name), "download": name} for name in server.files]
+
+    with make_client(download_segments=4, segment_min_size=1, max_downloads_per_host=3) as client:
+        paths = client.download_tracks(files, str(tmp_path))
+    for path, content in zip(paths, server.files.values()):
+        check_downloaded(path, content)
+    assert server.max_active <= 3
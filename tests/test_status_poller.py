@@ -0,0 +1,88 @@
+import os
+import threading
+import time
+
+from mvsep_client import ExponentialBackoff, MVSEPClient, RateLimiter, SeparationPipeline, StatusPoller, TokenPool
+
+
+def make_client(server, tokens=("token-a",)) -> MVSEPClient:
+    client = MVSEPClient("token", retry_interval=0.05, debug=False, validate_params=False,
+                         retry_policy=ExponentialBackoff(retries=1, base=0.01, cap=0.01),
+                         rate_limiter=RateLimiter(rate=1000, burst=1000),
+                         token_pool=TokenPool(list(tokens), max_concurrent=1))
+    client.base_url = server.api_url
+    return client
+
+
+def active_tasks(client) -> int:
+    return sum(state["active"] for state in client.token_pool.get_stats().values())
+
+
+def create_task(client, tmp_path) -> str:
+    audio = tmp_path / "song.wav"
+    audio.write_bytes(os.urandom(2000))
+    return client.create_separation(str(audio), sep_type=20)["data"]["hash"]
+
+
+def wait_for(condition, timeout=5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+
+def test_failed_poll_releases_the_token_slot(server, tmp_path):
+    with make_client(server) as client:
+        task_hash = create_task(client, tmp_path)
+        assert active_tasks(client) == 1
+        server.fail_statuses = [403]
+        statuses = []
+        poller = StatusPoller(client, interval=0.05)
+        poller.track(task_hash, lambda _, status, status_resp: statuses.append(status))
+        assert wait_for(lambda: statuses == ["error"])
+        assert wait_for(lambda: active_tasks(client) == 0)
+        assert poller.pending() == 0
+        # The slot is free again, so the next upload does not block
+        create_task(client, tmp_path)
+        poller.stop()
+
+
+def test_untrack_and_stop_release_the_token_slots(server, tmp_path):
+    server.statuses = ["processing"]
+    with make_client(server, tokens=("token-a", "token-b")) as client:
+        first, second = create_task(client, tmp_path), create_task(client, tmp_path)
+        poller = StatusPoller(client, interval=0.05)
+        for task_hash in (first, second):
+            poller.track(task_hash, lambda *args: None)
+        assert active_tasks(client) == 2
+        poller.untrack(first)
+        assert active_tasks(client) == 1
+        poller.stop()
+        assert active_tasks(client) == 0
+        assert poller.pending() == 0
+
+
+def test_stopped_pipeline_releases_slots_of_unfinished_tasks(server, tmp_path):
+    server.statuses = ["processing"]
+    input_dir = tmp_path / "in"
+    input_dir.mkdir()
+    paths = []
+    for i in range(2):
+        paths.append(str(input_dir / f"song{i}.wav"))
+        with open(paths[-1], "wb") as f:
+            f.write(os.urandom(2000))
+
+    with make_client(server, tokens=("token-a", "token-b")) as client:
+        pipeline = SeparationPipeline(client, str(tmp_path / "out"), poll_interval=0.05)
+        results = pipeline.run(paths, sep_type=20)
+        # One task fails once both are uploaded, and the run is stopped while the other one still processes
+        failer = threading.Thread(target=lambda: wait_for(lambda: server.created == 2) and server.add_task(
+            "task-1", ["failed"]))
+        failer.start()
+        assert next(results)["status"] == "failed"
+        failer.join()
+        results.close()
+        assert active_tasks(client) == 0
+        assert client.get_status_poller().pending() == 0
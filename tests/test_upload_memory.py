@@ -0,0 +1,43 @@
+import tracemalloc
+
+from mvsep_client import ExponentialBackoff, MVSEPClient, RateLimiter
+
+MB = 1024 * 1024
+
+
+def write_file(path, size):
+    block = b"\0" * MB
+    with open(path, "wb") as f:
+        for _ in range(size // MB):
+            f.write(block)
+
+
+def peak_of_upload(server, path):
+    with MVSEPClient("token", debug=False, validate_params=False,
+                     retry_policy=ExponentialBackoff(retries=1, base=0.01, cap=0.01),
+                     rate_limiter=RateLimiter(rate=1000, burst=1000)) as client:
+        client.base_url = server.api_url
+        tracemalloc.start()
+        try:
+            response = client.create_separation(str(path), sep_type=20)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    assert response["success"]
+    return peak
+
+
+def test_upload_memory_does_not_grow_with_the_file_size(server, tmp_path):
+    server.keep_uploads = False
+    peaks = {}
+    for size in (1 * MB, 16 * MB, 64 * MB):
+        path = tmp_path / f"song-{size}.wav"
+        write_file(path, size)
+        peaks[size] = peak_of_upload(server, path)
+        path.unlink()
+
+    sent = [int(headers["Content-Length"]) for _, _, headers in server.requests_to("/api/separation/create")]
+    assert [length > size for length, size in zip(sent, peaks)] == [True] * 3
+    # MultipartStream reads the file in chunks while it is sent
+    assert max(peaks.values()) < 4 * MB, peaks
+    assert peaks[64 * MB] < peaks[1 * MB] + MB, peaks